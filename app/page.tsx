@@ -1,8 +1,11 @@
 import SectionContainer from '@/components/SectionContainer';
 import ClientLayoutWrapper from '@/components/ClientLayoutWrapper';
 import {
-  MotionH1, MotionH2, MotionH3, MotionP, MotionUl, MotionLi, MotionImg
+  MotionH1, MotionH2, MotionH3, MotionP, MotionUl, MotionLi, MotionImg, MotionDiv
 } from '@/components/MotionComponents';
+import {
+  CharacterEmotionChart, CorrelationHeatmap, DominantEmotionChart, EmotionDistributionChart, FilmRadarChart
+} from '@/components/EmotionCharts';
 
 // Helper component for numbered inline citations
 const Cite = ({ id }: { id: number }) => ( // Changed prop name/type to number
@@ -174,7 +177,7 @@ export default function Home() {
          <MotionH3>Overall Film Emotional Fingerprints</MotionH3>
          <MotionP>  Looking at the average emotion scores across all analyzed dialogue gives each film a unique "emotional profile". The radar chart below visualizes this, with each axis representing an emotion. A point further from the center indicates a higher average score for that emotion in the film's dialogue.</MotionP>
          <div className="flex flex-col items-center gap-2 py-4 px-4"> {/* Wrap image and subtitle */} 
-           <MotionImg src="/plots/plot2_film_emotion_profile_radar.png" alt="Radar chart showing average emotion scores per film" className="max-w-lg" />
+           <MotionDiv className="w-full max-w-lg"><FilmRadarChart /></MotionDiv>
            <p className="text-sm text-muted-foreground mt-2">Figure 2: Overall emotional profile comparison (Radar Chart).</p> {/* Subtitle */} 
          </div>
          <MotionP>
@@ -189,7 +192,7 @@ export default function Home() {
            Comparing the average intensity of each emotion across key characters reveals distinct personalities reflected in dialogue. This chart displays the average predicted score for each emotion, grouped by character.
          </MotionP>        
          <div className="flex flex-col items-center gap-2 py-4 px-4"> {/* Wrap image and subtitle */} 
-            <MotionImg src="/plots/plot1_avg_emotion_intensity_character.png" alt="Bar chart showing average emotion intensity per character" className="max-w-2xl" />
+            <MotionDiv className="w-full max-w-2xl"><CharacterEmotionChart /></MotionDiv>
             <p className="text-sm text-muted-foreground mt-2">Figure 3: Average emotion intensity per character.</p> {/* Subtitle */} 
          </div>
          <MotionP>
@@ -210,8 +213,8 @@ export default function Home() {
 
              <div className='flex flex-col items-center gap-2 py-4 px-4'> {/* Wrap images and subtitle */} 
                 <div className='flex flex-col md:flex-row justify-center gap-4 md:gap-8'> {/* Image row */} 
-                  <MotionImg src="/plots/plot3_dominant_emotion_Pulp_Fiction.png" alt="Stacked bar chart dominant emotions Pulp Fiction" className="max-w-md" />
-                  <MotionImg src="/plots/plot3_dominant_emotion_Goodfellas.png" alt="Stacked bar chart dominant emotions Goodfellas" className="max-w-md" />
+                  <MotionDiv className="w-full max-w-md"><DominantEmotionChart film="Pulp Fiction" /></MotionDiv>
+                  <MotionDiv className="w-full max-w-md"><DominantEmotionChart film="Goodfellas" /></MotionDiv>
                 </div>
                 <p className="text-sm text-muted-foreground mt-2">Figure 4: Dominant emotion frequency per character (Pulp Fiction & Goodfellas).</p> {/* Subtitle */} 
             </div>
@@ -224,7 +227,7 @@ export default function Home() {
                 This heatmap shows how different emotions relate to each other and the basic VADER sentiment score (Red = Positive link, Blue = Negative link).
             </MotionP>
              <div className="flex flex-col items-center gap-2 py-4 px-4"> {/* Wrap image and subtitle */}
-                <MotionImg src="/plots/plot5_emotion_correlation_heatmap.png" alt="Heatmap showing emotion correlation" className="max-w-xl" />
+                <MotionDiv className="w-full max-w-xl"><CorrelationHeatmap /></MotionDiv>
                 <p className="text-sm text-muted-foreground mt-2">Figure 3: Correlation heatmap.</p> {/* Adjusted Figure Number */}
              </div>
              <MotionP>
@@ -238,7 +241,7 @@ export default function Home() {
                 Given the high anger scores for some characters, this box plot explores how 'anger' scores were spread out for each character.
             </MotionP>
              <div className="flex flex-col items-center gap-2 py-4 px-4"> {/* Wrap image and subtitle */}
-                <MotionImg src="/plots/plot6_distribution_anger.png" alt="Box plot showing anger distribution" className="max-w-2xl" />
+                <MotionDiv className="w-full max-w-2xl"><EmotionDistributionChart defaultMeasure="anger" /></MotionDiv>
                 <p className="text-sm text-muted-foreground mt-2">Figure 4: Distribution of 'Anger' scores.</p> {/* Adjusted Figure Number */}
              </div>
              <MotionP>
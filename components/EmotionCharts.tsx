@@ -0,0 +1,454 @@
+'use client'; // Charts are drawn in the browser from the pre-aggregated data bundle
+
+import React, { useEffect, useState } from 'react';
+
+// Written by script_analysis/chart_data.py (a few KB gzipped, instead of one large PNG per figure)
+const BUNDLE_URL = '/data/charts.json';
+const BUNDLE_VERSION = 1;
+
+type BoxStats = [number, number, number, number, number]; // whisker low, q1, median, q3, whisker high
+
+export interface ChartBundle {
+  version: number;
+  source: { rows: number; dataset_id?: string; csv?: string };
+  films: string[];
+  emotions: string[];
+  sentiment_categories: string[];
+  characters: { film: number; name: string; count: number }[];
+  character_means: number[][];   // [character][emotion]
+  film_means: number[][];        // [film][emotion]
+  character_sentiment: number[]; // Mean VADER compound score per character
+  sentiment_counts: number[][];  // [character][Negative, Neutral, Positive]
+  dominant_counts: number[][];   // [character][emotion]: lines where that emotion scored highest
+  correlation: { columns: string[]; matrices: Record<string, (number | null)[][]> };
+  boxes: Record<string, BoxStats[]>; // [measure][character]
+  histograms: { bins: number; ranges: Record<string, [number, number]>; counts: Record<string, number[][]> };
+}
+
+// --- Data Loading ---
+
+let bundlePromise: Promise<ChartBundle> | null = null;
+
+// One request per page, shared by every chart
+function loadBundle(): Promise<ChartBundle> {
+  if (!bundlePromise) {
+    bundlePromise = fetch(BUNDLE_URL)
+      .then((response) => {
+        if (!response.ok) throw new Error(`Could not load chart data (HTTP ${response.status})`);
+        return response.json() as Promise<ChartBundle>;
+      })
+      .then((bundle) => {
+        if (bundle.version !== BUNDLE_VERSION) throw new Error(`Unsupported chart data version ${bundle.version}`);
+        return bundle;
+      });
+    bundlePromise.catch(() => { bundlePromise = null; }); // Let a later mount retry
+  }
+  return bundlePromise;
+}
+
+function useChartBundle() {
+  const [bundle, setBundle] = useState<ChartBundle | null>(null);
+  const [error, setError] = useState<string | null>(null);
+  useEffect(() => {
+    let active = true;
+    loadBundle().then(
+      (loaded) => { if (active) setBundle(loaded); },
+      (e: Error) => { if (active) setError(e.message); },
+    );
+    return () => { active = false; };
+  }, []);
+  return { bundle, error };
+}
+
+// --- Shared Pieces ---
+
+// Same colors as the notebook figures: seaborn Set2 for emotions, tab10 blue/orange for the films
+const EMOTION_COLORS = ['#66c2a5', '#fc8d62', '#8da0cb', '#e78ac3', '#a6d854', '#ffd92f', '#e5c494', '#b3b3b3'];
+const FILM_COLORS: Record<string, string> = { 'Pulp Fiction': '#1f77b4', 'Goodfellas': '#ff7f0e' };
+const FALLBACK_FILM_COLORS = ['#2ca02c', '#d62728', '#9467bd', '#8c564b'];
+const NEUTRAL_COLOR = '#bdbdbd';
+
+const emotionColor = (index: number) => EMOTION_COLORS[index % EMOTION_COLORS.length];
+const filmColor = (films: string[], index: number) =>
+  FILM_COLORS[films[index]] ?? FALLBACK_FILM_COLORS[index % FALLBACK_FILM_COLORS.length];
+const label = (name: string) => (name === 'sentiment_score' ? 'VADER' : name);
+
+// Rounds an axis maximum up to the next multiple of `step`
+const niceMax = (value: number, step = 0.05) => Math.max(step, Math.ceil(value / step) * step);
+const ticks = (max: number, count = 5) => Array.from({ length: count + 1 }, (_, i) => (max * i) / count);
+
+type ChartFrameProps = {
+  bundle: ChartBundle | null;
+  error: string | null;
+  height: number;
+  children: (bundle: ChartBundle) => React.ReactNode;
+};
+
+// Reserves the chart's space while loading so the page does not jump
+const ChartFrame = ({ bundle, error, height, children }: ChartFrameProps) => {
+  if (!bundle) {
+    return (
+      <div className="flex w-full items-center justify-center rounded-md bg-muted text-sm text-muted-foreground"
+           style={{ aspectRatio: `760 / ${height}` }}>
+        {error ?? 'Loading chart…'}
+      </div>
+    );
+  }
+  return <div className="w-full">{children(bundle)}</div>;
+};
+
+const Legend = ({ items }: { items: { name: string; color: string }[] }) => (
+  <div className="flex flex-wrap justify-center gap-x-4 gap-y-1 text-xs text-muted-foreground mt-2">
+    {items.map((item) => (
+      <span key={item.name} className="flex items-center gap-1">
+        <span className="inline-block h-3 w-3 rounded-sm" style={{ backgroundColor: item.color }} />
+        {item.name}
+      </span>
+    ))}
+  </div>
+);
+
+type SelectProps = { value: string; options: { value: string; label: string }[]; onChange: (value: string) => void };
+
+const Select = ({ value, options, onChange }: SelectProps) => (
+  <select value={value} onChange={(e) => onChange(e.target.value)}
+          className="rounded-md border bg-background px-2 py-1 text-sm">
+    {options.map((option) => <option key={option.value} value={option.value}>{option.label}</option>)}
+  </select>
+);
+
+// Y axis with horizontal grid lines, for charts whose plot area starts at (left, top)
+const YAxis = ({ max, left, top, width, height, format }: {
+  max: number; left: number; top: number; width: number; height: number; format: (v: number) => string;
+}) => (
+  <g>
+    {ticks(max).map((tick) => {
+      const y = top + height - (tick / max) * height;
+      return (
+        <g key={tick}>
+          <line x1={left} x2={left + width} y1={y} y2={y} stroke="currentColor" strokeOpacity={0.12} />
+          <text x={left - 6} y={y} dy="0.32em" textAnchor="end" fontSize={11} fill="currentColor" fillOpacity={0.7}>
+            {format(tick)}
+          </text>
+        </g>
+      );
+    })}
+  </g>
+);
+
+// --- Figure: Average Emotion per Character ---
+
+export const CharacterEmotionChart = () => {
+  const { bundle, error } = useChartBundle();
+  const [hidden, setHidden] = useState<string[]>([]);
+  const [width, height, left, top, bottom] = [760, 360, 44, 12, 48];
+  return (
+    <ChartFrame bundle={bundle} error={error} height={height}>
+      {(data) => {
+        const shown = data.emotions.map((emotion, e) => ({ emotion, e })).filter(({ emotion }) => !hidden.includes(emotion));
+        const max = niceMax(Math.max(0, ...data.character_means.flatMap((row) => shown.map(({ e }) => row[e]))));
+        const plotWidth = width - left - 8;
+        const plotHeight = height - top - bottom;
+        const group = plotWidth / data.characters.length;
+        const bar = (group * 0.8) / Math.max(shown.length, 1);
+        return (
+          <>
+            <svg viewBox={`0 0 ${width} ${height}`} className="w-full h-auto" role="img"
+                 aria-label="Average emotion intensity per character">
+              <YAxis max={max} left={left} top={top} width={plotWidth} height={plotHeight} format={(v) => v.toFixed(2)} />
+              {data.characters.map((character, c) => (
+                <g key={`${character.film}-${character.name}`}>
+                  {shown.map(({ emotion, e }, i) => {
+                    const value = data.character_means[c][e];
+                    const barHeight = (value / max) * plotHeight;
+                    return (
+                      <rect key={emotion} x={left + c * group + group * 0.1 + i * bar} y={top + plotHeight - barHeight}
+                            width={bar} height={barHeight} fill={emotionColor(e)}>
+                        <title>{`${character.name} (${data.films[character.film]}): ${emotion} ${value.toFixed(3)}`}</title>
+                      </rect>
+                    );
+                  })}
+                  <text x={left + (c + 0.5) * group} y={top + plotHeight + 16} textAnchor="middle" fontSize={12} fill="currentColor">
+                    {character.name}
+                  </text>
+                  <text x={left + (c + 0.5) * group} y={top + plotHeight + 30} textAnchor="middle" fontSize={10}
+                        fill={filmColor(data.films, character.film)}>
+                    {data.films[character.film]}
+                  </text>
+                </g>
+              ))}
+            </svg>
+            {/* Click an emotion to hide or show it */}
+            <div className="flex flex-wrap justify-center gap-2 text-xs mt-2">
+              {data.emotions.map((emotion, e) => {
+                const off = hidden.includes(emotion);
+                return (
+                  <button key={emotion} type="button" aria-pressed={!off}
+                          onClick={() => setHidden(off ? hidden.filter((h) => h !== emotion) : [...hidden, emotion])}
+                          className={`flex items-center gap-1 rounded-md border px-2 py-0.5 ${off ? 'opacity-40' : ''}`}>
+                    <span className="inline-block h-3 w-3 rounded-sm" style={{ backgroundColor: emotionColor(e) }} />
+                    {emotion}
+                  </button>
+                );
+              })}
+            </div>
+          </>
+        );
+      }}
+    </ChartFrame>
+  );
+};
+
+// --- Figure: Film Emotional Profiles (Radar) ---
+
+export const FilmRadarChart = () => {
+  const { bundle, error } = useChartBundle();
+  const size = 420;
+  const [center, radius] = [size / 2, size / 2 - 60];
+  return (
+    <ChartFrame bundle={bundle} error={error} height={size}>
+      {(data) => {
+        const max = niceMax(Math.max(...data.film_means.flat()) * 1.1);
+        const point = (value: number, e: number): [number, number] => {
+          const angle = (2 * Math.PI * e) / data.emotions.length - Math.PI / 2; // First axis at the top, clockwise
+          return [center + (value / max) * radius * Math.cos(angle), center + (value / max) * radius * Math.sin(angle)];
+        };
+        return (
+          <>
+            <svg viewBox={`0 0 ${size} ${size}`} className="w-full h-auto" role="img" aria-label="Average emotion scores per film">
+              {ticks(max, 4).slice(1).map((tick) => (
+                <g key={tick}>
+                  <polygon points={data.emotions.map((_, e) => point(tick, e).join(',')).join(' ')}
+                           fill="none" stroke="currentColor" strokeOpacity={0.15} />
+                  <text x={center + 3} y={point(tick, 0)[1]} fontSize={9} fill="currentColor" fillOpacity={0.6}>{tick.toFixed(2)}</text>
+                </g>
+              ))}
+              {data.emotions.map((emotion, e) => {
+                const [x, y] = point(max, e);
+                const [lx, ly] = point(max * 1.18, e);
+                return (
+                  <g key={emotion}>
+                    <line x1={center} y1={center} x2={x} y2={y} stroke="currentColor" strokeOpacity={0.15} />
+                    <text x={lx} y={ly} dy="0.32em" textAnchor="middle" fontSize={12} fill="currentColor">{emotion}</text>
+                  </g>
+                );
+              })}
+              {data.films.map((film, f) => (
+                <polygon key={film} points={data.film_means[f].map((value, e) => point(value, e).join(',')).join(' ')}
+                         fill={filmColor(data.films, f)} fillOpacity={0.35} stroke={filmColor(data.films, f)} strokeWidth={2}>
+                  <title>{`${film}: ${data.emotions.map((emotion, e) => `${emotion} ${data.film_means[f][e].toFixed(2)}`).join(', ')}`}</title>
+                </polygon>
+              ))}
+            </svg>
+            <Legend items={data.films.map((film, f) => ({ name: film, color: filmColor(data.films, f) }))} />
+          </>
+        );
+      }}
+    </ChartFrame>
+  );
+};
+
+// --- Figure: Dominant Emotion per Character ---
+
+export const DominantEmotionChart = ({ film }: { film: string }) => {
+  const { bundle, error } = useChartBundle();
+  const [width, height, left, top, bottom] = [420, 320, 40, 24, 28];
+  return (
+    <ChartFrame bundle={bundle} error={error} height={height}>
+      {(data) => {
+        const f = data.films.indexOf(film);
+        const rows = data.characters.map((character, c) => ({ character, c })).filter(({ character }) => character.film === f);
+        const colors = data.emotions.map((emotion, e) => (emotion === 'neutral' ? NEUTRAL_COLOR : emotionColor(e)));
+        const plotWidth = width - left - 8;
+        const plotHeight = height - top - bottom;
+        const slot = plotWidth / Math.max(rows.length, 1);
+        return (
+          <>
+            <svg viewBox={`0 0 ${width} ${height}`} className="w-full h-auto" role="img"
+                 aria-label={`Dominant emotion per character in ${film}`}>
+              <text x={width / 2} y={14} textAnchor="middle" fontSize={13} fill="currentColor">{film}</text>
+              <YAxis max={100} left={left} top={top} width={plotWidth} height={plotHeight} format={(v) => `${v}%`} />
+              {rows.map(({ character, c }, i) => {
+                const total = data.dominant_counts[c].reduce((sum, n) => sum + n, 0) || 1;
+                let offset = 0;
+                return (
+                  <g key={character.name}>
+                    {data.dominant_counts[c].map((n, e) => {
+                      const share = (n / total) * 100;
+                      const y = top + plotHeight - ((offset + share) / 100) * plotHeight;
+                      offset += share;
+                      return n > 0 && (
+                        <rect key={e} x={left + i * slot + slot * 0.15} y={y} width={slot * 0.7}
+                              height={(share / 100) * plotHeight} fill={colors[e]}>
+                          <title>{`${character.name}: ${data.emotions[e]} ${share.toFixed(0)}% (${n} lines)`}</title>
+                        </rect>
+                      );
+                    })}
+                    <text x={left + (i + 0.5) * slot} y={top + plotHeight + 16} textAnchor="middle" fontSize={12} fill="currentColor">
+                      {character.name}
+                    </text>
+                  </g>
+                );
+              })}
+            </svg>
+            <Legend items={data.emotions.map((emotion, e) => ({ name: emotion, color: colors[e] }))} />
+          </>
+        );
+      }}
+    </ChartFrame>
+  );
+};
+
+// --- Figure: Correlation Heatmap ---
+
+// Diverging blue-white-red scale for -1..1, close to matplotlib's coolwarm
+const COOLWARM_LOW = [59, 76, 192];
+const COOLWARM_MID = [221, 221, 221];
+const COOLWARM_HIGH = [180, 4, 38];
+
+const correlationColor = (value: number) => {
+  const to = value < 0 ? COOLWARM_LOW : COOLWARM_HIGH;
+  const t = Math.min(Math.abs(value), 1);
+  return `rgb(${COOLWARM_MID.map((channel, i) => Math.round(channel + (to[i] - channel) * t)).join(',')})`;
+};
+
+export const CorrelationHeatmap = () => {
+  const { bundle, error } = useChartBundle();
+  const [scope, setScope] = useState('all');
+  const size = 480;
+  const [left, top] = [76, 8];
+  return (
+    <ChartFrame bundle={bundle} error={error} height={size}>
+      {(data) => {
+        const columns = data.correlation.columns;
+        const matrix = data.correlation.matrices[scope] ?? data.correlation.matrices.all;
+        const cell = (size - left - 8) / columns.length;
+        return (
+          <>
+            <div className="flex justify-center mb-2">
+              <Select value={scope} onChange={setScope}
+                      options={[{ value: 'all', label: 'Both films' }, ...data.films.map((film) => ({ value: film, label: film }))]} />
+            </div>
+            <svg viewBox={`0 0 ${size} ${size}`} className="w-full h-auto" role="img" aria-label="Correlation between VADER sentiment and emotions">
+              {matrix.map((row, i) => row.map((value, j) => (
+                <g key={`${i}-${j}`}>
+                  <rect x={left + j * cell} y={top + i * cell} width={cell} height={cell}
+                        fill={value === null ? 'transparent' : correlationColor(value)} stroke="white" />
+                  <text x={left + (j + 0.5) * cell} y={top + (i + 0.5) * cell} dy="0.32em" textAnchor="middle" fontSize={11}
+                        fill={value !== null && Math.abs(value) > 0.6 ? 'white' : '#222'}>
+                    {value === null ? '–' : value.toFixed(2)}
+                  </text>
+                </g>
+              )))}
+              {columns.map((column, i) => (
+                <g key={column}>
+                  <text x={left - 6} y={top + (i + 0.5) * cell} dy="0.32em" textAnchor="end" fontSize={11} fill="currentColor">
+                    {label(column)}
+                  </text>
+                  <text x={left + (i + 0.5) * cell} y={top + columns.length * cell + 14} textAnchor="middle" fontSize={11} fill="currentColor">
+                    {label(column)}
+                  </text>
+                </g>
+              ))}
+            </svg>
+          </>
+        );
+      }}
+    </ChartFrame>
+  );
+};
+
+// --- Figure: Score Distribution per Character ---
+
+export const EmotionDistributionChart = ({ defaultMeasure = 'anger' }: { defaultMeasure?: string }) => {
+  const { bundle, error } = useChartBundle();
+  const [measure, setMeasure] = useState(defaultMeasure);
+  const [view, setView] = useState('box');
+  const [width, height, left, top, bottom] = [760, 340, 44, 12, 36];
+  return (
+    <ChartFrame bundle={bundle} error={error} height={height}>
+      {(data) => {
+        const [low, high] = data.histograms.ranges[measure];
+        const plotWidth = width - left - 8;
+        const plotHeight = height - top - bottom;
+        const y = (value: number) => top + plotHeight - ((value - low) / (high - low)) * plotHeight;
+        const e = data.emotions.indexOf(measure);
+        const mean = (c: number) => (e >= 0 ? data.character_means[c][e] : data.character_sentiment[c]);
+        // Characters ordered by mean score, as in the notebook figure
+        const order = data.characters.map((_, c) => c).sort((a, b) => mean(b) - mean(a));
+        const slot = plotWidth / order.length;
+        const options = [...data.emotions, 'sentiment_score'].map((m) => ({ value: m, label: m === 'sentiment_score' ? 'VADER compound' : m }));
+
+        const boxes = order.map((c, i) => {
+          const [whiskerLow, q1, median, q3, whiskerHigh] = data.boxes[measure][c];
+          const character = data.characters[c];
+          const [x, w] = [left + i * slot + slot * 0.2, slot * 0.6];
+          const color = filmColor(data.films, character.film);
+          return (
+            <g key={`${character.film}-${character.name}`}>
+              <line x1={x + w / 2} x2={x + w / 2} y1={y(whiskerLow)} y2={y(whiskerHigh)} stroke="#555" />
+              <rect x={x} y={y(q3)} width={w} height={Math.max(y(q1) - y(q3), 1)} fill={color} fillOpacity={0.75} stroke="#555">
+                <title>{`${character.name}: median ${median.toFixed(3)}, quartiles ${q1.toFixed(3)}–${q3.toFixed(3)}, mean ${mean(c).toFixed(3)}`}</title>
+              </rect>
+              <line x1={x} x2={x + w} y1={y(median)} y2={y(median)} stroke="#222" strokeWidth={2} />
+              <text x={x + w / 2} y={top + plotHeight + 16} textAnchor="middle" fontSize={12} fill="currentColor">{character.name}</text>
+            </g>
+          );
+        });
+
+        // Share of each film's lines per score bin
+        const bins = data.histograms.bins;
+        const shares = data.histograms.counts[measure].map((counts) => {
+          const total = counts.reduce((sum, n) => sum + n, 0) || 1;
+          return counts.map((n) => (n / total) * 100);
+        });
+        const maxShare = niceMax(Math.max(...shares.flat()), 5);
+        const binWidth = plotWidth / bins;
+        const histogram = shares.map((film, f) => film.map((share, b) => (
+          <rect key={`${f}-${b}`} x={left + b * binWidth + 1} width={binWidth - 2}
+                y={top + plotHeight - (share / maxShare) * plotHeight} height={(share / maxShare) * plotHeight}
+                fill={filmColor(data.films, f)} fillOpacity={0.45}>
+            <title>{`${data.films[f]}: ${share.toFixed(1)}% of lines in ${(low + (b * (high - low)) / bins).toFixed(2)}–${(low + ((b + 1) * (high - low)) / bins).toFixed(2)}`}</title>
+          </rect>
+        )));
+
+        return (
+          <>
+            <div className="flex justify-center gap-2 mb-2">
+              <Select value={measure} onChange={setMeasure} options={options} />
+              <Select value={view} onChange={setView}
+                      options={[{ value: 'box', label: 'Per character' }, { value: 'histogram', label: 'Per film' }]} />
+            </div>
+            <svg viewBox={`0 0 ${width} ${height}`} className="w-full h-auto" role="img"
+                 aria-label={`Distribution of ${label(measure)} scores`}>
+              {view === 'box' ? (
+                <>
+                  {ticks(high - low, 4).map((tick) => (
+                    <g key={tick}>
+                      <line x1={left} x2={left + plotWidth} y1={y(low + tick)} y2={y(low + tick)} stroke="currentColor" strokeOpacity={0.12} />
+                      <text x={left - 6} y={y(low + tick)} dy="0.32em" textAnchor="end" fontSize={11} fill="currentColor" fillOpacity={0.7}>
+                        {(low + tick).toFixed(2)}
+                      </text>
+                    </g>
+                  ))}
+                  {boxes}
+                </>
+              ) : (
+                <>
+                  <YAxis max={maxShare} left={left} top={top} width={plotWidth} height={plotHeight} format={(v) => `${v}%`} />
+                  {histogram}
+                  {[0, bins / 2, bins].map((b) => (
+                    <text key={b} x={left + b * binWidth} y={top + plotHeight + 16} textAnchor="middle" fontSize={11} fill="currentColor">
+                      {(low + (b * (high - low)) / bins).toFixed(1)}
+                    </text>
+                  ))}
+                </>
+              )}
+            </svg>
+            <Legend items={data.films.map((film, f) => ({ name: film, color: filmColor(data.films, f) }))} />
+          </>
+        );
+      }}
+    </ChartFrame>
+  );
+};
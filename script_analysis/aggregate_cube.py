@@ -0,0 +1,348 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dialogue_store import (DATASET_ID_KEY, DEFAULT_STORE_DIR, EMOTION_GROUP, column_groups, current_dataset_id,
+                            group_path, list_groups, read_columns)
+from emotion_inference import EMOTION_LABELS
+
+# --- Configuration ---
+CUBE_DIRNAME = 'cube'                # <store>/cube/cells.arrow and sketches.arrow
+CUBE_INFO_KEY = b'cube_info'         # Schema metadata: dataset id, source groups, measures
+KEY_COLUMNS = ['film', 'character', 'sentiment_category']
+
+# Categories of the VADER compound score, with the usual +/-0.05 cut-offs
+SENTIMENT_CATEGORIES = ['Negative', 'Neutral', 'Positive']
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+# Quantile sketches bin every value to this grid. VADER compound scores are
+# already rounded to 4 decimals, so their medians come out exact; emotion
+# probabilities are within half a step of the true value.
+SKETCH_RESOLUTION = 1e-4
+SKETCH_DECIMALS = 4
+# Value range of every measure the cube can sketch: VADER's compound score, its
+# neg/neu/pos shares and the emotion probabilities
+MEASURE_RANGES = {'sentiment_score': (-1.0, 1.0),
+                  'vader_neg': (0.0, 1.0), 'vader_neu': (0.0, 1.0), 'vader_pos': (0.0, 1.0),
+                  **{emotion: (0.0, 1.0) for emotion in EMOTION_LABELS}}
+
+# --- Helper Functions ---
+
+def sentiment_category_codes(scores):
+    """Sentiment category of each score: 0 = Negative, 1 = Neutral, 2 = Positive."""
+    scores = np.asarray(scores, dtype=np.float64)
+    return np.select([scores >= POSITIVE_THRESHOLD, scores <= NEGATIVE_THRESHOLD], [2, 0], default=1).astype(np.int8)
+
+def sentiment_categories(scores):
+    """Sentiment category of each score as a categorical backed by the int8 codes above."""
+    return pd.Categorical.from_codes(sentiment_category_codes(scores), SENTIMENT_CATEGORIES)
+
+def factorize_keys(keys, sort=False):
+    """Codes for each row of a key DataFrame, and the distinct keys as a named MultiIndex."""
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(keys), sort=sort)
+    return codes, uniques.set_names(list(keys.columns))
+
+def measure_range(measure):
+    """
+    Returns the (low, high) range a measure's sketch bins cover.
+
+    Raises:
+        KeyError: For a measure with no known range, rather than guessing one
+            and clipping its values (add it to MEASURE_RANGES).
+    """
+    try:
+        return MEASURE_RANGES[measure]
+    except KeyError:
+        raise KeyError(f"No value range known for measure '{measure}'; add it to MEASURE_RANGES.") from None
+
+def to_bins(values, measure):
+    low, high = measure_range(measure)
+    clipped = np.clip(values, low, high)
+    return np.rint((clipped - low) / SKETCH_RESOLUTION).astype(np.int64)
+
+def from_bins(bins, measure):
+    low, _ = measure_range(measure)
+    return np.round(low + bins * SKETCH_RESOLUTION, SKETCH_DECIMALS)
+
+# --- Aggregate Cube ---
+
+class AggregateCube:
+    """
+    Mergeable summaries of the score columns at film x character x sentiment_category.
+
+    Every cell keeps, per measure, the row count, sum, sum of squares and a
+    sparse histogram of values (the quantile sketch). Any slice - per film,
+    per character, per category, or any combination - is answered by adding
+    cells, so a query costs O(cells) however many dialogues the corpus holds.
+
+    Attributes:
+        cells (pd.DataFrame): One row per cell: the key columns, 'count' and
+            '<measure>_sum' / '<measure>_sumsq' for each measure.
+        sketches (pd.DataFrame): Long format (cell, measure, bin, count);
+            'cell' is the row position in `cells`.
+        measures (list): Score columns summarized.
+    """
+
+    def __init__(self, cells, sketches, measures):
+        self.cells = cells.reset_index(drop=True)
+        self.sketches = sketches
+        self.measures = list(measures)
+
+    @classmethod
+    def from_frame(cls, df, measures):
+        """
+        Builds a cube from dialogue rows in one vectorized pass.
+
+        Args:
+            df (pd.DataFrame): Rows with 'film', 'character', 'sentiment_score'
+                and every column in `measures`; a 'sentiment_category' column
+                (categorical or plain labels, e.g. read from CSV) is used
+                instead of recomputing it.
+            measures (list): Score columns to summarize.
+
+        Raises:
+            ValueError: If 'sentiment_category' holds a label not in SENTIMENT_CATEGORIES.
+        """
+        if 'sentiment_category' in df.columns:
+            labels = df['sentiment_category']
+            unknown = labels[~labels.isin(SENTIMENT_CATEGORIES)]
+            if len(unknown):
+                raise ValueError(f"Unknown sentiment categories {list(pd.unique(unknown.to_numpy()))}; "
+                                 f"expected {SENTIMENT_CATEGORIES}.")
+            category = pd.Categorical(labels, categories=SENTIMENT_CATEGORIES).codes
+        else:
+            category = sentiment_category_codes(df['sentiment_score'])
+        keys = pd.DataFrame({'film': df['film'].to_numpy(), 'character': df['character'].to_numpy(),
+                             'sentiment_category': category})
+        cell_codes, uniques = factorize_keys(keys)
+        n_cells = len(uniques)
+
+        cells = uniques.to_frame(index=False)
+        cells['sentiment_category'] = pd.Categorical.from_codes(
+            cells['sentiment_category'].astype(np.int8), SENTIMENT_CATEGORIES)
+        cells['count'] = np.bincount(cell_codes, minlength=n_cells)
+        sketches = []
+        for m, measure in enumerate(measures):
+            values = df[measure].to_numpy(dtype=np.float64)
+            cells[f'{measure}_sum'] = np.bincount(cell_codes, weights=values, minlength=n_cells)
+            cells[f'{measure}_sumsq'] = np.bincount(cell_codes, weights=values * values, minlength=n_cells)
+            # One histogram entry per distinct (cell, bin)
+            combined = cell_codes.astype(np.int64) * (1 << 32) + to_bins(values, measure)
+            unique, counts = np.unique(combined, return_counts=True)
+            sketches.append(pd.DataFrame({'cell': (unique >> 32).astype(np.int32), 'measure': np.int16(m),
+                                          'bin': (unique & 0xFFFFFFFF).astype(np.int32), 'count': counts}))
+        return cls(cells, pd.concat(sketches, ignore_index=True), measures)
+
+    # --- Merging ---
+
+    def merge(self, other):
+        """Returns a new cube combining two cubes over the same measures (e.g. two films' partitions)."""
+        if other.measures != self.measures:
+            raise ValueError(f"Cannot merge cubes over {other.measures} and {self.measures}.")
+        cells = pd.concat([self.cells, other.cells], ignore_index=True)
+        sketches = pd.concat([self.sketches,
+                              other.sketches.assign(cell=other.sketches['cell'] + len(self.cells))],
+                             ignore_index=True)
+        codes, uniques = factorize_keys(cells[KEY_COLUMNS].astype(object))
+        merged = uniques.to_frame(index=False)
+        merged['sentiment_category'] = pd.Categorical(merged['sentiment_category'], SENTIMENT_CATEGORIES)
+        value_columns = [column for column in cells.columns if column not in KEY_COLUMNS]
+        for column in value_columns:
+            merged[column] = np.bincount(codes, weights=cells[column].to_numpy(dtype=np.float64),
+                                         minlength=len(uniques))
+        merged['count'] = merged['count'].astype(np.int64)
+        sketches['cell'] = codes[sketches['cell'].to_numpy()]
+        sketches = sketches.groupby(['cell', 'measure', 'bin'], as_index=False, sort=True)['count'].sum()
+        return AggregateCube(merged, sketches, self.measures)
+
+    # --- Queries ---
+
+    def group_codes(self, by):
+        """Maps each cell to its output group for a `by` list of key columns."""
+        by = list(by)
+        if not by:
+            return np.zeros(len(self.cells), dtype=np.int64), pd.Index(['all'])
+        codes, index = factorize_keys(self.cells[by].astype(object), sort=True)
+        return codes, index if len(by) > 1 else index.get_level_values(0)
+
+    def filtered(self, where):
+        """Returns a cube restricted to cells whose key columns match `where` (column -> value or list)."""
+        if not where:
+            return self
+        mask = np.ones(len(self.cells), dtype=bool)
+        for column, value in where.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            mask &= self.cells[column].isin(values).to_numpy()
+        keep = np.flatnonzero(mask)
+        renumber = np.full(len(self.cells), -1)
+        renumber[keep] = np.arange(len(keep))
+        sketches = self.sketches[mask[self.sketches['cell'].to_numpy()]]
+        sketches = sketches.assign(cell=renumber[sketches['cell'].to_numpy()])
+        return AggregateCube(self.cells.iloc[keep], sketches, self.measures)
+
+    def counts(self, by=('film', 'character')):
+        """Number of dialogues per group."""
+        codes, index = self.group_codes(by)
+        return pd.Series(np.bincount(codes, weights=self.cells['count'], minlength=len(index)).astype(np.int64),
+                         index=index, name='count')
+
+    def means(self, measures=None, by=('film', 'character'), where=None):
+        """Mean of each measure per group, as a DataFrame with one column per measure."""
+        cube = self.filtered(where)
+        codes, index = cube.group_codes(by)
+        counts = np.bincount(codes, weights=cube.cells['count'], minlength=len(index))
+        return pd.DataFrame({measure: np.bincount(codes, weights=cube.cells[f'{measure}_sum'], minlength=len(index)) / counts
+                             for measure in (measures or self.measures)}, index=index)
+
+    def quantile(self, measure, q=0.5, by=('film', 'character'), where=None):
+        """
+        Quantile of a measure per group from the sketches.
+
+        Uses the same linear interpolation between order statistics as
+        pandas, so a median over an even count averages the two middle values.
+        """
+        cube = self.filtered(where)
+        codes, index = cube.group_codes(by)
+        sketch = cube.sketches[cube.sketches['measure'] == cube.measures.index(measure)]
+        group = codes[sketch['cell'].to_numpy()]
+        # Histogram per group, sorted by group then value
+        order = np.lexsort((sketch['bin'].to_numpy(), group))
+        group, bins, counts = group[order], sketch['bin'].to_numpy()[order], sketch['count'].to_numpy()[order]
+        boundaries = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+
+        result = np.full(len(index), np.nan)
+        for start, end in zip(boundaries, np.r_[boundaries[1:], len(group)]):
+            cumulative = np.cumsum(counts[start:end])
+            position = q * (cumulative[-1] - 1)
+            lower, upper = int(np.floor(position)), int(np.ceil(position))
+            # The bin holding the k-th value (0-based) is the first whose cumulative count exceeds k
+            low_value, high_value = from_bins(bins[start:end][np.searchsorted(cumulative, [lower, upper], side='right')], measure)
+            result[group[start]] = low_value + (high_value - low_value) * (position - lower)
+        return pd.Series(result, index=index, name=measure)
+
+    def stats(self, measure='sentiment_score', by=('film', 'character'), where=None):
+        """
+        Mean, median, std and count of a measure per group.
+
+        Returns the columns of df.groupby(by)[measure].agg(['mean', 'median',
+        'std', 'count']); std is the sample standard deviation (NaN for
+        single-row groups) and the median comes from the sketches (see quantile).
+        """
+        cube = self.filtered(where)
+        codes, index = cube.group_codes(by)
+        count = np.bincount(codes, weights=cube.cells['count'], minlength=len(index))
+        total = np.bincount(codes, weights=cube.cells[f'{measure}_sum'], minlength=len(index))
+        total_sq = np.bincount(codes, weights=cube.cells[f'{measure}_sumsq'], minlength=len(index))
+        mean = total / count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = np.where(count > 1, (total_sq - count * mean ** 2) / (count - 1), np.nan)
+        return pd.DataFrame({'mean': mean, 'median': cube.quantile(measure, 0.5, by).to_numpy(),
+                             'std': np.sqrt(np.maximum(var, 0)), 'count': count.astype(np.int64)}, index=index)
+
+    def category_counts(self, by=('film', 'character'), where=None):
+        """Dialogue counts per group and sentiment category (columns in Negative/Neutral/Positive order)."""
+        cube = self.filtered(where)
+        table = cube.cells.groupby(list(by) + ['sentiment_category'], observed=False)['count'].sum()
+        counts = table.unstack('sentiment_category', fill_value=0).reindex(columns=SENTIMENT_CATEGORIES, fill_value=0)
+        counts.columns = list(counts.columns)
+        # Drop group combinations that do not occur (e.g. a film's characters under another film)
+        return counts[counts.sum(axis=1) > 0].astype(np.int64)
+
+# --- Storage ---
+
+def cube_dir(store_dir=DEFAULT_STORE_DIR):
+    return os.path.join(store_dir, CUBE_DIRNAME)
+
+def source_signature(store_dir, measures):
+    """Identifies the exact group files a cube was built from (dataset id plus size/mtime per group)."""
+    mapping = column_groups(store_dir)
+    groups = sorted({mapping[measure] for measure in measures})
+    signature = {'dataset_id': current_dataset_id(store_dir), 'groups': {}}
+    for group in groups:
+        stat = os.stat(group_path(group, store_dir))
+        signature['groups'][group] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+def save_cube(cube, store_dir=DEFAULT_STORE_DIR):
+    """Writes the cube next to the groups it summarizes (call after those groups are written)."""
+    directory = cube_dir(store_dir)
+    os.makedirs(directory, exist_ok=True)
+    info = dict(source_signature(store_dir, cube.measures), measures=cube.measures)
+    metadata = {CUBE_INFO_KEY: json.dumps(info).encode(), DATASET_ID_KEY: info['dataset_id'].encode()}
+    for name, frame in (('cells', cube.cells), ('sketches', cube.sketches)):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata(metadata)
+        path = os.path.join(directory, f"{name}.arrow")
+        with pa.ipc.new_file(path + '.tmp', table.schema) as writer:
+            writer.write_table(table)
+        os.replace(path + '.tmp', path)
+
+def load_cube(store_dir=DEFAULT_STORE_DIR, measures=None):
+    """
+    Loads the saved cube, or returns None if it is missing, stale or lacks a measure.
+
+    A cube is stale once any group it was built from has been rewritten.
+    """
+    directory = cube_dir(store_dir)
+    paths = [os.path.join(directory, f"{name}.arrow") for name in ('cells', 'sketches')]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    tables = [pa.ipc.open_file(pa.memory_map(path, 'r')).read_all() for path in paths]
+    info = json.loads(tables[0].schema.metadata[CUBE_INFO_KEY])
+    if any(measure not in info['measures'] for measure in measures or []):
+        return None
+    try:
+        if source_signature(store_dir, info['measures']) != {'dataset_id': info['dataset_id'],
+                                                              'groups': info['groups']}:
+            return None
+    except (KeyError, FileNotFoundError):
+        return None
+    cells = tables[0].to_pandas()
+    cells['sentiment_category'] = pd.Categorical(cells['sentiment_category'], SENTIMENT_CATEGORIES)
+    return AggregateCube(cells, tables[1].to_pandas(), info['measures'])
+
+def store_measures(store_dir=DEFAULT_STORE_DIR):
+    """The score columns available in a store: the VADER compound score plus every emotion column."""
+    measures = ['sentiment_score']
+    if EMOTION_GROUP in list_groups(store_dir):
+        measures += [name for name, group in column_groups(store_dir).items() if group == EMOTION_GROUP]
+    return measures
+
+def ensure_cube(store_dir=DEFAULT_STORE_DIR, measures=None):
+    """Returns an up-to-date cube, rebuilding it from the store (one column scan) only if needed."""
+    cube = load_cube(store_dir, measures)
+    if cube is None:
+        measures = store_measures(store_dir)
+        df = read_columns(['film', 'character'] + measures, store_dir, compact=True)
+        cube = AggregateCube.from_frame(df, measures)
+        save_cube(cube, store_dir)
+    return cube
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query the precomputed aggregate cube.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Store directory.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help="Rebuild the cube from the store.")
+    stats_parser = subparsers.add_parser('stats', help="Print mean/median/std/count for a slice.")
+    stats_parser.add_argument('--measure', default='sentiment_score')
+    stats_parser.add_argument('--by', nargs='*', default=['film', 'character'], choices=KEY_COLUMNS)
+    stats_parser.add_argument('--film', help="Only this film.")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        measures = store_measures(args.store)
+        cube = AggregateCube.from_frame(read_columns(['film', 'character'] + measures, args.store, compact=True),
+                                        measures)
+        save_cube(cube, args.store)
+        print(f"Saved cube with {len(cube.cells)} cells, {len(cube.sketches)} sketch entries "
+              f"and measures {cube.measures} to {cube_dir(args.store)}")
+    else:
+        cube = ensure_cube(args.store, [args.measure])
+        print(cube.stats(args.measure, by=args.by, where={'film': args.film} if args.film else None))
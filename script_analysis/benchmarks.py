@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+
+from instrumentation import peak_rss_mb
+
+# --- Configuration ---
+SCALES = (1, 10, 100, 1000)
+DEFAULT_SCALES = (1, 10, 100)      # 1000x is ~280 MB of screenplay; ask for it explicitly
+BASE_SCRIPT_BYTES = 280_000         # Roughly the size of each bundled screenplay
+DEFAULT_DATA_DIR = 'benchmark_data'
+DEFAULT_RESULTS_PATH = 'benchmark_results.json'
+EMOTION_ROW_LIMIT = 2_000           # The emotion stages are timed on at most this many rows
+REGRESSION_THRESHOLD = 1.2          # --compare flags stages whose rows/s dropped by more than this factor
+SYNTHETIC_FILM = 'Synthetic'
+
+STAGES = ('parse', 'parse_streaming', 'parse_mmap', 'clean', 'vader', 'vader_batch',
+          'emotion', 'emotion_batched', 'cube', 'plots')
+DEFAULT_STAGES = ('parse', 'parse_streaming', 'parse_mmap', 'clean', 'vader', 'vader_batch', 'cube', 'plots')
+
+# Same indentation as the bundled scripts (see the heuristics in prepare_data.py)
+ACTION_INDENT = ' ' * 15
+DIALOGUE_INDENT = ' ' * 25
+PARENTHETICAL_INDENT = ' ' * 30
+CUE_INDENT = ' ' * 37
+TRANSITION_INDENT = ' ' * 65
+
+CHARACTERS = ['VINCENT', 'JULES', 'MIA', 'BUTCH', 'MARSELLUS', 'HENRY', 'TOMMY', 'JIMMY', 'KAREN', 'PAULIE']
+CUE_EXTENSIONS = [' (O.S.)', ' (V.O.)', " (CONT'D)"]
+LOCATIONS = ['COFFEE SHOP', "JACKRABBIT SLIM'S", 'APARTMENT', 'CAR', 'BAR', 'KITCHEN', 'PAWNSHOP', 'AIRPORT']
+TIMES = ['DAY', 'NIGHT', 'MORNING', 'CONTINUOUS']
+PARENTHETICALS = ['(beat)', '(smiling)', '(to Henry)', '(laughing)', '(under his breath)', '(pause)']
+TRANSITIONS = ['CUT TO:', 'DISSOLVE TO:']
+WORDS = ("i you we they it the a this that what where when why how is are was were do don't gonna "
+         "got get know think want tell said man guy money car gun door house night time "
+         "thing way place here there now never always just really very so not yeah okay").split()
+SENTIMENT_WORDS = ("good great love nice happy beautiful funny best friend cool glad no "
+                   "bad hate kill dead sad sorry terrible wrong fucking damn shit hell crazy scared").split()
+SENTIMENT_WORD_RATE = 0.06 # Share of words in the VADER lexicon, close to the bundled scripts
+
+# --- Synthetic Screenplay Generator ---
+
+def random_sentence(rng):
+    words = [rng.choice(SENTIMENT_WORDS if rng.random() < SENTIMENT_WORD_RATE else WORDS)
+             for _ in range(rng.randint(3, 16))]
+    return words[0].capitalize() + ' ' + ' '.join(words[1:]) + rng.choice(['.', '.', '.', '!', '?'])
+
+def generate_scene(rng):
+    """Returns the lines of one scene: heading, action, then a run of dialogue blocks."""
+    lines = [f"{ACTION_INDENT}{rng.choice(['INT.', 'EXT.'])} {rng.choice(LOCATIONS)} - {rng.choice(TIMES)}", '']
+    action = ' '.join(random_sentence(rng) for _ in range(rng.randint(1, 4)))
+    lines += [ACTION_INDENT + line for line in textwrap.wrap(action, 60)] + ['']
+
+    cast = rng.sample(CHARACTERS, rng.randint(2, 4))
+    for _ in range(rng.randint(4, 12)):
+        cue = rng.choice(cast)
+        if rng.random() < 0.1:
+            cue += rng.choice(CUE_EXTENSIONS)
+        lines.append(CUE_INDENT + cue)
+        if rng.random() < 0.2:
+            lines.append(PARENTHETICAL_INDENT + rng.choice(PARENTHETICALS))
+        speech = ' '.join(random_sentence(rng) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.1:
+            # Inline stage directions exercise the parenthetical removal in clean_dialogue
+            speech += f" {rng.choice(PARENTHETICALS)} {random_sentence(rng)}"
+        lines += [DIALOGUE_INDENT + line for line in textwrap.wrap(speech, 35)] + ['']
+
+    if rng.random() < 0.3:
+        lines += [TRANSITION_INDENT + rng.choice(TRANSITIONS), '']
+    return lines
+
+def generate_screenplay(path, target_bytes, seed=0):
+    """
+    Writes a synthetic screenplay of about `target_bytes` in the bundled scripts' layout.
+
+    Character cues are indented 37 spaces and dialogue 25, so the text goes
+    through the same parse_script heuristics as the real scripts. Output is
+    streamed to disk and is deterministic for a given seed.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    rng = random.Random(seed)
+    written = 0
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target_bytes:
+            chunk = '\n'.join(generate_scene(rng)) + '\n'
+            f.write(chunk)
+            written += len(chunk.encode('utf-8'))
+    return written
+
+def synthetic_script_path(scale, data_dir=DEFAULT_DATA_DIR):
+    return os.path.join(data_dir, f"synthetic_{scale}x.txt")
+
+def ensure_synthetic_script(scale, data_dir=DEFAULT_DATA_DIR):
+    """Generates the screenplay for a scale unless it is already on disk."""
+    path = synthetic_script_path(scale, data_dir)
+    if not os.path.exists(path):
+        print(f"Generating {scale}x synthetic screenplay...")
+        generate_screenplay(path, BASE_SCRIPT_BYTES * scale, seed=scale)
+    return path
+
+# --- Stages ---
+# Each stage takes the synthetic script path, builds its input (untimed) and
+# returns a function that runs the stage and returns the number of rows processed.
+
+def parsed_records(path, parse_script):
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        return parse_script(path, SYNTHETIC_FILM, None)
+
+def cleaned_frame(path):
+    from screenplay_tokenizer import dialogue_frame, parse_script_streaming
+
+    return dialogue_frame(parse_script_streaming(path, SYNTHETIC_FILM, None))
+
+def scored_frame(path):
+    from vader_batch import BatchVaderScorer
+
+    df = cleaned_frame(path)[['film', 'character', 'cleaned_dialogue']]
+    df['sentiment_score'] = BatchVaderScorer().score(df['cleaned_dialogue'].tolist())['compound']
+    return df
+
+def load_classifier():
+    from emotion_inference import load_emotion_model
+
+    return load_emotion_model()
+
+def setup_stage(stage, path):
+    if stage == 'parse':
+        from prepare_data import parse_script
+        return lambda: len(parsed_records(path, parse_script))
+
+    if stage == 'parse_streaming':
+        from screenplay_tokenizer import parse_script_streaming
+        return lambda: len(parse_script_streaming(path, SYNTHETIC_FILM, None))
+
+    if stage == 'parse_mmap':
+        from script_index import read_script_spans
+        return lambda: len(read_script_spans(path, SYNTHETIC_FILM, None))
+
+    if stage == 'clean':
+        from prepare_data import clean_dialogue, parse_script
+        dialogues = [record['dialogue'] for record in parsed_records(path, parse_script)]
+        return lambda: len([clean_dialogue(text) for text in dialogues])
+
+    if stage == 'vader':
+        # Per-row analyzer.polarity_scores, as sentiment_analysis.py did before batch scoring
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        analyzer = SentimentIntensityAnalyzer()
+        texts = cleaned_frame(path)['cleaned_dialogue'].tolist()
+        return lambda: len([analyzer.polarity_scores(text)['compound'] for text in texts])
+
+    if stage == 'vader_batch':
+        from vader_batch import BatchVaderScorer
+        scorer = BatchVaderScorer()
+        texts = cleaned_frame(path)['cleaned_dialogue'].tolist()
+        return lambda: len(scorer.score(texts)['compound'])
+
+    if stage == 'emotion':
+        # What bert-analysis.analyze_emotions does: one pipeline call per dialogue
+        from transformers import pipeline
+        model, tokenizer, _, device = load_classifier()
+        classifier = pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None, device=device)
+        texts = cleaned_frame(path)['cleaned_dialogue'].tolist()[:EMOTION_ROW_LIMIT]
+        return lambda: len([classifier(text) for text in texts])
+
+    if stage == 'emotion_batched':
+        from emotion_inference import classify_batched
+        model, tokenizer, emotion_columns, device = load_classifier()
+        texts = cleaned_frame(path)['cleaned_dialogue'].tolist()[:EMOTION_ROW_LIMIT]
+        return lambda: len(classify_batched(texts, model, tokenizer, emotion_columns, device=device))
+
+    if stage == 'cube':
+        # Build the aggregate cube, then answer the per-character and per-film reports from it
+        from aggregate_cube import AggregateCube
+        df = scored_frame(path)
+
+        def build_and_query():
+            cube = AggregateCube.from_frame(df, ['sentiment_score'])
+            cube.stats(by=['film', 'character'])
+            cube.stats(by=['film'])
+            cube.category_counts(by=['film', 'character'])
+            return len(df)
+        return build_and_query
+
+    if stage == 'plots':
+        import matplotlib
+        matplotlib.use('Agg')
+        from aggregate_cube import AggregateCube
+        from visualizations import render_all
+        df = scored_frame(path)
+        cube = AggregateCube.from_frame(df, ['sentiment_score'])
+        output_dir = tempfile.mkdtemp(prefix='bench_plots_')
+        return lambda: (render_all(df, cube, output_dir, workers=1, force=True), len(df))[1]
+
+    raise ValueError(f"Unknown stage '{stage}'; choose from {STAGES}.")
+
+def run_stage(stage, scale, path):
+    """Times one stage in the current process and returns its measurements."""
+    fn = setup_stage(stage, path)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    rows = fn()
+    seconds = time.perf_counter() - start
+    rss_after = peak_rss_mb()
+    return {'stage': stage, 'scale': scale, 'input_bytes': os.path.getsize(path), 'rows': rows,
+            'seconds': seconds, 'rows_per_sec': rows / seconds if seconds else None,
+            'peak_rss_mb': rss_after,
+            'stage_rss_mb': rss_after - rss_before if rss_after is not None else None}
+
+def run_stage_isolated(stage, scale, path):
+    """
+    Runs one stage in a fresh interpreter.
+
+    Peak RSS only ever grows within a process, so each (stage, scale) gets its
+    own process to keep the memory figures from bleeding into each other.
+    """
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', stage, str(scale), path],
+        capture_output=True, text=True)
+    if completed.returncode != 0:
+        error = (completed.stderr.strip().splitlines() or ['no output'])[-1]
+        return {'stage': stage, 'scale': scale, 'error': error}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+# --- Reporting ---
+
+def package_versions():
+    versions = {}
+    for package in ('pandas', 'numpy', 'vaderSentiment', 'torch', 'transformers', 'matplotlib', 'seaborn'):
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+def print_result(result):
+    if 'error' in result:
+        print(f"  {result['stage']:<16} {result['scale']:>5}x  FAILED: {result['error']}")
+        return
+    rss = f"{result['peak_rss_mb']:9.1f}" if result['peak_rss_mb'] is not None else f"{'n/a':>9}"
+    print(f"  {result['stage']:<16} {result['scale']:>5}x {result['rows']:>9} {result['seconds']:>9.3f} "
+          f"{result['rows_per_sec']:>12.1f} {rss}")
+
+def compare_results(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """
+    Compares throughput against a previous results file.
+
+    Returns:
+        list: (stage, scale, old rows/s, new rows/s) for every stage slower by more than `threshold`.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['stage'], r['scale']): r for r in json.load(f)['results'] if 'error' not in r}
+    regressions = []
+    print(f"\nThroughput vs {baseline_path}:")
+    for result in results:
+        old = baseline.get((result['stage'], result['scale']))
+        if old is None or 'error' in result:
+            continue
+        ratio = result['rows_per_sec'] / old['rows_per_sec']
+        flag = ''
+        if ratio * threshold < 1:
+            flag = '  REGRESSION'
+            regressions.append((result['stage'], result['scale'], old['rows_per_sec'], result['rows_per_sec']))
+        print(f"  {result['stage']:<16} {result['scale']:>5}x  {ratio:6.2f}x{flag}")
+    return regressions
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark each analysis stage on synthetic screenplays of increasing size.")
+    parser.add_argument('--scales', nargs='+', type=int, default=list(DEFAULT_SCALES),
+                        help=f"Multiples of a bundled script's size (e.g. {' '.join(map(str, SCALES))}).")
+    parser.add_argument('--stages', nargs='+', default=list(DEFAULT_STAGES), choices=STAGES,
+                        help="Stages to run (the emotion stages are opt-in).")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Where synthetic screenplays are kept.")
+    parser.add_argument('--output', default=DEFAULT_RESULTS_PATH, help="Results JSON file.")
+    parser.add_argument('--compare', help="Previous results JSON to check for regressions.")
+    parser.add_argument('--child', nargs=3, metavar=('STAGE', 'SCALE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        stage, scale, path = args.child
+        print(json.dumps(run_stage(stage, int(scale), path)))
+        raise SystemExit
+
+    results = []
+    print(f"  {'stage':<16} {'scale':>6} {'rows':>9} {'seconds':>9} {'rows/s':>12} {'peak MB':>9}")
+    for scale in args.scales:
+        path = ensure_synthetic_script(scale, args.data_dir)
+        for stage in args.stages:
+            result = run_stage_isolated(stage, scale, path)
+            print_result(result)
+            results.append(result)
+
+    report = {'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+              'python': platform.python_version(), 'platform': platform.platform(),
+              'packages': package_versions(), 'base_script_bytes': BASE_SCRIPT_BYTES,
+              'emotion_row_limit': EMOTION_ROW_LIMIT, 'results': results}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"\nSaved results to {args.output}")
+
+    if args.compare and compare_results(results, args.compare):
+        raise SystemExit("Throughput regressions found.")
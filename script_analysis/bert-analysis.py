@@ -1,12 +1,56 @@
+import argparse
+import os
+import subprocess
+import sys
+
 import pandas as pd
-from transformers import pipeline
-import torch # Make sure torch is installed
+import numpy as np
+from emotion_inference import (EMOTION_LABELS, EMOTION_MODEL_NAME, classify_batched, emotion_model_key,
+                               format_length_report, length_options_key)
+from score_cache import ScoreCache
+from dialogue_store import (EMOTION_GROUP, current_dataset_id, format_memory_report, read_columns, write_embeddings,
+                            write_group)
+from aggregate_cube import AggregateCube, save_cube, sentiment_categories
+from scoring_worker import DEFAULT_ARTIFACT_DIR, read_artifact_info
+from instrumentation import get_tracer
+from dedup import DedupReport, dedup_groups, score_unique
+from checkpoint import DEFAULT_CHECKPOINT_DIR, ShardCheckpoint, parse_shard_range, split_shards
+# torch and transformers are imported below, once the input data has been validated
+
+# --- Configuration ---
+USE_BATCH_INFERENCE = True # Score dialogues in length-bucketed batches instead of one at a time
+BATCH_SIZE = 32            # Dialogues per forward pass in batch mode
+BACKEND = 'torch'          # CPU backend in batch mode: 'torch', 'int8', 'onnx' or 'onnx-int8' (see emotion_backends.py)
+NUM_THREADS = None         # Intra-op threads for the CPU backends (None = all cores)
+MAX_LENGTH = 512           # Token limit per forward pass in batch mode; lower it for throughput
+CHUNK_LONG_DIALOGUES = False # In batch mode, score dialogue over MAX_LENGTH as overlapping windows instead of truncating
+USE_SCORE_CACHE = True     # Only classify dialogue not seen by this model revision before
+DEDUP_MODE = 'normalized'  # Classify repeated lines once: 'off', 'exact', 'normalized' or 'minhash' (see dedup.py)
+KEEP_EMBEDDINGS = False    # In batch mode with the torch backend, also store each dialogue's pooled
+                           # hidden state (float16) for similar-line search and clustering (see embedding_index.py)
+SCORE_CACHE_PATH = 'score_cache.sqlite'
+CHECKPOINT_SHARD_SIZE = 2048 # Save scores every this many rows, so a crashed or pre-empted run resumes (0 = off)
+CHECKPOINT_DIR = DEFAULT_CHECKPOINT_DIR
+EXPORT_CSV = False         # Also write dialogues_with_vader_and_emotion.csv (the dialogue store is the main output)
+MODEL_ARTIFACT_DIR = DEFAULT_ARTIFACT_DIR # Local copy of the model (scoring_worker.py --export-artifact); used when present
+
+parser = argparse.ArgumentParser(description="Score every dialogue in the store with the emotion model.")
+parser.add_argument('--workers', type=int, default=1,
+                    help="Score the pending checkpoint shards in this many processes.")
+parser.add_argument('--shards', help="Worker mode: score checkpoint shards START:END (END exclusive) and exit "
+                                     "without writing the store, e.g. one range per pre-emptible node.")
+args = parser.parse_args()
+if (args.workers > 1 or args.shards) and not CHECKPOINT_SHARD_SIZE:
+    parser.error("--workers and --shards need CHECKPOINT_SHARD_SIZE > 0.")
+
+tracer = get_tracer('bert-analysis.py') # Set ANALYSIS_TRACE=1 to record stage timings
 
 # --- Load Data ---
 # Ensure 'df' DataFrame with 'film', 'character', 'cleaned_dialogue' is loaded
 try:
-    df = pd.read_csv('dialogues_with_sentiment.csv') # Or the latest CSV if you saved after VADER
-    df = df[['film', 'character', 'cleaned_dialogue', 'sentiment_score']].copy() # Keep only needed columns if reloading
+    # Load only the needed columns from the dialogue store, with categorical film/character and float32 scores
+    with tracer.stage('load'):
+        df = read_columns(['film', 'character', 'cleaned_dialogue', 'sentiment_score'], compact=True)
     if 'df' not in locals():
         raise NameError("'df' DataFrame not found.")
     if 'cleaned_dialogue' not in df.columns:
@@ -14,15 +58,25 @@ try:
     if df.empty:
          raise ValueError("DataFrame 'df' is empty.")
     print("Using existing 'df' DataFrame for emotion analysis.")
-except (NameError, FileNotFoundError, ValueError) as e:
+except (NameError, FileNotFoundError, KeyError, ValueError) as e:
      print(f"Error loading or validating DataFrame: {e}")
      print("Please ensure the previous steps were run or load the data correctly.")
      exit()
 
 # --- Initialize Emotion Analysis Pipeline ---
-MODEL_NAME = "j-hartmann/emotion-english-distilroberta-base"
+# These imports alone take several seconds, so a bad input fails before paying for them
+with tracer.stage('import'):
+    import torch # Make sure torch is installed
+    from transformers import pipeline
+
+MODEL_NAME = EMOTION_MODEL_NAME
+artifact_info = read_artifact_info(MODEL_ARTIFACT_DIR)
 print(f"\nInitializing emotion analysis pipeline with model: {MODEL_NAME}")
-print("This may take a moment to download the model...")
+if artifact_info:
+    # Weights are memory-mapped from local safetensors: no Hub lookup or download
+    print(f"Loading local model artifact from {MODEL_ARTIFACT_DIR}")
+else:
+    print("This may take a moment to download the model...")
 
 # Check if CUDA (GPU) is available, otherwise use CPU
 if torch.backends.mps.is_available():
@@ -37,13 +91,23 @@ else:
     print("Using device: CPU")
 
 # Using return_all_scores=True is deprecated, use top_k=None instead
-emotion_classifier = pipeline("text-classification",
-                              model=MODEL_NAME,
-                              top_k=None, # Get scores for ALL labels
-                              device=device) # Use GPU if available
+with tracer.stage('model_load', device=str(device), artifact=bool(artifact_info)):
+    emotion_classifier = pipeline("text-classification",
+                                  model=MODEL_ARTIFACT_DIR if artifact_info else MODEL_NAME,
+                                  top_k=None, # Get scores for ALL labels
+                                  device=device) # Use GPU if available
 
 print("Pipeline initialized.")
 
+# Optionally swap the fp32 forward pass for a cheaper CPU backend
+backend_forward = None
+if USE_BATCH_INFERENCE and BACKEND != 'torch':
+    from emotion_backends import load_backend
+    print(f"Using CPU backend: {BACKEND}")
+    backend_forward = load_backend(BACKEND, emotion_classifier.model, emotion_classifier.tokenizer,
+                                   num_threads=NUM_THREADS,
+                                   revision=artifact_info['revision'] if artifact_info else None)
+
 # --- Define Function to Apply Pipeline and Extract Scores ---
 # Get the expected labels from the model's config
 try:
@@ -53,7 +117,7 @@ try:
 except Exception as e:
     print(f"Could not automatically determine emotion labels: {e}")
     # Define manually based on model card if needed
-    emotion_columns = ['anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise']
+    emotion_columns = list(EMOTION_LABELS)
     print(f"Using manually defined emotions: {emotion_columns}")
 
 
@@ -77,13 +141,140 @@ def analyze_emotions(text):
 # This is the slow part!
 print("\nApplying emotion analysis to all dialogues... (This may take several minutes)")
 
-# Apply the function. Consider using tqdm for a progress bar if you install it (`pip install tqdm`)
-from tqdm.auto import tqdm
-tqdm.pandas()
-emotion_results = df['cleaned_dialogue'].progress_apply(analyze_emotions)
+length_report = {} # How many dialogues exceed MAX_LENGTH (batch mode)
+if KEEP_EMBEDDINGS and (not USE_BATCH_INFERENCE or backend_forward is not None):
+    print("KEEP_EMBEDDINGS needs batch mode with the torch backend; embeddings will not be kept.")
+    KEEP_EMBEDDINGS = False
+text_embeddings = {} # Text -> pooled embedding, kept from the scoring forward passes when KEEP_EMBEDDINGS is set
+
+def score_dialogues(texts, report=length_report):
+    """
+    Scores a list of texts, returning an array of shape (len(texts), len(emotion_columns)).
+
+    Long-row and window counts go to `report` (None: not counted).
+    """
+    if USE_BATCH_INFERENCE:
+        # Sort by token length, batch, and scatter scores back into row order
+        result = classify_batched(texts,
+                                  emotion_classifier.model,
+                                  emotion_classifier.tokenizer,
+                                  emotion_columns,
+                                  batch_size=BATCH_SIZE,
+                                  max_length=MAX_LENGTH,
+                                  device=device,
+                                  progress=True,
+                                  forward=backend_forward,
+                                  chunk_long=CHUNK_LONG_DIALOGUES,
+                                  report=report,
+                                  return_embeddings=KEEP_EMBEDDINGS)
+        if not KEEP_EMBEDDINGS:
+            return result
+        scores, embeddings = result
+        text_embeddings.update(zip(texts, embeddings))
+        return scores
 
-# Without tqdm:
-emotion_results = df['cleaned_dialogue'].apply(analyze_emotions)
+    texts = pd.Series(texts, dtype=object)
+    # Apply the function. Consider using tqdm for a progress bar if you install it (`pip install tqdm`)
+    from tqdm.auto import tqdm
+    tqdm.pandas()
+    emotion_results = texts.progress_apply(analyze_emotions)
+
+    # Ensure all expected columns exist, fill missing with 0 (handles errors in analyze_emotions)
+    emotion_df = pd.DataFrame(emotion_results.tolist(), index=texts.index)
+    return emotion_df.reindex(columns=emotion_columns, fill_value=0.0).to_numpy()
+
+# The cache and checkpoint keys pin the model revision and label order, so a model update rescores everything
+# The artifact records the Hub revision it was saved from, so its scores share cache entries
+model_key = emotion_model_key(MODEL_NAME, emotion_classifier.model, emotion_columns,
+                              revision=artifact_info['revision'] if artifact_info else None)
+if backend_forward is not None:
+    model_key += f"|{BACKEND}" # Quantized backends give slightly different scores
+if USE_BATCH_INFERENCE:
+    model_key += length_options_key(MAX_LENGTH, CHUNK_LONG_DIALOGUES)
+
+dedup_report = DedupReport()
+
+def score_rows(texts, cache=None):
+    """
+    Scores dialogue rows, returning (scores, embeddings); embeddings are None
+    unless KEEP_EMBEDDINGS is set.
+    """
+    # Each repeated line is classified once and its scores copied to every occurrence
+    score_fn = score_dialogues if cache is None else lambda unique: cache.score(model_key, unique, score_dialogues)
+    scores = score_unique(texts, score_fn, DEDUP_MODE, dedup_report)
+    if not KEEP_EMBEDDINGS:
+        return scores, None
+    # Classified texts already have theirs; texts scored from the cache need one forward pass now.
+    # Rows share their dedup group's embedding, as they share its scores
+    representatives, inverse = dedup_groups(texts, DEDUP_MODE)
+    missing = list(dict.fromkeys(texts[i] for i in representatives if texts[i] not in text_embeddings))
+    if missing:
+        print(f"Embedding {len(missing)} cached texts...")
+        score_dialogues(missing, report=None) # Only for the embeddings; the length report counts scoring passes
+    embeddings = np.stack([text_embeddings[texts[i]] for i in representatives])[inverse]
+    text_embeddings.clear()
+    return scores, embeddings
+
+def run_workers(shard_runs):
+    """Scores each run of shards in its own process (this script with --shards) and waits for all of them."""
+    # Split the cores between the workers instead of each one starting a thread per core
+    env = dict(os.environ, OMP_NUM_THREADS=str(max(1, (os.cpu_count() or 1) // len(shard_runs))))
+    print(f"Starting {len(shard_runs)} workers for {sum(map(len, shard_runs))} shards...")
+    workers = [subprocess.Popen([sys.executable, sys.argv[0], '--shards', f"{run[0]}:{run[-1] + 1}"], env=env)
+               for run in shard_runs]
+    failed = sum(worker.wait() != 0 for worker in workers)
+    if failed:
+        print(f"{failed} workers failed; scoring their remaining shards here.")
+
+with tracer.stage('emotion', rows=len(df), batched=USE_BATCH_INFERENCE, backend=BACKEND,
+                  batch_size=BATCH_SIZE if USE_BATCH_INFERENCE else 1, cache=USE_SCORE_CACHE,
+                  dedup=DEDUP_MODE, shard_size=CHECKPOINT_SHARD_SIZE, worker_shards=args.shards) as stage:
+    texts = df['cleaned_dialogue'].tolist()
+    cache = ScoreCache(SCORE_CACHE_PATH) if USE_SCORE_CACHE else None
+    try:
+        if CHECKPOINT_SHARD_SIZE:
+            # Scores are saved shard by shard, so a restarted run only scores the shards it had not finished.
+            # Workers never discard a checkpoint from different settings; only a full run starts over
+            run = {'dataset_id': current_dataset_id(), 'model': model_key, 'dedup': DEDUP_MODE,
+                   'embeddings': KEEP_EMBEDDINGS, 'columns': emotion_columns}
+            checkpoint = ShardCheckpoint(CHECKPOINT_DIR, run, len(texts), CHECKPOINT_SHARD_SIZE,
+                                         reset=args.shards is None)
+            shards = checkpoint.pending(parse_shard_range(args.shards, checkpoint.shards) if args.shards else None)
+            print(f"Checkpoint: {checkpoint.shards - len(checkpoint.pending())} of {checkpoint.shards} shards "
+                  f"of {CHECKPOINT_SHARD_SIZE} rows already scored in {CHECKPOINT_DIR}.")
+            if args.workers > 1 and args.shards is None and shards:
+                run_workers(split_shards(shards, args.workers))
+                shards = checkpoint.pending()
+            for shard in shards:
+                rows = checkpoint.shard_rows(shard)
+                scores, embeddings = score_rows(texts[rows], cache)
+                arrays = {'scores': np.asarray(scores, dtype=np.float32)}
+                if KEEP_EMBEDDINGS:
+                    arrays['embeddings'] = embeddings
+                checkpoint.save(shard, **arrays)
+                print(f"Saved shard {shard + 1} of {checkpoint.shards} (rows {rows.start}-{rows.stop - 1}).")
+            stage['shards_scored'] = len(shards)
+            if args.shards is None:
+                emotion_scores = checkpoint.load('scores')
+                embeddings = checkpoint.load('embeddings')
+        else:
+            emotion_scores, embeddings = score_rows(texts, cache)
+        if cache is not None:
+            print(f"Score cache: {cache.hits} hits, {cache.misses} texts classified.")
+            stage.update(cache_hits=cache.hits, cache_misses=cache.misses)
+    finally:
+        if cache is not None:
+            cache.close()
+    print(f"Dedup ({DEDUP_MODE}): {dedup_report}")
+    stage['unique_texts'] = dedup_report.unique
+    if length_report:
+        print(format_length_report(length_report, MAX_LENGTH, CHUNK_LONG_DIALOGUES))
+        stage.update(long_rows=length_report['long_rows'], windows=length_report['windows'])
+
+if args.shards is not None:
+    # Worker mode: the process that started the run (or a later full run) assembles the shards
+    print(f"Worker done: shards {args.shards} are scored.")
+    exit()
 
 print("Emotion analysis application complete.")
 
@@ -91,19 +282,17 @@ print("Emotion analysis application complete.")
 # --- Process Results and Update DataFrame ---
 print("Processing results and updating DataFrame...")
 
-# Convert the series of dictionaries into a DataFrame
-emotion_df = pd.DataFrame(emotion_results.tolist(), index=df.index)
-
-# Ensure all expected columns exist, fill missing with 0 (handles errors in analyze_emotions)
-for col in emotion_columns:
-    if col not in emotion_df.columns:
-        emotion_df[col] = 0.0
-emotion_df = emotion_df[emotion_columns] # Keep only expected columns in order
+# Convert the score array into a DataFrame with the expected columns in order
+# Emotion scores come out of the model as float32; keep them that way in memory and in the store
+emotion_df = pd.DataFrame(np.asarray(emotion_scores, dtype=np.float32), index=df.index, columns=emotion_columns)
 
 # Concatenate the new emotion scores with the original DataFrame
 df = pd.concat([df, emotion_df], axis=1)
+# Vectorized Negative/Neutral/Positive label, stored as int8 category codes
+df['sentiment_category'] = sentiment_categories(df['sentiment_score'])
 
 print("DataFrame updated with emotion scores.")
+print(f"Memory: {format_memory_report(df)}")
 
 # --- Display Results ---
 print("\nFirst few rows with VADER score and new Emotion Scores:")
@@ -112,13 +301,24 @@ display_cols = ['film', 'character', 'cleaned_dialogue', 'sentiment_score'] + em
 print(df[display_cols].head())
 
 print("\nBasic statistics for new emotion scores:")
-# Calculate mean score for each emotion per character
-emotion_stats = df.groupby(['film', 'character'])[emotion_columns].mean()
+# Mean score for each emotion per character, from the aggregate cube (also saved for later reports)
+with tracer.stage('stats') as stage:
+    cube = AggregateCube.from_frame(df, ['sentiment_score'] + emotion_columns)
+    emotion_stats = cube.means(emotion_columns, by=['film', 'character'])
+    stage['cells'] = len(cube.cells)
 print(emotion_stats)
 
 # --- Save the Results (Recommended) ---
-df.to_csv('dialogues_with_vader_and_emotion.csv', index=False)
-# print("\nDataFrame with VADER and fine-grained emotion scores saved to dialogues_with_vader_and_emotion.csv")
+with tracer.stage('write', rows=len(df)):
+    write_group(emotion_df, EMOTION_GROUP)
+    if KEEP_EMBEDDINGS:
+        write_embeddings(embeddings, model_name=MODEL_NAME)
+    save_cube(cube)
+    if CHECKPOINT_SHARD_SIZE:
+        checkpoint.clear() # The scores are safely in the store now
+    if EXPORT_CSV:
+        df.to_csv('dialogues_with_vader_and_emotion.csv', index=False)
+        # print("\nDataFrame with VADER and fine-grained emotion scores saved to dialogues_with_vader_and_emotion.csv")
 
 # --- Next Steps Suggestion ---
 print("\n--- Emotion Analysis Complete ---")
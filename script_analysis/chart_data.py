@@ -0,0 +1,183 @@
+import argparse
+import gzip
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import SENTIMENT_CATEGORIES, AggregateCube, store_measures
+from dialogue_store import DEFAULT_STORE_DIR, compact_frame, current_dataset_id, read_columns
+from instrumentation import get_tracer
+
+try:
+    import brotli # Optional: only used to report the brotli-compressed size
+except ImportError:
+    brotli = None
+
+# --- Configuration ---
+# Read by components/EmotionCharts.tsx, which draws the emotion figures client-side
+SITE_DATA_PATH = os.path.join('..', 'public', 'data', 'charts.json')
+BUNDLE_VERSION = 1       # Bump when the bundle layout changes (and update EmotionCharts.tsx)
+DECIMALS = 4             # Scores are rounded; charts never show more than 2 decimals
+HISTOGRAM_BINS = 20      # Per film and score, over the score's full range
+BOX_WHISKER = 1.5        # Box plot whiskers reach the furthest value within 1.5 IQR, as in seaborn
+SCORE_RANGES = {'sentiment_score': (-1.0, 1.0)} # Emotion probabilities are in [0, 1]
+
+# --- Helper Functions ---
+
+def rounded(values):
+    """Nested lists of rounded floats, with None for NaN (JSON has no NaN)."""
+    array = np.round(np.asarray(values, dtype=np.float64), DECIMALS)
+    return np.where(np.isnan(array), None, array).tolist()
+
+def histogram(values, measure):
+    """Counts of `values` in HISTOGRAM_BINS equal bins over the measure's range (the top edge is inclusive)."""
+    low, high = SCORE_RANGES.get(measure, (0.0, 1.0))
+    bins = np.floor((np.asarray(values, dtype=np.float64) - low) / (high - low) * HISTOGRAM_BINS)
+    return np.bincount(np.clip(bins, 0, HISTOGRAM_BINS - 1).astype(np.int64), minlength=HISTOGRAM_BINS).tolist()
+
+def box_stats(values):
+    """[whisker low, q1, median, q3, whisker high] of one group's values (quartiles as pandas computes them)."""
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    reach = BOX_WHISKER * (q3 - q1)
+    low = values[np.searchsorted(values, q1 - reach)]
+    high = values[np.searchsorted(values, q3 + reach, side='right') - 1]
+    return [low, q1, median, q3, high]
+
+# --- Bundle ---
+
+def build_bundle(df, emotions, source=None):
+    """
+    Pre-aggregates everything the site's emotion charts need from the dialogue rows.
+
+    Means, counts and sentiment categories come from an AggregateCube; the
+    dominant emotion, correlations, box plots and histograms need the rows
+    and are computed here in one vectorized pass each. Characters are listed
+    film by film, and per-character arrays follow that order.
+
+    Args:
+        df (pd.DataFrame): Rows with 'film', 'character', 'sentiment_score'
+            and one column per emotion.
+        emotions (list): Emotion columns, in the order the charts show them.
+        source (dict): Provenance recorded in the bundle (e.g. dataset id).
+
+    Returns:
+        dict: The JSON-serializable bundle.
+    """
+    measures = ['sentiment_score'] + list(emotions)
+    cube = AggregateCube.from_frame(df, measures)
+    counts = cube.counts(by=['film', 'character'])
+    films = counts.index.get_level_values('film').unique().tolist()
+    film_of_row = pd.Categorical(df['film'], categories=films).codes
+    group_of_row = counts.index.get_indexer(pd.MultiIndex.from_arrays([df['film'], df['character']]))
+    group_order = [np.flatnonzero(group_of_row == g) for g in range(len(counts))]
+    scores = {measure: df[measure].to_numpy(dtype=np.float64) for measure in measures}
+
+    # Share of each character's lines whose highest-scoring emotion is each emotion
+    dominant = np.argmax(np.column_stack([scores[e] for e in emotions]), axis=1)
+    dominant_counts = np.zeros((len(counts), len(emotions)), dtype=np.int64)
+    np.add.at(dominant_counts, (group_of_row, dominant), 1)
+
+    matrix = np.column_stack([scores[m] for m in measures])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = {'all': rounded(np.corrcoef(matrix, rowvar=False))}
+        for f, film in enumerate(films):
+            correlation[film] = rounded(np.corrcoef(matrix[film_of_row == f], rowvar=False))
+
+    return {
+        'version': BUNDLE_VERSION,
+        'source': dict(source or {}, rows=len(df)),
+        'films': films,
+        'emotions': list(emotions),
+        'sentiment_categories': SENTIMENT_CATEGORIES,
+        'characters': [{'film': films.index(film), 'name': character, 'count': int(count)}
+                       for (film, character), count in counts.items()],
+        # Per character (plot 1) and per film (plot 2): one mean per emotion
+        'character_means': rounded(cube.means(emotions, by=['film', 'character']).to_numpy()),
+        'film_means': rounded(cube.means(emotions, by=['film']).loc[films].to_numpy()),
+        'character_sentiment': rounded(cube.means(['sentiment_score'], by=['film', 'character'])['sentiment_score']),
+        'sentiment_counts': cube.category_counts(by=['film', 'character']).loc[counts.index].to_numpy().tolist(),
+        'dominant_counts': dominant_counts.tolist(),
+        # Pearson correlations of the VADER score and emotions, over all rows and per film
+        'correlation': {'columns': measures, 'matrices': correlation},
+        # Per measure: one [whisker low, q1, median, q3, whisker high] per character
+        'boxes': {measure: rounded([box_stats(scores[measure][rows]) for rows in group_order])
+                  for measure in measures},
+        'histograms': {'bins': HISTOGRAM_BINS,
+                       'ranges': {measure: list(SCORE_RANGES.get(measure, (0.0, 1.0))) for measure in measures},
+                       'counts': {measure: [histogram(scores[measure][film_of_row == f], measure)
+                                            for f in range(len(films))]
+                                  for measure in measures}},
+    }
+
+def encode_bundle(bundle):
+    """Compact UTF-8 JSON (no whitespace); served compressed, it is a few KB."""
+    return json.dumps(bundle, separators=(',', ':'), ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+def write_bundle(data, path=SITE_DATA_PATH):
+    """Writes the encoded bundle atomically; returns False (and leaves the file alone) if it is unchanged."""
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+def compressed_sizes(data):
+    """Raw, gzip and (if the brotli module is installed) brotli sizes in bytes."""
+    sizes = {'raw': len(data), 'gzip': len(gzip.compress(data, compresslevel=9))}
+    if brotli is not None:
+        sizes['brotli'] = len(brotli.compress(data))
+    return sizes
+
+# --- Loading ---
+
+def load_store(store_dir=DEFAULT_STORE_DIR):
+    """Rows and emotion columns from the dialogue store (compact schema)."""
+    emotions = store_measures(store_dir)[1:]
+    if not emotions:
+        raise KeyError(f"No emotion scores in {store_dir}; run bert-analysis.py or pipeline.py first.")
+    df = read_columns(['film', 'character', 'sentiment_score'] + emotions, store_dir, compact=True)
+    return df, emotions, {'dataset_id': current_dataset_id(store_dir)}
+
+def load_csv(path):
+    """Rows and emotion columns from a dialogues_with_vader_and_emotion.csv export."""
+    df = pd.read_csv(path)
+    text_columns = {'film', 'character', 'dialogue', 'cleaned_dialogue', 'sentiment_score'}
+    emotions = [name for name in df.columns
+                if name not in text_columns and pd.api.types.is_numeric_dtype(df[name])]
+    return compact_frame(df[['film', 'character', 'sentiment_score'] + emotions]), emotions, \
+        {'csv': os.path.basename(path)}
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export pre-aggregated chart data for the site's client-side charts.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Dialogue store to read.")
+    parser.add_argument('--csv', help="Read a dialogues_with_vader_and_emotion.csv export instead of the store.")
+    parser.add_argument('--output', default=SITE_DATA_PATH, help="Bundle path (served by the site under /data/).")
+    args = parser.parse_args()
+    tracer = get_tracer('chart_data.py') # Set ANALYSIS_TRACE=1 to record stage timings
+
+    start = time.perf_counter()
+    try:
+        with tracer.stage('load') as stage:
+            df, emotions, source = load_csv(args.csv) if args.csv else load_store(args.store)
+            stage['rows'] = len(df)
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        raise SystemExit(f"Error: {e}. Please run the previous steps.")
+    with tracer.stage('aggregate', rows=len(df)):
+        data = encode_bundle(build_bundle(df, emotions, source))
+    with tracer.stage('write') as stage:
+        changed = write_bundle(data, args.output)
+        stage.update(changed=changed, **compressed_sizes(data))
+    sizes = ', '.join(f"{name} {size / 1024:.1f} KB" for name, size in compressed_sizes(data).items())
+    print(f"{'Wrote' if changed else 'Unchanged:'} {args.output} ({sizes}) "
+          f"from {len(df)} rows in {time.perf_counter() - start:.2f}s")
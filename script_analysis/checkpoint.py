@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+# --- Configuration ---
+DEFAULT_CHECKPOINT_DIR = 'emotion_checkpoints'
+DEFAULT_SHARD_SIZE = 2048 # Rows per shard: at most this much work is redone after a crash
+MANIFEST_FILENAME = 'manifest.json'
+SHARD_TEMPLATE = 'shard-{:05d}.npz'
+
+# --- Helper Functions ---
+
+def parse_shard_range(spec, shards):
+    """
+    Parses a worker's 'START:END' shard range (END exclusive; either side may
+    be left out) into a range, clipped to the run's shard count.
+    """
+    start, sep, end = spec.partition(':')
+    if not sep:
+        raise ValueError(f"Shard range must look like START:END, got '{spec}'.")
+    return range(max(int(start or 0), 0), min(int(end) if end else shards, shards))
+
+def split_shards(shards, workers):
+    """Splits a list of shard numbers into up to `workers` contiguous, near-equal runs."""
+    return [part.tolist() for part in np.array_split(np.asarray(shards, dtype=np.int64), workers) if len(part)]
+
+# --- Checkpoint ---
+
+class ShardCheckpoint:
+    """
+    Results of a long scoring run, saved in fixed-size row shards as they complete.
+
+    Each shard is written under a temporary name, synced and renamed into
+    place, so a crash or pre-emption leaves every shard either complete or
+    absent; a restarted run skips the complete ones. Shards never overlap,
+    so several processes (on one machine or several sharing a directory)
+    can each fill their own range of the same checkpoint.
+
+    A manifest pins what the shards were computed from (dataset, model,
+    settings, shard size). Shards of a different run are never mixed in:
+    with `reset` they are deleted, otherwise opening the checkpoint fails.
+    """
+
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIR, run=None, rows=0, shard_size=DEFAULT_SHARD_SIZE,
+                 reset=True):
+        self.directory = directory
+        self.rows = rows
+        self.shard_size = shard_size
+        self.manifest = dict(run or {}, rows=rows, shard_size=shard_size)
+        os.makedirs(directory, exist_ok=True)
+
+        manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                if json.load(f) == self.manifest:
+                    return
+            if not reset:
+                raise ValueError(f"Checkpoint in {directory} belongs to a different run; "
+                                 f"rerun without a shard range to start over.")
+            print(f"Discarding checkpoint shards in {directory} from a different run.")
+            self.clear()
+            os.makedirs(directory, exist_ok=True)
+        self._write_atomic(manifest_path, json.dumps(self.manifest, indent=2).encode('utf-8'))
+
+    @property
+    def shards(self):
+        return -(-self.rows // self.shard_size)
+
+    def shard_rows(self, shard):
+        """The slice of rows a shard covers."""
+        return slice(shard * self.shard_size, min((shard + 1) * self.shard_size, self.rows))
+
+    def shard_path(self, shard):
+        return os.path.join(self.directory, SHARD_TEMPLATE.format(shard))
+
+    def pending(self, shards=None):
+        """Shard numbers (of `shards`, default all) that have not been saved yet."""
+        return [shard for shard in (range(self.shards) if shards is None else shards)
+                if not os.path.exists(self.shard_path(shard))]
+
+    def save(self, shard, **arrays):
+        """Saves a shard's arrays (one row per row of the shard) atomically."""
+        expected = self.shard_rows(shard).stop - self.shard_rows(shard).start
+        for name, array in arrays.items():
+            if len(array) != expected:
+                raise ValueError(f"Shard {shard} covers {expected} rows but '{name}' has {len(array)}.")
+        tmp_path = self.shard_path(shard) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.shard_path(shard))
+
+    def load(self, name):
+        """
+        Concatenates one array over every shard, in row order.
+
+        Returns None if the shards do not hold `name`.
+
+        Raises:
+            ValueError: If some shards are still pending.
+        """
+        pending = self.pending()
+        if pending:
+            raise ValueError(f"{len(pending)} of {self.shards} shards are not scored yet (first: {pending[0]}).")
+        parts = []
+        for shard in range(self.shards):
+            with np.load(self.shard_path(shard)) as data:
+                if name not in data:
+                    return None
+                parts.append(data[name])
+        return np.concatenate(parts) if parts else None
+
+    def clear(self):
+        """Deletes the checkpoint (e.g. once its results are safely in the store)."""
+        for name in os.listdir(self.directory):
+            if name == MANIFEST_FILENAME or name.startswith('shard-'):
+                os.remove(os.path.join(self.directory, name))
+        if not os.listdir(self.directory):
+            os.rmdir(self.directory)
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp" # Workers starting together may all write the manifest
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show the progress of a checkpointed scoring run.")
+    parser.add_argument('directory', nargs='?', default=DEFAULT_CHECKPOINT_DIR, help="Checkpoint directory.")
+    args = parser.parse_args()
+
+    manifest_path = os.path.join(args.directory, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        raise SystemExit(f"No checkpoint in {args.directory}.")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    shard_size = manifest['shard_size']
+    shards = -(-manifest['rows'] // shard_size)
+    done = sorted(int(name[6:11]) for name in os.listdir(args.directory)
+                  if name.startswith('shard-') and name.endswith('.npz'))
+    rows_done = sum(min((shard + 1) * shard_size, manifest['rows']) - shard * shard_size for shard in done)
+    print(json.dumps(manifest, indent=2))
+    print(f"{len(done)} of {shards} shards done ({rows_done} of {manifest['rows']} rows)")
+    missing = sorted(set(range(shards)) - set(done))
+    if missing:
+        print(f"Pending shards: {', '.join(map(str, missing[:20]))}{' ...' if len(missing) > 20 else ''}")
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from prepare_data import GOODFELLAS_SCRIPT_PATH, PULP_FICTION_SCRIPT_PATH, TARGET_CHARACTERS
+from screenplay_tokenizer import dialogue_frame, parse_script_streaming
+
+# --- Configuration ---
+DEFAULT_OUTPUT_PATH = 'cleaned_dialogues.csv'
+SCRIPT_EXTENSIONS = ('.txt',)
+
+# --- Corpus Loading ---
+
+def default_manifest():
+    """Returns the manifest for the two films `prepare_data.py` processes."""
+    return [
+        {'film': 'Pulp Fiction', 'path': PULP_FICTION_SCRIPT_PATH,
+         'characters': sorted(TARGET_CHARACTERS['Pulp Fiction'])},
+        {'film': 'Goodfellas', 'path': GOODFELLAS_SCRIPT_PATH,
+         'characters': sorted(TARGET_CHARACTERS['Goodfellas'])},
+    ]
+
+def load_manifest(path):
+    """
+    Loads a JSON manifest mapping film names to their script and characters.
+
+    The manifest looks like:
+        {"Pulp Fiction": {"path": "pulpfiction.txt", "characters": ["JULES", "MIA"]}}
+
+    Relative script paths are resolved against the manifest's directory. Omitting
+    "characters" (or setting it to null) extracts every character in the film.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [
+        {'film': film,
+         'path': os.path.join(base_dir, entry['path']),
+         'characters': entry.get('characters')}
+        for film, entry in entries.items()
+    ]
+
+def scan_directory(directory, characters=None):
+    """
+    Builds a manifest from every screenplay in a directory.
+
+    Film names are the file names without extension, with underscores replaced
+    by spaces. Characters come from `characters` (film name -> list) if given,
+    then from TARGET_CHARACTERS; films found in neither extract every character.
+    """
+    characters = characters or {}
+    manifest = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.lower().endswith(SCRIPT_EXTENSIONS):
+            continue
+        film = os.path.splitext(filename)[0].replace('_', ' ')
+        chars = characters.get(film, TARGET_CHARACTERS.get(film))
+        manifest.append({'film': film,
+                         'path': os.path.join(directory, filename),
+                         'characters': sorted(chars) if chars is not None else None})
+    return manifest
+
+def resolve_manifest(source=None, characters_path=None):
+    """
+    Builds a manifest from a command-line source argument.
+
+    Args:
+        source (str): A directory of screenplays, a JSON manifest, or None for
+            the default two films.
+        characters_path (str): Optional JSON file mapping film name to target
+            characters, used in directory mode.
+    """
+    if source is None:
+        return default_manifest()
+    if os.path.isdir(source):
+        characters = None
+        if characters_path:
+            with open(characters_path, 'r', encoding='utf-8') as f:
+                characters = json.load(f)
+        return scan_directory(source, characters)
+    return load_manifest(source)
+
+# --- Parallel Parsing ---
+
+def parse_job(job):
+    """
+    Parses and cleans one screenplay inside a worker process.
+
+    Returns:
+        dict: The job plus 'rows', 'seconds' and 'error' (None on success).
+            Errors are reported rather than raised so one bad file does not
+            stop the rest of the corpus.
+    """
+    start = time.perf_counter()
+    result = dict(job, rows=[], error=None)
+    try:
+        chars = set(job['characters']) if job['characters'] is not None else None
+        result['rows'] = parse_script_streaming(job['path'], job['film'], chars)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def run_corpus(manifest, workers=None):
+    """
+    Parses every screenplay in the manifest across a process pool.
+
+    Args:
+        manifest (list): Dictionaries with 'film', 'path' and 'characters' keys.
+        workers (int): Number of worker processes (defaults to the CPU count).
+
+    Returns:
+        tuple: (DataFrame of cleaned dialogue in manifest order, list of per-file
+            results with timings and errors).
+    """
+    results = [None] * len(manifest)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(parse_job, job): i for i, job in enumerate(manifest)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed); record it and keep going
+                result = dict(manifest[i], rows=[], seconds=0.0, error=f"{type(e).__name__}: {e}")
+            results[i] = result
+            status = f"FAILED ({result['error']})" if result['error'] else f"{len(result['rows'])} dialogues"
+            print(f"  [{result['seconds']:.2f}s] {result['film']}: {status}")
+
+    # Merge in manifest order so the output does not depend on completion order
+    records = [row for result in results for row in result['rows']]
+    return dialogue_frame(records), results
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parse a corpus of screenplays in parallel.")
+    parser.add_argument('source', nargs='?',
+                        help="A directory of .txt screenplays or a JSON manifest "
+                             "(defaults to the two films in prepare_data.py).")
+    parser.add_argument('--characters',
+                        help="JSON file mapping film name to target characters (directory mode).")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes.")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help="Output CSV path.")
+    args = parser.parse_args()
+
+    manifest = resolve_manifest(args.source, args.characters)
+
+    print(f"Parsing {len(manifest)} screenplays...")
+    start = time.perf_counter()
+    df, results = run_corpus(manifest, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    failures = [result for result in results if result['error']]
+    print(f"\nParsed {len(results) - len(failures)}/{len(results)} screenplays in {elapsed:.2f}s "
+          f"({len(df)} cleaned dialogue entries).")
+    if failures:
+        print("Failed screenplays:")
+        for result in failures:
+            print(f"  - {result['film']} ({result['path']}): {result['error']}")
+
+    if df.empty:
+        raise SystemExit("No data extracted. Please check script paths and format.")
+
+    df.to_csv(args.output, index=False)
+    print(f"Saved {len(df)} rows to {args.output}")
@@ -0,0 +1,207 @@
+import argparse
+import re
+import zlib
+
+import numpy as np
+
+from dialogue_store import DEFAULT_STORE_DIR, read_columns
+
+# --- Configuration ---
+# 'off': score every row; 'exact': identical cleaned text; 'normalized': same text
+# after normalize_text; 'minhash': also near-duplicates of a normalized text
+DEDUP_MODES = ('off', 'exact', 'normalized', 'minhash')
+DEFAULT_DEDUP_MODE = 'normalized'
+REPLACEMENT_CHAR = '\ufffd' # Left in the scripts by undecodable bytes (e.g. "ROOM 49) � MORNING")
+
+# MinHash near-duplicate detection over character shingles of the normalized text
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16              # NUM_PERMUTATIONS / LSH_BANDS hash values per band
+DEFAULT_THRESHOLD = 0.8     # Minimum shingle Jaccard similarity to share a representative's scores
+HASH_PRIME = (1 << 61) - 1  # Modulus of the permutation hashes a*x + b
+PERMUTATION_SEED = 1
+
+_whitespace = re.compile(r'\s+')
+
+# --- Normalization ---
+
+def normalize_text(text):
+    """
+    Returns the dedup key of a cleaned dialogue: case-folded, stray U+FFFD
+    characters dropped and whitespace collapsed.
+    """
+    return _whitespace.sub(' ', text.replace(REPLACEMENT_CHAR, ' ')).strip().casefold()
+
+# --- MinHash ---
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Hashes of the overlapping character n-grams of a text (the whole text if shorter)."""
+    grams = {text[i:i + size] for i in range(max(len(text) - size + 1, 1))}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+
+class MinHasher:
+    """
+    MinHash signatures with banded locality-sensitive hashing.
+
+    Two texts whose shingle sets have Jaccard similarity s share at least one
+    band with probability 1 - (1 - s^r)^b (r values per band, b bands), so
+    near-duplicates meet in a bucket while dissimilar texts rarely do.
+    Candidates are confirmed with the exact Jaccard similarity.
+    """
+
+    def __init__(self, num_permutations=NUM_PERMUTATIONS, bands=LSH_BANDS, seed=PERMUTATION_SEED):
+        if num_permutations % bands:
+            raise ValueError("num_permutations must be a multiple of bands.")
+        rng = np.random.default_rng(seed)
+        # Below 2**31 so a * x (x < 2**32) + b cannot overflow uint64
+        self.a = rng.integers(1, 1 << 31, size=num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=num_permutations, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_permutations // bands
+
+    def signature(self, hashes):
+        """The minimum of each permutation hash over a text's shingle hashes."""
+        return ((np.outer(hashes, self.a) + self.b) % np.uint64(HASH_PRIME)).min(axis=0)
+
+    def band_keys(self, signature):
+        """One bucket key per band."""
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+def jaccard(a, b):
+    return len(np.intersect1d(a, b, assume_unique=True)) / len(np.union1d(a, b))
+
+def near_duplicate_groups(texts, threshold=DEFAULT_THRESHOLD, hasher=None):
+    """
+    Assigns each text to the first earlier text it nearly duplicates.
+
+    Texts are visited in order; one becomes a representative unless it shares
+    an LSH bucket with an earlier representative at least `threshold` similar.
+    Only representatives are compared against, so groups do not drift
+    through chains of slightly different lines.
+
+    Returns:
+        np.ndarray: For each text, the index of its representative.
+    """
+    hasher = hasher or MinHasher()
+    buckets = {}
+    representative_shingles = {}
+    assigned = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        hashes = shingles(text)
+        keys = hasher.band_keys(hasher.signature(hashes))
+        candidates = sorted({j for key in keys for j in buckets.get(key, ())})
+        match = next((j for j in candidates if jaccard(hashes, representative_shingles[j]) >= threshold), None)
+        if match is None:
+            match = i
+            representative_shingles[i] = hashes
+            for key in keys:
+                buckets.setdefault(key, []).append(i)
+        assigned[i] = match
+    return assigned
+
+# --- Deduplication ---
+
+def dedup_groups(texts, mode=DEFAULT_DEDUP_MODE, threshold=DEFAULT_THRESHOLD):
+    """
+    Groups texts that should share one set of scores.
+
+    Each group is scored through its first occurrence, exactly as written, so
+    repeated lines keep the scores they would get on their own; only case,
+    whitespace, U+FFFD and (in 'minhash' mode) near-duplicate variants take
+    over the first variant's scores.
+
+    Args:
+        texts (list): Cleaned dialogue, in row order.
+        mode (str): One of DEDUP_MODES.
+        threshold (float): Jaccard similarity for 'minhash' mode.
+
+    Returns:
+        tuple: (row index of each group's representative, np.ndarray giving
+            each row's group), so `scores[inverse]` fans scores back out.
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode '{mode}'; expected one of {DEDUP_MODES}.")
+    if mode == 'off':
+        return list(range(len(texts))), np.arange(len(texts), dtype=np.int64)
+
+    first_row = {}
+    inverse = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        key = text if mode == 'exact' or not isinstance(text, str) else normalize_text(text)
+        inverse[i] = first_row.setdefault(key, len(first_row))
+    representatives = [0] * len(first_row)
+    for i in range(len(texts) - 1, -1, -1):
+        representatives[inverse[i]] = i
+
+    if mode == 'minhash' and representatives:
+        keys = [normalize_text(texts[i]) if isinstance(texts[i], str) else '' for i in representatives]
+        merged = near_duplicate_groups(keys, threshold)
+        # Renumber the surviving groups in order and point every row at its merged group
+        survivors, renumber = np.unique(merged, return_inverse=True)
+        representatives = [representatives[j] for j in survivors]
+        inverse = renumber[inverse]
+    return representatives, inverse
+
+class DedupReport:
+    """Counts rows and unique texts across calls, e.g. over the chunks of a pipeline run."""
+
+    def __init__(self):
+        self.rows = 0
+        self.unique = 0
+
+    def add(self, rows, unique):
+        self.rows += rows
+        self.unique += unique
+
+    @property
+    def ratio(self):
+        """Share of rows that did not need their own model call."""
+        return 1 - self.unique / self.rows if self.rows else 0.0
+
+    def __str__(self):
+        return (f"{self.rows} rows -> {self.unique} unique texts "
+                f"({self.ratio:.1%} of scoring calls skipped)")
+
+def score_unique(texts, score_fn, mode=DEFAULT_DEDUP_MODE, report=None, threshold=DEFAULT_THRESHOLD):
+    """
+    Scores each group of duplicate texts once and fans the scores back out to every row.
+
+    Args:
+        texts (list): Texts in row order.
+        score_fn (callable): Takes a list of texts and returns an array-like of
+            shape (len(texts), n_scores); may itself go through a ScoreCache.
+        mode (str): One of DEDUP_MODES.
+        report (DedupReport): Optional counter of rows and unique texts.
+
+    Returns:
+        np.ndarray: Scores in row order.
+    """
+    representatives, inverse = dedup_groups(texts, mode, threshold)
+    if report is not None:
+        report.add(len(texts), len(representatives))
+    if mode == 'off':
+        return np.asarray(score_fn(texts))
+    scores = np.asarray(score_fn([texts[i] for i in representatives]))
+    return scores[inverse]
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Report how much scoring deduplication saves on the dialogue store.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Store directory.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Jaccard similarity for minhash mode.")
+    parser.add_argument('--examples', type=int, default=5, help="Largest groups to show per mode.")
+    args = parser.parse_args()
+
+    texts = read_columns(['cleaned_dialogue'], args.store)['cleaned_dialogue'].tolist()
+    for mode in DEDUP_MODES[1:]:
+        representatives, inverse = dedup_groups(texts, mode, args.threshold)
+        report = DedupReport()
+        report.add(len(texts), len(representatives))
+        print(f"{mode:<10} {report}")
+        sizes = np.bincount(inverse)
+        for group in np.argsort(-sizes, kind='stable')[:args.examples]:
+            variants = sorted({texts[i] for i in np.flatnonzero(inverse == group)})
+            shown = ' | '.join(repr(v) for v in variants[:3]) + (' | ...' if len(variants) > 3 else '')
+            print(f"    x{sizes[group]:<5} {shown}")
@@ -0,0 +1,365 @@
+import argparse
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# --- Configuration ---
+DEFAULT_STORE_DIR = 'dialogue_store'
+
+# Column groups written by each stage of the pipeline
+TEXT_GROUP = 'text'       # prepare_data.py: film, character, dialogue, cleaned_dialogue
+VADER_GROUP = 'vader'     # sentiment_analysis.py: sentiment_score, vader_neg/neu/pos
+EMOTION_GROUP = 'emotion' # bert-analysis.py: one float32 column per emotion
+SPANS_GROUP = 'spans'     # prepare_data.py: where each dialogue is in its script (see script_index.py)
+EMBEDDING_GROUP = 'embedding' # bert-analysis.py (KEEP_EMBEDDINGS): one float16 vector per dialogue (see embedding_index.py)
+
+GROUP_EXTENSION = '.arrow'
+DATASET_ID_KEY = b'dataset_id' # Schema metadata tying score groups to the text group they were computed on
+
+# Compact in-memory schema (read_columns(compact=True)): labels repeated on every
+# row become categoricals (one small integer code per row) and scores float32
+CATEGORICAL_COLUMNS = ('film', 'character', 'script_path', 'scene_heading', 'sentiment_category')
+SCORE_DTYPE = np.float32
+EMBEDDING_DTYPE = np.float16 # Half the size of float32; plenty for cosine similarity
+
+# --- Helper Functions ---
+
+def group_path(group, store_dir=DEFAULT_STORE_DIR):
+    """Returns the file path of a column group."""
+    return os.path.join(store_dir, group + GROUP_EXTENSION)
+
+def open_group(group, store_dir=DEFAULT_STORE_DIR):
+    """Memory-maps a column group and returns it as a pyarrow Table (no data is copied)."""
+    source = pa.memory_map(group_path(group, store_dir), 'r')
+    return pa.ipc.open_file(source).read_all()
+
+def current_dataset_id(store_dir=DEFAULT_STORE_DIR):
+    """Returns the id of the current text group, or None if the store has none."""
+    if not os.path.exists(group_path(TEXT_GROUP, store_dir)):
+        return None
+    return open_group(TEXT_GROUP, store_dir).schema.metadata[DATASET_ID_KEY].decode()
+
+def list_groups(store_dir=DEFAULT_STORE_DIR):
+    """Returns the names of all column groups in the store, text group first."""
+    if not os.path.isdir(store_dir):
+        return []
+    groups = sorted(name[:-len(GROUP_EXTENSION)] for name in os.listdir(store_dir)
+                    if name.endswith(GROUP_EXTENSION))
+    return sorted(groups, key=lambda name: name != TEXT_GROUP)
+
+# --- Writing ---
+
+class GroupWriter:
+    """
+    Writes one column group as an uncompressed Arrow IPC file, one batch at a time.
+
+    The file is written under a temporary name and moved into place on close,
+    so readers never see a half-written group. Use as a context manager:
+
+        with GroupWriter(VADER_GROUP) as writer:
+            writer.write(chunk_df)
+    """
+
+    def __init__(self, group, store_dir=DEFAULT_STORE_DIR, schema=None, dataset_id=None):
+        self.group = group
+        self.store_dir = store_dir
+        self.schema = schema
+        self.rows = 0
+        self.writer = None
+        os.makedirs(store_dir, exist_ok=True)
+        self.path = group_path(group, store_dir)
+        self.tmp_path = self.path + '.tmp'
+
+        if dataset_id is not None:
+            # Groups written alongside a new text group share its id (see new_dataset_writers)
+            self.dataset_id = dataset_id
+        elif group == TEXT_GROUP:
+            # A new text group starts a new dataset; old score groups no longer line up
+            self.dataset_id = uuid.uuid4().hex
+        else:
+            self.dataset_id = current_dataset_id(store_dir)
+            if self.dataset_id is None:
+                raise FileNotFoundError(f"No '{TEXT_GROUP}' group in {store_dir}; run prepare_data.py first.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, df):
+        """Appends the rows of a DataFrame to the group."""
+        self.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def write_table(self, table):
+        """Appends the rows of a pyarrow Table (e.g. another store's group) without going through pandas."""
+        if self.writer is None:
+            self.schema = table.schema.with_metadata({DATASET_ID_KEY: self.dataset_id.encode()})
+            self.writer = pa.ipc.new_file(self.tmp_path, self.schema)
+        self.writer.write_table(table.replace_schema_metadata(self.schema.metadata))
+        self.rows += table.num_rows
+
+    def close(self):
+        """Finishes the file and atomically replaces any previous version of the group."""
+        if self.writer is None:
+            raise ValueError(f"No rows written to group '{self.group}'.")
+        self.writer.close()
+        if self.group != TEXT_GROUP:
+            expected = open_group(TEXT_GROUP, self.store_dir).num_rows
+            if self.rows != expected:
+                os.remove(self.tmp_path)
+                raise ValueError(f"Group '{self.group}' has {self.rows} rows but the "
+                                 f"'{TEXT_GROUP}' group has {expected}.")
+        os.replace(self.tmp_path, self.path)
+        if self.group == TEXT_GROUP:
+            # Score groups from the previous dataset would silently misalign; drop them
+            for group in list_groups(self.store_dir):
+                if group != TEXT_GROUP:
+                    os.remove(group_path(group, self.store_dir))
+
+    def abort(self):
+        """Discards a partially written group."""
+        if self.writer is not None:
+            self.writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def new_dataset_writers(groups, store_dir=DEFAULT_STORE_DIR):
+    """
+    Opens writers for a new text group plus score groups that are written in step with it.
+
+    Used when a stage streams every group at once instead of running the
+    scripts one after another. Close the writers in the returned order: the
+    text group is installed first, and the other groups are checked against it.
+
+    Returns:
+        list: GroupWriter objects, text group first.
+    """
+    text_writer = GroupWriter(TEXT_GROUP, store_dir)
+    others = [GroupWriter(group, store_dir, dataset_id=text_writer.dataset_id)
+              for group in groups if group != TEXT_GROUP]
+    return [text_writer] + others
+
+def write_group(df, group, store_dir=DEFAULT_STORE_DIR):
+    """Writes a whole DataFrame as one column group of the store."""
+    with GroupWriter(group, store_dir) as writer:
+        writer.write(df)
+    print(f"Saved {len(df.columns)} columns x {len(df)} rows to {group_path(group, store_dir)}")
+
+def write_embeddings(embeddings, store_dir=DEFAULT_STORE_DIR, model_name=None):
+    """
+    Writes one embedding per dialogue row as the embedding group.
+
+    The vectors are stored as a single fixed-size list column of float16, so
+    read_embeddings can memory-map them back as one (rows, dim) array.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=EMBEDDING_DTYPE)
+    field = pa.field('embedding', pa.list_(pa.float16(), embeddings.shape[1]),
+                     metadata={b'model': (model_name or '').encode()})
+    column = pa.FixedSizeListArray.from_arrays(pa.array(embeddings.reshape(-1)), embeddings.shape[1])
+    with GroupWriter(EMBEDDING_GROUP, store_dir) as writer:
+        writer.write_table(pa.Table.from_arrays([column], schema=pa.schema([field])))
+    print(f"Saved {embeddings.shape[1]}-dim embeddings x {len(embeddings)} rows to "
+          f"{group_path(EMBEDDING_GROUP, store_dir)}")
+
+# --- Reading ---
+
+def column_groups(store_dir=DEFAULT_STORE_DIR):
+    """Returns a dict mapping each column name to the group that stores it."""
+    mapping = {}
+    for group in list_groups(store_dir):
+        for name in open_group(group, store_dir).schema.names:
+            mapping.setdefault(name, group)
+    return mapping
+
+def column_to_pandas(column, name, compact=False):
+    """
+    Converts one stored column to a pandas Series.
+
+    With `compact`, label columns are dictionary-encoded in Arrow and arrive as
+    categoricals without materializing a string per row, and float columns
+    are cast to float32.
+    """
+    if compact and name in CATEGORICAL_COLUMNS and (pa.types.is_string(column.type)
+                                                    or pa.types.is_large_string(column.type)):
+        return column.dictionary_encode().to_pandas()
+    if compact and pa.types.is_floating(column.type):
+        return column.to_pandas().astype(SCORE_DTYPE)
+    return column.to_pandas()
+
+def read_columns(columns=None, store_dir=DEFAULT_STORE_DIR, compact=False):
+    """
+    Loads selected columns from the store into a DataFrame.
+
+    Only the groups holding the requested columns are opened, and they are
+    memory-mapped, so unrequested columns are never read from disk.
+
+    Args:
+        columns (list): Column names to load (defaults to every column).
+        store_dir (str): Store directory.
+        compact (bool): Use the compact in-memory schema (see compact_frame).
+
+    Returns:
+        pd.DataFrame: The requested columns, in the requested order.
+
+    Raises:
+        FileNotFoundError: If the store or the text group does not exist.
+        KeyError: If a requested column is not in the store.
+        ValueError: If a score group was computed on a different text group.
+    """
+    current_id = current_dataset_id(store_dir)
+    if current_id is None:
+        raise FileNotFoundError(f"No dialogue store found at '{store_dir}'.")
+
+    mapping = column_groups(store_dir)
+    if columns is None:
+        # Embeddings are not tabular; read them with read_embeddings
+        columns = [name for name, group in mapping.items() if group != EMBEDDING_GROUP]
+    missing = [name for name in columns if name not in mapping]
+    if missing:
+        raise KeyError(f"Columns not found in {store_dir}: {missing}")
+
+    tables = {}
+    for group in dict.fromkeys(mapping[name] for name in columns):
+        table = open_group(group, store_dir)
+        if table.schema.metadata[DATASET_ID_KEY].decode() != current_id:
+            raise ValueError(f"Group '{group}' is stale; rerun the stage that writes it.")
+        tables[group] = table
+
+    return pd.DataFrame({name: column_to_pandas(tables[mapping[name]].column(name), name, compact)
+                         for name in columns})
+
+def read_embeddings(store_dir=DEFAULT_STORE_DIR):
+    """
+    Memory-maps the embedding group as a read-only float16 array of shape (rows, dim).
+
+    Nothing is copied: rows are paged in from disk as they are used.
+
+    Returns:
+        tuple: (embeddings, name of the model they came from).
+
+    Raises:
+        FileNotFoundError: If the store has no embedding group.
+        ValueError: If the embeddings were computed on a different text group.
+    """
+    if not os.path.exists(group_path(EMBEDDING_GROUP, store_dir)):
+        raise FileNotFoundError(f"No embeddings in {store_dir}; run bert-analysis.py with KEEP_EMBEDDINGS = True.")
+    table = open_group(EMBEDDING_GROUP, store_dir)
+    if table.schema.metadata[DATASET_ID_KEY].decode() != current_dataset_id(store_dir):
+        raise ValueError(f"Group '{EMBEDDING_GROUP}' is stale; rerun bert-analysis.py.")
+    column = table.column('embedding')
+    # Written in one batch, so this is a single chunk and no copy
+    vectors = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+    embeddings = vectors.flatten().to_numpy(zero_copy_only=True).reshape(len(vectors), column.type.list_size)
+    model_name = (table.schema.field('embedding').metadata or {}).get(b'model', b'').decode()
+    return embeddings, model_name or None
+
+# --- Compact Schema ---
+
+def compact_frame(df):
+    """
+    Returns a copy of a dialogue DataFrame in the compact in-memory schema.
+
+    Film, character and the other CATEGORICAL_COLUMNS become categoricals
+    (categories in order of first appearance, like unique()) and float
+    columns float32. Text and integer columns are unchanged.
+    """
+    columns = {}
+    for name, series in df.items():
+        if name in CATEGORICAL_COLUMNS and not isinstance(series.dtype, pd.CategoricalDtype):
+            series = pd.Series(pd.Categorical(series, categories=series.unique()), index=series.index)
+        elif pd.api.types.is_float_dtype(series.dtype):
+            series = series.astype(SCORE_DTYPE)
+        columns[name] = series
+    return pd.DataFrame(columns, index=df.index)
+
+def expanded_memory(series):
+    """Bytes a column would take in the default schema: strings instead of categories, float64 scores."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # One column at a time, so the report never holds the whole expanded table
+        return series.astype(series.cat.categories.dtype).memory_usage(deep=True, index=False)
+    if pd.api.types.is_float_dtype(series.dtype):
+        return len(series) * np.dtype(np.float64).itemsize
+    return series.memory_usage(deep=True, index=False)
+
+def memory_report(df):
+    """
+    Compares a DataFrame's memory with the same data in the default schema.
+
+    Returns:
+        pd.DataFrame: Per column 'dtype', 'default_bytes' and 'compact_bytes',
+            with a 'total' row.
+    """
+    report = pd.DataFrame({'dtype': df.dtypes.astype(str),
+                           'default_bytes': [expanded_memory(df[name]) for name in df.columns],
+                           'compact_bytes': df.memory_usage(deep=True, index=False)})
+    report.loc['total'] = ['', report['default_bytes'].sum(), report['compact_bytes'].sum()]
+    return report
+
+def format_memory_report(df):
+    """One-line summary of memory_report(df)."""
+    total = memory_report(df).loc['total']
+    return (f"{len(df)} rows x {len(df.columns)} columns: {total['default_bytes'] / 1e6:.2f} MB in the default "
+            f"schema -> {total['compact_bytes'] / 1e6:.2f} MB compact "
+            f"({total['default_bytes'] / max(total['compact_bytes'], 1):.1f}x smaller)")
+
+def export_csv(path, columns=None, store_dir=DEFAULT_STORE_DIR):
+    """Writes selected store columns to a CSV file (e.g. for the notebooks)."""
+    df = read_columns(columns, store_dir)
+    df.to_csv(path, index=False)
+    print(f"Exported {len(df.columns)} columns x {len(df)} rows to {path}")
+
+def import_csv(path, store_dir=DEFAULT_STORE_DIR, emotion_columns=None):
+    """
+    Builds a store from one of the pipeline's CSV files.
+
+    Text columns go to the text group, 'sentiment_score' to the VADER group and
+    every other numeric column to the emotion group as float32.
+    """
+    df = pd.read_csv(path)
+    text_columns = [name for name in ('film', 'character', 'dialogue', 'cleaned_dialogue') if name in df.columns]
+    write_group(df[text_columns], TEXT_GROUP, store_dir)
+    if 'sentiment_score' in df.columns:
+        write_group(df[['sentiment_score']], VADER_GROUP, store_dir)
+    if emotion_columns is None:
+        emotion_columns = [name for name in df.columns
+                           if name not in text_columns and name != 'sentiment_score'
+                           and pd.api.types.is_numeric_dtype(df[name])]
+    if emotion_columns:
+        write_group(df[emotion_columns].astype('float32'), EMOTION_GROUP, store_dir)
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect, import or export the columnar dialogue store.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Store directory.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('info', help="List groups, columns and on-disk sizes.")
+    memory_parser = subparsers.add_parser('memory', help="Compare in-memory size of the default and compact schemas.")
+    memory_parser.add_argument('--columns', nargs='+', help="Columns to load (default: all).")
+    export_parser = subparsers.add_parser('export', help="Export columns to CSV.")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--columns', nargs='+', help="Columns to export (default: all).")
+    import_parser = subparsers.add_parser('import', help="Build the store from a pipeline CSV.")
+    import_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        for group in list_groups(args.store):
+            table = open_group(group, args.store)
+            size_kb = os.path.getsize(group_path(group, args.store)) / 1024
+            print(f"{group:<10} {table.num_rows:>8} rows {size_kb:>10.1f} KB  {', '.join(table.schema.names)}")
+    elif args.command == 'memory':
+        df = read_columns(args.columns, args.store, compact=True)
+        print(memory_report(df).to_string())
+        print(format_memory_report(df))
+    elif args.command == 'export':
+        export_csv(args.path, args.columns, args.store)
+    else:
+        import_csv(args.path, args.store)
@@ -0,0 +1,326 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import store_measures
+from dialogue_store import (DEFAULT_STORE_DIR, EMBEDDING_GROUP, current_dataset_id, group_path, read_columns,
+                            read_embeddings)
+
+# --- Configuration ---
+INDEX_FILE = 'embedding_index.npz' # Saved in the store directory, next to the embedding group
+DEFAULT_PROBES = 8         # Inverted lists scanned per query; more is slower and closer to exact
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLE = 50_000     # Rows the centroids are trained on (all rows are then assigned)
+BLOCK_ROWS = 65_536        # Rows converted to float32 at a time, so memory stays bounded
+DEFAULT_CLUSTERS = 12
+SEED = 0
+
+# --- Helper Functions ---
+
+def default_lists(rows):
+    """About 4 * sqrt(rows) inverted lists: a query then scans a few hundredths of the corpus."""
+    return int(min(max(4 * np.sqrt(rows), 1), rows))
+
+def unit(vectors):
+    """Rows scaled to unit length (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def blocks(rows, size=BLOCK_ROWS):
+    return [slice(start, min(start + size, rows)) for start in range(0, rows, size)]
+
+def nearest_centroids(embeddings, centroids):
+    """Index of the most similar centroid for every row, computed block by block."""
+    assigned = np.empty(len(embeddings), dtype=np.int32)
+    for rows in blocks(len(embeddings)):
+        assigned[rows] = np.argmax(embeddings[rows].astype(np.float32) @ centroids.T, axis=1)
+    return assigned
+
+def spherical_kmeans(vectors, k, iterations=KMEANS_ITERATIONS, seed=SEED):
+    """
+    k-means on unit vectors with cosine similarity (centroids are re-normalized means).
+
+    Centroids start at k distinct random rows; a cluster that empties is
+    restarted at a random row.
+
+    Returns:
+        np.ndarray: float32 centroids of shape (k, dim), unit length.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)]
+    for _ in range(iterations):
+        assigned = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, vectors)
+        empty = np.bincount(assigned, minlength=k) == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        centroids = unit(sums)
+    return centroids
+
+# --- Index ---
+
+class EmbeddingIndex:
+    """
+    Inverted-file (IVF) index over the store's unit-length dialogue embeddings.
+
+    The embeddings are clustered into lists around k-means centroids. A query
+    is compared with the centroids and then only with the rows of its
+    `probes` closest lists, so it reads about probes / lists of the corpus
+    instead of every row. The rows themselves stay in the memory-mapped
+    embedding group; the index only holds centroids and row numbers.
+    """
+
+    def __init__(self, embeddings, centroids, order, offsets, dataset_id=None):
+        self.embeddings = embeddings # (rows, dim) float16, usually memory-mapped
+        self.centroids = centroids   # (lists, dim) float32
+        self.order = order           # Row numbers sorted by list
+        self.offsets = offsets       # List l holds order[offsets[l]:offsets[l + 1]]
+        self.dataset_id = dataset_id
+
+    @classmethod
+    def build(cls, embeddings, lists=None, iterations=KMEANS_ITERATIONS, sample=KMEANS_SAMPLE, seed=SEED,
+              dataset_id=None):
+        """Trains centroids on a sample of rows, then assigns every row to its closest centroid."""
+        lists = lists or default_lists(len(embeddings))
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(len(embeddings), size=min(sample, len(embeddings)), replace=False))
+        centroids = spherical_kmeans(embeddings[rows], lists, iterations, seed)
+        assigned = nearest_centroids(embeddings, centroids)
+        order = np.argsort(assigned, kind='stable').astype(np.int32)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assigned, minlength=lists))]).astype(np.int64)
+        return cls(embeddings, centroids, order, offsets, dataset_id)
+
+    @property
+    def lists(self):
+        return len(self.centroids)
+
+    def list_rows(self, lists):
+        """Row numbers in the given lists, in row order."""
+        return np.sort(np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]))
+
+    def search(self, query, k=10, probes=DEFAULT_PROBES, exclude=None):
+        """
+        The k rows most similar to a query vector among the `probes` closest lists.
+
+        Args:
+            query (np.ndarray): A vector of the embedding size (need not be unit length).
+            k (int): Number of results.
+            probes (int): Lists to scan.
+            exclude (int): Optional row to leave out (e.g. the query's own row).
+
+        Returns:
+            tuple: (row numbers, cosine similarities), most similar first.
+        """
+        query = unit(query)
+        lists = np.argsort(-(self.centroids @ query))[:probes]
+        return self._top(self.list_rows(lists), query, k, exclude)
+
+    def exact_search(self, query, k=10, exclude=None):
+        """Like search, but compares the query with every row (for checking recall)."""
+        return self._top(np.arange(len(self.embeddings)), unit(query), k, exclude)
+
+    def _top(self, rows, query, k, exclude):
+        if exclude is not None:
+            rows = rows[rows != exclude]
+        similarities = np.concatenate([self.embeddings[rows[block]].astype(np.float32) @ query
+                                       for block in blocks(len(rows))]) if len(rows) else np.empty(0)
+        top = np.argpartition(-similarities, k - 1)[:k] if len(rows) > k else np.arange(len(rows))
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        return rows[top], similarities[top]
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                 rows=len(self.embeddings), dataset_id=self.dataset_id or '')
+
+    @classmethod
+    def load(cls, embeddings, path, dataset_id=None):
+        """
+        Loads a saved index over `embeddings`.
+
+        Raises:
+            FileNotFoundError: If there is no saved index.
+            ValueError: If the index was built for another dataset or row count.
+        """
+        with np.load(path) as data:
+            if str(data['dataset_id']) != (dataset_id or '') or int(data['rows']) != len(embeddings):
+                raise ValueError(f"{path} was built for other embeddings; rebuild it with 'embedding_index.py build'.")
+            return cls(embeddings, data['centroids'], data['order'], data['offsets'], dataset_id)
+
+def index_path(store_dir=DEFAULT_STORE_DIR):
+    return os.path.join(store_dir, INDEX_FILE)
+
+def open_index(store_dir=DEFAULT_STORE_DIR):
+    """The saved index over the store's embeddings, rebuilt if the embeddings are newer."""
+    embeddings, _ = read_embeddings(store_dir)
+    dataset_id = current_dataset_id(store_dir)
+    path = index_path(store_dir)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(group_path(EMBEDDING_GROUP, store_dir)):
+        try:
+            return EmbeddingIndex.load(embeddings, path, dataset_id)
+        except ValueError:
+            pass
+    print("Building embedding index...")
+    index = EmbeddingIndex.build(embeddings, dataset_id=dataset_id)
+    index.save(path)
+    return index
+
+# --- Queries ---
+
+def find_row(df, match=None, character=None, film=None, row=None):
+    """
+    The row a similarity query starts from: `row` itself if given, else the
+    first line containing `match` (case-insensitive), or without `match` the
+    longest line, among the given character's and film's lines.
+
+    Raises:
+        KeyError: If `row` is out of range or no line matches.
+    """
+    if row is not None:
+        if not 0 <= row < len(df):
+            raise KeyError(f"Row {row} is out of range; the store has rows 0 to {len(df) - 1}.")
+        return row
+    mask = pd.Series(True, index=df.index)
+    if character:
+        mask &= df['character'].astype(str).str.casefold() == character.casefold()
+    if film:
+        mask &= df['film'].astype(str).str.casefold() == film.casefold()
+    if match:
+        mask &= df['dialogue'].astype(str).str.contains(match, case=False, regex=False)
+    candidates = df.index[mask]
+    if not len(candidates):
+        raise KeyError("No dialogue matches the query.")
+    if match:
+        return int(candidates[0])
+    return int(df.loc[candidates, 'dialogue'].astype(str).str.len().idxmax())
+
+def embed_text(text, model_name):
+    """Embeds a new line with the emotion model (loads torch and the model)."""
+    from emotion_inference import classify_batched, load_emotion_model
+
+    model, tokenizer, emotion_columns, device = load_emotion_model(model_name)
+    _, embeddings = classify_batched([text], model, tokenizer, emotion_columns, device=device,
+                                     return_embeddings=True)
+    return embeddings[0]
+
+def cluster_report(embeddings, df, emotions, k=DEFAULT_CLUSTERS, examples=3):
+    """
+    Clusters every line's embedding and describes each cluster: size, main
+    characters, mean emotion scores and the lines closest to its centre.
+    No model is loaded; the stored embeddings are enough.
+
+    Returns:
+        pd.DataFrame: One row per cluster, largest first.
+    """
+    centroids = spherical_kmeans(embeddings[np.sort(np.random.default_rng(SEED).choice(
+        len(embeddings), size=min(KMEANS_SAMPLE, len(embeddings)), replace=False))], k)
+    assigned = nearest_centroids(embeddings, centroids)
+    summary = []
+    for cluster in range(k):
+        rows = np.flatnonzero(assigned == cluster)
+        if not len(rows):
+            continue
+        members = df.iloc[rows]
+        closest = rows[np.argsort(-(embeddings[rows].astype(np.float32) @ centroids[cluster]))[:examples]]
+        summary.append({
+            'cluster': cluster,
+            'lines': len(rows),
+            'characters': ', '.join(members['character'].astype(str).value_counts().index[:3]),
+            **({'top_emotion': members[emotions].mean().idxmax()} if emotions else {}),
+            **{emotion: members[emotion].mean() for emotion in emotions},
+            'examples': ' | '.join(df['dialogue'].iloc[closest].astype(str).str.slice(0, 60)),
+        })
+    return pd.DataFrame(summary).sort_values('lines', ascending=False).reset_index(drop=True)
+
+def recall_report(index, queries=200, k=10, probes=DEFAULT_PROBES, seed=SEED):
+    """Mean recall@k of index search against exact search, and the time per query of each."""
+    rows = np.random.default_rng(seed).choice(len(index.embeddings), size=min(queries, len(index.embeddings)),
+                                              replace=False)
+    found, approximate_time, exact_time = [], 0.0, 0.0
+    for row in rows:
+        query = index.embeddings[row]
+        start = time.perf_counter()
+        approximate, _ = index.search(query, k, probes, exclude=row)
+        approximate_time += time.perf_counter() - start
+        start = time.perf_counter()
+        exact, _ = index.exact_search(query, k, exclude=row)
+        exact_time += time.perf_counter() - start
+        found.append(len(np.intersect1d(approximate, exact)) / max(len(exact), 1))
+    return float(np.mean(found)), approximate_time / len(rows), exact_time / len(rows)
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Search and cluster the dialogue embeddings kept by bert-analysis.py.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Store directory.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Build (or rebuild) the nearest-neighbour index.")
+    build_parser.add_argument('--lists', type=int, help="Inverted lists (default: about 4 * sqrt(rows)).")
+    build_parser.add_argument('--iterations', type=int, default=KMEANS_ITERATIONS)
+    similar_parser = subparsers.add_parser('similar', help="Lines most similar to one line of dialogue.")
+    similar_parser.add_argument('--row', type=int, help="Query with this store row.")
+    similar_parser.add_argument('--match', help="Query with the first line containing this text.")
+    similar_parser.add_argument('--character', help="Restrict --match (or the longest line) to this character.")
+    similar_parser.add_argument('--film', help="Restrict --match (or the longest line) to this film.")
+    similar_parser.add_argument('--text', help="Query with new text (loads the emotion model).")
+    similar_parser.add_argument('-n', type=int, default=10, help="Results to show.")
+    similar_parser.add_argument('--probes', type=int, default=DEFAULT_PROBES, help="Inverted lists to scan.")
+    similar_parser.add_argument('--exact', action='store_true', help="Compare with every line instead.")
+    recall_parser = subparsers.add_parser('recall', help="Check index search against exact search.")
+    recall_parser.add_argument('--queries', type=int, default=200)
+    recall_parser.add_argument('-n', type=int, default=10)
+    recall_parser.add_argument('--probes', type=int, default=DEFAULT_PROBES)
+    clusters_parser = subparsers.add_parser('clusters', help="Cluster the lines and summarize each cluster.")
+    clusters_parser.add_argument('-k', type=int, default=DEFAULT_CLUSTERS, help="Number of clusters.")
+    clusters_parser.add_argument('--examples', type=int, default=3, help="Lines shown per cluster.")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            embeddings, _ = read_embeddings(args.store)
+            start = time.perf_counter()
+            index = EmbeddingIndex.build(embeddings, args.lists, args.iterations,
+                                         dataset_id=current_dataset_id(args.store))
+            index.save(index_path(args.store))
+            sizes = np.diff(index.offsets)
+            print(f"Indexed {len(embeddings)} x {embeddings.shape[1]} embeddings in {index.lists} lists "
+                  f"(mean {sizes.mean():.1f}, largest {sizes.max()} rows) in {time.perf_counter() - start:.2f}s "
+                  f"-> {index_path(args.store)}")
+        elif args.command == 'similar':
+            index = open_index(args.store)
+            df = read_columns(['film', 'character', 'dialogue'], args.store, compact=True)
+            if args.text:
+                query_row, query = None, embed_text(args.text, read_embeddings(args.store)[1])
+                print(f"Query: {args.text!r}")
+            else:
+                query_row = find_row(df, args.match, args.character, args.film, args.row)
+                query = index.embeddings[query_row]
+                print(f"Query (row {query_row}, {df['film'].iloc[query_row]} / {df['character'].iloc[query_row]}): "
+                      f"{df['dialogue'].iloc[query_row]!r}")
+            start = time.perf_counter()
+            if args.exact:
+                rows, similarities = index.exact_search(query, args.n, exclude=query_row)
+            else:
+                rows, similarities = index.search(query, args.n, args.probes, exclude=query_row)
+            print(f"{len(rows)} results in {(time.perf_counter() - start) * 1000:.1f} ms:")
+            for row, similarity in zip(rows, similarities):
+                print(f"  {similarity:.3f}  row {row:<6} {df['film'].iloc[row]} / {df['character'].iloc[row]}: "
+                      f"{str(df['dialogue'].iloc[row])[:100]!r}")
+        elif args.command == 'recall':
+            index = open_index(args.store)
+            recall, approximate_time, exact_time = recall_report(index, args.queries, args.n, args.probes)
+            print(f"recall@{args.n} with {args.probes} of {index.lists} lists: {recall:.3f} "
+                  f"({approximate_time * 1000:.2f} ms per query vs {exact_time * 1000:.2f} ms exact)")
+        else:
+            embeddings, _ = read_embeddings(args.store)
+            df = read_columns(['film', 'character', 'dialogue'], args.store, compact=True)
+            emotions = store_measures(args.store)[1:]
+            if emotions:
+                df = df.join(read_columns(emotions, args.store, compact=True))
+            with pd.option_context('display.max_colwidth', 200, 'display.width', 250, 'display.precision', 3):
+                print(cluster_report(embeddings, df, emotions, args.k, args.examples).to_string(index=False))
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        raise SystemExit(f"Error: {e}")
@@ -0,0 +1,222 @@
+import argparse
+import copy
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from emotion_inference import BACKENDS, DEFAULT_BATCH_SIZE, EMOTION_MODEL_NAME, classify_batched, load_emotion_model
+
+# --- Configuration ---
+DEFAULT_ONNX_DIR = 'models'
+ONNX_OPSET = 17
+
+# Accuracy targets for a CPU backend, measured against the fp32 scores in REFERENCE_CSV
+REFERENCE_CSV = 'dialogues_with_vader_and_emotion.csv'
+MAX_MEAN_ABS_ERROR = 0.01      # Per emotion, averaged over all dialogues
+MIN_DOMINANT_AGREEMENT = 0.95  # Share of dialogues whose top emotion is unchanged
+
+# --- Backends ---
+# Every backend is returned as a forward function for emotion_inference.classify_batched:
+# it takes the padded features dict (CPU torch tensors) and returns the logits.
+
+def onnx_path(onnx_dir, quantized=False, revision='local'):
+    """
+    Returns where the exported (and optionally int8-quantized) ONNX model lives.
+
+    The model revision is part of the file name, so a model update exports
+    afresh instead of reusing the previous model's graph.
+    """
+    name = EMOTION_MODEL_NAME.split('/')[-1]
+    return os.path.join(onnx_dir, f"{name}@{revision[:12]}{'-int8' if quantized else ''}.onnx")
+
+def cpu_model(model):
+    """
+    Returns the model on the CPU in eval mode.
+
+    A model on another device is copied rather than moved, so the caller's
+    model (e.g. the pipeline's GPU model) is left where it was.
+    """
+    if next(model.parameters()).device.type != 'cpu':
+        model = copy.deepcopy(model).to('cpu')
+    return model.eval()
+
+def export_onnx(model, tokenizer, path):
+    """Exports the classifier to ONNX with dynamic batch and sequence axes."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    sample = tokenizer(["An example line of dialogue."], return_tensors='pt')
+    model = cpu_model(model)
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            (sample['input_ids'], sample['attention_mask']),
+            path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={'input_ids': {0: 'batch', 1: 'sequence'},
+                          'attention_mask': {0: 'batch', 1: 'sequence'},
+                          'logits': {0: 'batch'}},
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+    print(f"Exported ONNX model to {path}")
+
+def load_backend(name, model, tokenizer, num_threads=None, onnx_dir=DEFAULT_ONNX_DIR, revision=None):
+    """
+    Builds a CPU forward function for the emotion model.
+
+    Args:
+        name (str): One of BACKENDS:
+            'torch'     - the fp32 PyTorch model (the current behaviour);
+            'int8'      - PyTorch dynamic int8 quantization of the Linear layers;
+            'onnx'      - fp32 ONNX Runtime session;
+            'onnx-int8' - ONNX Runtime with dynamically int8-quantized weights.
+        model: The fp32 Hugging Face model.
+        tokenizer: Its tokenizer (used to trace the ONNX export).
+        num_threads (int): Intra-op thread count (defaults to the CPU count).
+        onnx_dir (str): Where exported ONNX files are cached.
+        revision (str): Model revision naming the cached ONNX files (defaults
+            to the Hub commit in the model's config; pass the artifact's
+            revision for a model loaded from a local artifact).
+
+    Returns:
+        callable: forward(features) -> logits.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'; choose from {BACKENDS}.")
+    num_threads = num_threads or os.cpu_count()
+
+    if name in ('torch', 'int8'):
+        torch.set_num_threads(num_threads)
+        backend_model = cpu_model(model)
+        if name == 'int8':
+            # Quantizes a copy; the fp32 model is unchanged
+            backend_model = torch.ao.quantization.quantize_dynamic(backend_model, {torch.nn.Linear},
+                                                                   dtype=torch.qint8)
+
+        def forward(features):
+            return backend_model(input_ids=features['input_ids'], attention_mask=features['attention_mask']).logits
+        return forward
+
+    import onnxruntime as ort
+
+    revision = revision or getattr(model.config, '_commit_hash', None) or 'local'
+    path = onnx_path(onnx_dir, revision=revision)
+    if not os.path.exists(path):
+        export_onnx(model, tokenizer, path)
+    if name == 'onnx-int8':
+        quantized_path = onnx_path(onnx_dir, quantized=True, revision=revision)
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+            print(f"Quantized ONNX model to {quantized_path}")
+        path = quantized_path
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = num_threads
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def forward(features):
+        inputs = {'input_ids': features['input_ids'].numpy().astype(np.int64),
+                  'attention_mask': features['attention_mask'].numpy().astype(np.int64)}
+        return session.run(['logits'], inputs)[0]
+    return forward
+
+# --- Accuracy & Latency Report ---
+
+def timed_forward(forward, timings):
+    """Wraps a forward function so each batch's latency is appended to `timings`."""
+    def wrapped(features):
+        start = time.perf_counter()
+        logits = forward(features)
+        timings.append(time.perf_counter() - start)
+        return logits
+    return wrapped
+
+def compare_scores(scores, reference, emotion_columns):
+    """
+    Compares backend scores against reference fp32 scores.
+
+    Rows whose reference scores are all zero (the original per-row pipeline
+    failed on them, e.g. over-long dialogue) are left out.
+
+    Returns:
+        dict: Per-emotion mean/max absolute error, dominant-emotion agreement,
+            and whether the backend is within tolerance.
+    """
+    keep = reference.sum(axis=1) > 0
+    errors = np.abs(scores[keep] - reference[keep])
+    per_emotion = {column: {'mae': float(errors[:, j].mean()), 'max': float(errors[:, j].max())}
+                   for j, column in enumerate(emotion_columns)}
+    agreement = float((scores[keep].argmax(axis=1) == reference[keep].argmax(axis=1)).mean())
+    within = all(stats['mae'] <= MAX_MEAN_ABS_ERROR for stats in per_emotion.values()) \
+        and agreement >= MIN_DOMINANT_AGREEMENT
+    return {'rows': int(keep.sum()), 'per_emotion': per_emotion,
+            'dominant_agreement': agreement, 'within_tolerance': within}
+
+def evaluate_backend(name, model, tokenizer, emotion_columns, texts, reference,
+                     num_threads=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Scores `texts` with a backend and returns its accuracy and latency figures."""
+    forward = load_backend(name, model, tokenizer, num_threads=num_threads)
+    timings = []
+    # One warm-up batch so lazy initialization does not count as latency
+    classify_batched(texts[:batch_size], model, tokenizer, emotion_columns,
+                     batch_size=batch_size, forward=forward)
+    start = time.perf_counter()
+    scores = classify_batched(texts, model, tokenizer, emotion_columns,
+                              batch_size=batch_size, forward=timed_forward(forward, timings))
+    elapsed = time.perf_counter() - start
+
+    report = compare_scores(scores, reference, emotion_columns)
+    report.update({'backend': name, 'threads': num_threads or os.cpu_count(),
+                   'seconds': elapsed, 'rows_per_sec': len(texts) / elapsed,
+                   'batch_p50_ms': float(np.percentile(timings, 50) * 1000),
+                   'batch_p95_ms': float(np.percentile(timings, 95) * 1000)})
+    return report
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Compare CPU backends for the emotion model against the fp32 reference scores.")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--threads', nargs='+', type=int, default=[os.cpu_count()],
+                        help="Intra-op thread counts to try (e.g. 1 2 4 8).")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--reference', default=REFERENCE_CSV, help="CSV with fp32 emotion scores.")
+    parser.add_argument('--limit', type=int, help="Only use the first N dialogues.")
+    args = parser.parse_args()
+
+    model, tokenizer, emotion_columns, _ = load_emotion_model(device=torch.device('cpu'))
+    df = pd.read_csv(args.reference)
+    if args.limit:
+        df = df.head(args.limit)
+    texts = df['cleaned_dialogue'].tolist()
+    reference = df[emotion_columns].to_numpy(dtype=np.float32)
+
+    print(f"Evaluating on {len(texts)} dialogues (tolerance: MAE <= {MAX_MEAN_ABS_ERROR} per emotion, "
+          f"dominant emotion agreement >= {MIN_DOMINANT_AGREEMENT:.0%})\n")
+    print(f"{'backend':<10} {'threads':>7} {'rows/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'worst MAE':>10} {'max err':>8} {'agree':>7}  ok")
+    best = None
+    for name in args.backends:
+        for threads in args.threads:
+            report = evaluate_backend(name, model, tokenizer, emotion_columns, texts, reference,
+                                      num_threads=threads, batch_size=args.batch_size)
+            worst_mae = max(stats['mae'] for stats in report['per_emotion'].values())
+            max_err = max(stats['max'] for stats in report['per_emotion'].values())
+            print(f"{name:<10} {threads:>7} {report['rows_per_sec']:>8.1f} {report['batch_p50_ms']:>8.1f} "
+                  f"{report['batch_p95_ms']:>8.1f} {worst_mae:>10.4f} {max_err:>8.4f} "
+                  f"{report['dominant_agreement']:>7.1%}  {'yes' if report['within_tolerance'] else 'NO'}")
+            if report['within_tolerance'] and (best is None or report['rows_per_sec'] > best['rows_per_sec']):
+                best = report
+
+    if best:
+        print(f"\nFastest backend within tolerance: {best['backend']} with {best['threads']} threads "
+              f"({best['rows_per_sec']:.1f} dialogues/s)")
+    else:
+        print("\nNo backend stayed within tolerance.")
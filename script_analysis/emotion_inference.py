@@ -0,0 +1,249 @@
+import numpy as np
+
+# torch and transformers are imported inside the functions that need them, so
+# importing this module (e.g. to read its constants) stays cheap.
+
+# --- Configuration ---
+EMOTION_MODEL_NAME = "j-hartmann/emotion-english-distilroberta-base"
+EMOTION_LABELS = ('anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise') # Its labels, in output order
+BACKENDS = ('torch', 'int8', 'onnx', 'onnx-int8') # Forward passes emotion_backends.load_backend can build
+DEFAULT_BATCH_SIZE = 32   # Dialogues per forward pass
+DEFAULT_MAX_LENGTH = 512  # distilroberta's positional limit
+DEFAULT_WINDOW_OVERLAP = 64 # Tokens shared by consecutive windows when long dialogues are chunked
+                            # (at most a quarter of the window for short --max-length caps)
+
+# --- Batch Inference Engine ---
+
+def length_buckets(lengths, batch_size):
+    """
+    Groups row indices into batches of similar token length.
+
+    Sorting by length before batching means each batch only pads up to its own
+    longest member, instead of every line paying for the longest monologue.
+
+    Args:
+        lengths (sequence): Token count for each text.
+        batch_size (int): Maximum number of texts per batch.
+
+    Returns:
+        list: A list of NumPy index arrays, one per batch.
+    """
+    order = np.argsort(np.asarray(lengths), kind='stable')
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+def special_tokens(tokenizer):
+    """Returns the (prefix, suffix) token ids the tokenizer wraps around every text, e.g. <s> ... </s>."""
+    content = tokenizer('a', add_special_tokens=False)['input_ids']
+    full = tokenizer('a')['input_ids']
+    for start in range(len(full) - len(content) + 1):
+        if full[start:start + len(content)] == content:
+            return full[:start], full[start + len(content):]
+    return [], []
+
+def token_windows(token_ids, content_length, overlap):
+    """
+    Splits one text's tokens into overlapping windows of at most `content_length` tokens.
+
+    Consecutive windows share `overlap` tokens, so no sentence is only ever
+    seen cut in half; the last window ends at the last token.
+    """
+    if len(token_ids) <= content_length:
+        return [token_ids]
+    step = content_length - overlap
+    return [token_ids[start:start + content_length] for start in range(0, len(token_ids) - overlap, step)]
+
+def classify_batched(texts, model, tokenizer, emotion_columns, batch_size=DEFAULT_BATCH_SIZE,
+                     max_length=DEFAULT_MAX_LENGTH, device=None, progress=False, forward=None,
+                     chunk_long=False, overlap=None, report=None, return_embeddings=False):
+    """
+    Scores a list of texts with the emotion model in length-bucketed batches.
+
+    Texts longer than `max_length` tokens are truncated, or with `chunk_long`
+    split into overlapping windows of `max_length` tokens. The windows of every
+    text are batched together, and a text's scores are the token-weighted mean
+    of its windows' probabilities, so no forward pass is longer than
+    `max_length` whatever the length of a monologue.
+
+    Args:
+        texts (list): Dialogue strings, in row order.
+        model: A Hugging Face sequence classification model.
+        tokenizer: The tokenizer matching `model`.
+        emotion_columns (list): Emotion labels in the desired column order.
+        batch_size (int): Maximum number of texts per forward pass.
+        max_length (int): Token limit per forward pass (special tokens
+            included). Lowering it trades accuracy on long texts for speed.
+        device: Torch device to run on (defaults to the model's device).
+        progress (bool): Show a tqdm progress bar over batches.
+        forward (callable): Optional replacement for the model's forward pass,
+            taking the padded features dict and returning logits (see
+            emotion_backends.py). The model is then only used for its config.
+        chunk_long (bool): Chunk texts over `max_length` instead of truncating them.
+        overlap (int): Tokens shared by consecutive windows when chunking
+            (default: DEFAULT_WINDOW_OVERLAP, capped at a quarter of the window).
+        report (dict): Optional dict whose counts are incremented with 'rows'
+            scored, 'long_rows' over the limit, 'windows' run and the largest
+            'max_tokens' seen, e.g. to report how many rows a cap affects.
+        return_embeddings (bool): Also return each text's embedding from the
+            same forward pass: the mean of the last hidden layer over its
+            tokens (token-weighted over windows), scaled to unit length.
+            Needs the torch model, so `forward` must be None.
+
+    Returns:
+        np.ndarray: A float32 array of shape (len(texts), len(emotion_columns)),
+            with rows in the same order as `texts`. Empty or non-string texts
+            get all-zero scores, matching `analyze_emotions`. With
+            `return_embeddings`, a tuple (scores, float16 array of shape
+            (len(texts), hidden_size)), with all-zero embeddings for empty texts.
+    """
+    scores = np.zeros((len(texts), len(emotion_columns)), dtype=np.float32)
+    embeddings = np.zeros((len(texts), model.config.hidden_size if return_embeddings else 0), dtype=np.float16)
+    valid_rows = [i for i, text in enumerate(texts) if isinstance(text, str) and text.strip()]
+    if not valid_rows:
+        return (scores, embeddings) if return_embeddings else scores
+
+    import torch
+
+    if return_embeddings and forward is not None:
+        raise ValueError("Embeddings come from the torch model's hidden states; "
+                         "they cannot be kept with a replacement forward pass.")
+    pooled = [] # Filled by forward() with each batch's mean-pooled last hidden layer
+    if forward is None:
+        if device is None:
+            device = next(model.parameters()).device
+        model.eval()
+
+        def forward(features):
+            features = {key: value.to(device) for key, value in features.items()}
+            outputs = model(**features, output_hidden_states=return_embeddings)
+            if return_embeddings:
+                mask = features['attention_mask'].unsqueeze(-1).float()
+                hidden = outputs.hidden_states[-1].float()
+                pooled.append(((hidden * mask).sum(dim=1) / mask.sum(dim=1)).cpu().numpy())
+            return outputs.logits
+
+    # Map the model's label order onto the requested column order
+    id2label = model.config.id2label
+    label_to_id = {id2label[i]: i for i in range(len(id2label))}
+    column_ids = [label_to_id[label] for label in emotion_columns]
+
+    # Tokenize once without padding or truncation; windows are cut and padded below
+    prefix, suffix = special_tokens(tokenizer)
+    content_length = max_length - len(prefix) - len(suffix)
+    if overlap is None:
+        overlap = min(DEFAULT_WINDOW_OVERLAP, content_length // 4)
+    if chunk_long and not 0 <= overlap < content_length:
+        raise ValueError(f"Window overlap must be between 0 and {content_length - 1} tokens, got {overlap}.")
+    encodings = tokenizer([texts[i] for i in valid_rows], add_special_tokens=False, verbose=False)['input_ids']
+    input_ids, owners, weights = [], [], []
+    for row, ids in enumerate(encodings):
+        windows = token_windows(ids, content_length, overlap) if chunk_long else [ids[:content_length]]
+        for window in windows:
+            input_ids.append(prefix + window + suffix)
+            owners.append(row)
+            weights.append(max(len(window), 1))
+    owners = np.asarray(owners)
+    weights = np.asarray(weights, dtype=np.float64)
+    if report is not None:
+        lengths = [len(ids) + len(prefix) + len(suffix) for ids in encodings]
+        report['rows'] = report.get('rows', 0) + len(encodings)
+        report['long_rows'] = report.get('long_rows', 0) + sum(length > max_length for length in lengths)
+        report['windows'] = report.get('windows', 0) + len(input_ids)
+        report['max_tokens'] = max(report.get('max_tokens', 0), max(lengths))
+    batches = length_buckets([len(ids) for ids in input_ids], batch_size)
+
+    if progress:
+        from tqdm.auto import tqdm
+        batches = tqdm(batches, desc="Emotion batches")
+
+    window_scores = np.zeros((len(input_ids), len(emotion_columns)), dtype=np.float32)
+    window_embeddings = np.zeros((len(input_ids), embeddings.shape[1]), dtype=np.float32)
+    with torch.inference_mode():
+        for batch in batches:
+            features = tokenizer.pad({'input_ids': [input_ids[j] for j in batch]}, return_tensors='pt')
+            logits = torch.as_tensor(forward(features))
+            window_scores[batch] = torch.softmax(logits.float(), dim=-1)[:, column_ids].cpu().numpy()
+            if return_embeddings:
+                window_embeddings[batch] = pooled.pop()
+
+    if len(input_ids) == len(valid_rows):
+        # One window per text: scatter straight back into original row positions
+        scores[np.asarray(valid_rows)[owners]] = window_scores
+        text_embeddings = window_embeddings
+    else:
+        # Token-weighted mean of each text's windows
+        totals = np.zeros((len(valid_rows), len(emotion_columns)), dtype=np.float64)
+        np.add.at(totals, owners, window_scores * weights[:, None])
+        scores[np.asarray(valid_rows)] = totals / np.bincount(owners, weights=weights)[:, None]
+        text_embeddings = np.zeros((len(valid_rows), embeddings.shape[1]), dtype=np.float64)
+        np.add.at(text_embeddings, owners, window_embeddings * weights[:, None]) # Scale drops out below
+    if not return_embeddings:
+        return scores
+    # Unit length, so the dot product of two embeddings is their cosine similarity
+    norms = np.linalg.norm(text_embeddings, axis=1, keepdims=True)
+    embeddings[np.asarray(valid_rows)] = text_embeddings / np.maximum(norms, 1e-12)
+    return scores, embeddings
+
+def length_options_key(max_length=DEFAULT_MAX_LENGTH, chunk_long=False, overlap=None):
+    """
+    Score cache key suffix for the long-text handling ('' for the default 512-token truncation).
+
+    Append it to the model key: truncating or chunking differently changes
+    the scores of long texts.
+    """
+    if chunk_long:
+        return f"|chunk{max_length}/{'auto' if overlap is None else overlap}"
+    return '' if max_length == DEFAULT_MAX_LENGTH else f"|max{max_length}"
+
+def format_length_report(report, max_length, chunk_long):
+    """One-line summary of how many rows exceeded the token limit and what happened to them."""
+    action = f"chunked into {report.get('windows', 0)} windows in total" if chunk_long else "truncated"
+    return (f"{report.get('long_rows', 0)} of {report.get('rows', 0)} dialogues exceed {max_length} tokens "
+            f"(longest {report.get('max_tokens', 0)}): {action}.")
+
+# --- Model Loading ---
+
+def pick_device():
+    """Returns the best available torch device: MPS, then CUDA, then CPU."""
+    import torch
+
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    if torch.cuda.is_available():
+        return torch.device("cuda:0")
+    return torch.device("cpu")
+
+def load_emotion_model(model_name=EMOTION_MODEL_NAME, device=None):
+    """
+    Loads the emotion classifier the same way bert-analysis.py does.
+
+    Returns:
+        tuple: (model, tokenizer, emotion_columns, device).
+    """
+    from transformers import pipeline
+
+    device = device or pick_device()
+    classifier = pipeline("text-classification", model=model_name, top_k=None, device=device)
+    id2label = classifier.model.config.id2label
+    emotion_columns = [id2label[i] for i in range(len(id2label))]
+    return classifier.model, classifier.tokenizer, emotion_columns, device
+
+def emotion_model_revision(model_name=EMOTION_MODEL_NAME):
+    """
+    Returns the Hub commit a model name currently resolves to, as recorded by emotion_model_key.
+
+    Only the model's config is fetched, so this is cheap enough to check
+    before deciding whether the model needs loading at all.
+    """
+    from transformers import AutoConfig
+
+    return getattr(AutoConfig.from_pretrained(model_name), '_commit_hash', None) or 'local'
+
+def emotion_model_key(model_name, model, emotion_columns, revision=None):
+    """
+    Returns the score cache key for a model: name, revision and label order.
+
+    Pass `revision` when the model was loaded from a local artifact, whose
+    config no longer carries the Hub commit hash.
+    """
+    revision = revision or getattr(model.config, '_commit_hash', None) or 'local'
+    return f"{model_name}@{revision}:{','.join(emotion_columns)}"
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from importlib.metadata import version
+
+from dedup import DEFAULT_DEDUP_MODE
+from dialogue_store import (DEFAULT_STORE_DIR, EMOTION_GROUP, SPANS_GROUP, TEXT_GROUP, VADER_GROUP,
+                            group_path, new_dataset_writers, open_group)
+from emotion_inference import DEFAULT_MAX_LENGTH, EMOTION_MODEL_NAME, emotion_model_revision, format_length_report
+from pipeline import (DEFAULT_CHUNK_SIZE, PipelineError, load_emotion_components,
+                      read_running_stats, run_pipeline, write_aggregates)
+from score_cache import DEFAULT_CACHE_PATH
+
+# --- Configuration ---
+PARTITIONS_DIRNAME = 'partitions'           # Per-film stores live in <store>/partitions/<film>/
+PARTITION_INFO_FILENAME = 'partition.json'  # Written last: a partition without it is incomplete
+MERGE_INDEX_FILENAME = 'merged.json'        # Which partitions the merged store was built from
+PARTITION_FORMAT = 2                        # Bump when partition contents change meaning
+HASH_BLOCK_SIZE = 1 << 20
+
+# --- Fingerprints ---
+
+def file_fingerprint(path, previous=None):
+    """
+    Returns the SHA-256, size and mtime of a screenplay file.
+
+    If `previous` (an earlier fingerprint of the same file) has the same size
+    and mtime, its hash is reused instead of reading the file again, so an
+    unchanged catalog costs one stat() per script.
+    """
+    stat = os.stat(path)
+    if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+        return dict(previous)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return {'sha256': digest.hexdigest(), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def analysis_config(with_emotion, backend, max_length=DEFAULT_MAX_LENGTH, chunk_long=False,
+                    dedup=DEFAULT_DEDUP_MODE, revision=None):
+    """
+    The settings that change a partition's scores; any change rebuilds every partition.
+
+    `revision` is the emotion model's commit (see emotion_model_revision), so
+    a model update rescores every film instead of reusing stale partitions.
+    """
+    # 'off' and 'exact' dedup give the same scores, as do runs before dedup existed
+    config = {'format': PARTITION_FORMAT, 'vader': version('vaderSentiment'), 'emotion': None}
+    if dedup not in ('off', 'exact'):
+        config['dedup'] = dedup
+    if with_emotion:
+        config['emotion'] = {'model': EMOTION_MODEL_NAME, 'revision': revision, 'backend': backend,
+                             'max_length': max_length, 'chunk_long': chunk_long}
+    return config
+
+def partition_fingerprint(job, script_fingerprint, config):
+    """Hashes everything a film's partition depends on: script contents, target characters and config."""
+    characters = sorted(job['characters']) if job['characters'] is not None else None
+    key = json.dumps({'film': job['film'], 'script': script_fingerprint['sha256'],
+                      'characters': characters, 'config': config}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+# --- Partitions ---
+
+def partition_dir(store_dir, film):
+    """Returns the directory of a film's partition."""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', film).strip('_') or 'film'
+    return os.path.join(store_dir, PARTITIONS_DIRNAME, slug)
+
+def read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+def plan_partitions(manifest, store_dir, config, force=False):
+    """
+    Decides which films need rebuilding.
+
+    Returns:
+        list: One dict per manifest entry with 'job', 'dir', 'fingerprint',
+            'script' (file fingerprint) and 'status': 'reuse', 'new' or 'changed'.
+    """
+    plan = []
+    for job in manifest:
+        directory = partition_dir(store_dir, job['film'])
+        info = read_json(os.path.join(directory, PARTITION_INFO_FILENAME))
+        script = file_fingerprint(job['path'], info['script'] if info else None)
+        fingerprint = partition_fingerprint(job, script, config)
+        if info is None:
+            status = 'new'
+        elif force or info['fingerprint'] != fingerprint:
+            status = 'changed'
+        else:
+            status = 'reuse'
+            if script != info['script']:
+                # Same contents, new mtime (e.g. touched or checked out again): remember it
+                write_json(os.path.join(directory, PARTITION_INFO_FILENAME), dict(info, script=script))
+        plan.append({'job': job, 'dir': directory, 'fingerprint': fingerprint, 'script': script, 'status': status})
+    return plan
+
+def build_partition(entry, with_emotion, emotion=None, **pipeline_args):
+    """
+    Parses and scores one film into its partition directory.
+
+    The partition is built next to the old one and swapped in at the end, so
+    an interrupted run leaves the previous partition intact.
+    """
+    directory = entry['dir']
+    tmp_dir = directory + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        run_pipeline([entry['job']], store_dir=tmp_dir, with_emotion=with_emotion, emotion=emotion, **pipeline_args)
+        rows = open_group(TEXT_GROUP, tmp_dir).num_rows
+    except PipelineError:
+        # No dialogue for this film; record that so it is not re-parsed every run
+        os.makedirs(tmp_dir, exist_ok=True)
+        rows = 0
+    write_json(os.path.join(tmp_dir, PARTITION_INFO_FILENAME),
+               {'film': entry['job']['film'], 'fingerprint': entry['fingerprint'],
+                'script': entry['script'], 'characters': entry['job']['characters'], 'rows': rows})
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return rows
+
+def merge_partitions(plan, store_dir, groups):
+    """
+    Rebuilds the combined store from the partitions, in manifest order.
+
+    Groups are copied as Arrow tables straight from the memory-mapped
+    partition files, and the aggregates are the merged per-partition totals,
+    so nothing is re-parsed or rescored.
+
+    Returns:
+        RunningStats: The merged per-(film, character) totals.
+    """
+    filled = [entry for entry in plan if read_json(os.path.join(entry['dir'], PARTITION_INFO_FILENAME))['rows']]
+    if not filled:
+        raise PipelineError("No data extracted. Please check script paths and format.")
+
+    stats = None
+    writers = new_dataset_writers(groups, store_dir)
+    try:
+        for entry in filled:
+            for writer in writers:
+                writer.write_table(open_group(writer.group, entry['dir']))
+            partition_stats = read_running_stats(entry['dir'])
+            stats = partition_stats if stats is None else stats.merge(partition_stats)
+        for writer in writers:
+            writer.close()
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    return stats
+
+def remove_stale_partitions(plan, store_dir):
+    """Deletes partitions of films that are no longer in the manifest."""
+    root = os.path.join(store_dir, PARTITIONS_DIRNAME)
+    keep = {os.path.basename(entry['dir']) for entry in plan}
+    removed = []
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        if name not in keep and os.path.isdir(os.path.join(root, name)):
+            shutil.rmtree(os.path.join(root, name))
+            removed.append(name)
+    return removed
+
+# --- Incremental Driver ---
+
+def run_incremental(manifest, store_dir=DEFAULT_STORE_DIR, chunk_size=DEFAULT_CHUNK_SIZE,
+                    with_emotion=True, batch_size=32, cache_path=DEFAULT_CACHE_PATH,
+                    backend='torch', num_threads=None, force=False, max_length=DEFAULT_MAX_LENGTH,
+                    chunk_long=False, dedup=DEFAULT_DEDUP_MODE):
+    """
+    Runs the pipeline per film, redoing only films whose script, characters or config changed.
+
+    Each film is a partition with its own column groups and running totals.
+    Unchanged partitions are reused as they are; the combined store and its
+    aggregates are then rebuilt by merging the partitions.
+
+    Args:
+        manifest (list): Dictionaries with 'film', 'path' and 'characters' keys.
+        force (bool): Rebuild every partition regardless of fingerprints.
+        Other arguments are passed to `run_pipeline`.
+
+    Returns:
+        tuple: (per-(film, character) summary DataFrame, plan with each film's status).
+
+    Raises:
+        PipelineError: If no film produced any dialogue.
+    """
+    revision = emotion_model_revision() if with_emotion else None
+    config = analysis_config(with_emotion, backend, max_length, chunk_long, dedup, revision)
+    plan = plan_partitions(manifest, store_dir, config, force)
+    todo = [entry for entry in plan if entry['status'] != 'reuse']
+
+    emotion = None
+    if with_emotion and todo:
+        # One model load for every rebuilt film
+        emotion = load_emotion_components(backend, num_threads, max_length, chunk_long)
+    for entry in todo:
+        print(f"Rebuilding {entry['job']['film']} ({entry['status']})...")
+        entry['rows'] = build_partition(entry, with_emotion, emotion, chunk_size=chunk_size,
+                                        batch_size=batch_size, cache_path=cache_path,
+                                        backend=backend, num_threads=num_threads, dedup=dedup)
+    if emotion and emotion['report']:
+        print(f"Emotion: {format_length_report(emotion['report'], max_length, chunk_long)}")
+    removed = remove_stale_partitions(plan, store_dir)
+
+    merge_key = [[entry['job']['film'], entry['fingerprint']] for entry in plan]
+    index_path = os.path.join(store_dir, PARTITIONS_DIRNAME, MERGE_INDEX_FILENAME)
+    index = read_json(index_path)
+    if not todo and not removed and index == merge_key and os.path.exists(group_path(TEXT_GROUP, store_dir)):
+        print("All partitions unchanged; combined store is up to date.")
+        return read_running_stats(store_dir).to_frame(), plan
+
+    groups = [TEXT_GROUP, SPANS_GROUP, VADER_GROUP] + ([EMOTION_GROUP] if with_emotion else [])
+    stats = merge_partitions(plan, store_dir, groups)
+    write_aggregates(stats, store_dir)
+    write_json(index_path, merge_key)
+    return stats.to_frame(), plan
@@ -0,0 +1,271 @@
+import argparse
+import atexit
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError: # Windows: peak RSS is not reported
+    resource = None
+
+# --- Configuration ---
+# Tracing is switched on from the environment so the scripts run unchanged:
+#   ANALYSIS_TRACE=1                writes traces/<script>-<timestamp>.json
+#   ANALYSIS_TRACE=run.json         writes run.json
+#   ANALYSIS_PROFILE=cprofile       also writes one .prof file per top-level stage (snakeviz, pstats)
+#   ANALYSIS_PROFILE=sample         also writes sampled stacks in collapsed format (flamegraph.pl, speedscope)
+TRACE_ENV = 'ANALYSIS_TRACE'
+PROFILE_ENV = 'ANALYSIS_PROFILE'
+DEFAULT_TRACE_DIR = 'traces'
+SAMPLE_INTERVAL = 0.005 # Seconds between stack samples in 'sample' mode
+PROFILE_MODES = ('cprofile', 'sample')
+
+# --- Memory ---
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def current_rss_mb():
+    """Current resident set size in MB, read from /proc on Linux (None elsewhere)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+# --- Stack Sampling ---
+
+class StackSampler:
+    """
+    Samples the main thread's Python stack on a background thread.
+
+    Stacks are counted per stage and written in the collapsed format that
+    py-spy (`--format raw`), flamegraph.pl and speedscope read, so a sampled
+    run can be viewed with the same tools as an external py-spy recording.
+    """
+
+    def __init__(self, tracer, interval=SAMPLE_INTERVAL):
+        self.tracer = tracer
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.thread_id = threading.main_thread().ident
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stage = self.tracer.current_path() or '(no stage)'
+            self.counts[';'.join([stage] + stack[::-1])] += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+# --- Tracer ---
+
+class Tracer:
+    """
+    Records a tree of timed stages for one run of an analysis script.
+
+    Each stage records its wall time, start offset, current and peak RSS, and
+    any counts attached to it (rows, batch size, cache hits...). The trace is
+    JSON keyed by stage path, so two runs can be compared with
+    `python instrumentation.py diff a.json b.json`.
+
+        with tracer.stage('vader', rows=len(df)) as stage:
+            ...
+            stage['cache_hits'] = cache.hits
+    """
+
+    def __init__(self, script, output=None, profile=None):
+        if profile is not None and profile not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{profile}'; choose from {PROFILE_MODES}.")
+        self.script = script
+        self.output = output
+        self.profile = profile
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.stages = []
+        self.stack = []
+        self.profilers = {}
+        self.sampler = None
+        self.finished = False
+        if profile == 'sample':
+            self.sampler = StackSampler(self)
+            self.sampler.start()
+
+    @property
+    def enabled(self):
+        return self.output is not None
+
+    def current_path(self):
+        return '/'.join(self.stack)
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """Times the enclosed block as a stage; yields a dict for counts known only at the end."""
+        self.stack.append(name)
+        path = self.current_path()
+        record = {'path': path, 'start_offset': time.perf_counter() - self.start,
+                  'rss_before_mb': current_rss_mb(), 'counts': dict(counts)}
+        profiler = None
+        if self.profile == 'cprofile' and len(self.stack) == 1:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield record['counts']
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self.profilers[path] = profiler
+            record['rss_after_mb'] = current_rss_mb()
+            record['peak_rss_mb'] = peak_rss_mb()
+            self.stages.append(record)
+            self.stack.pop()
+
+    def to_dict(self):
+        return {'script': self.script,
+                'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'pid': os.getpid(),
+                'python': sys.version.split()[0],
+                'total_seconds': time.perf_counter() - self.start,
+                'peak_rss_mb': peak_rss_mb(),
+                'stages': sorted(self.stages, key=lambda record: record['start_offset'])}
+
+    def finish(self):
+        """Writes the trace (and any profiles) if tracing is enabled. Safe to call more than once."""
+        if self.finished or not self.enabled:
+            return
+        self.finished = True
+        if self.sampler is not None:
+            self.sampler.stop()
+        os.makedirs(os.path.dirname(self.output) or '.', exist_ok=True)
+        with open(self.output, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        base = os.path.splitext(self.output)[0]
+        for path, profiler in self.profilers.items():
+            profiler.dump_stats(f"{base}.{path.replace('/', '_')}.prof")
+        if self.sampler is not None:
+            self.sampler.write(f"{base}.stacks.txt")
+        print(f"Trace written to {self.output}", file=sys.stderr)
+
+class NullTracer(Tracer):
+    """Tracer used when tracing is off: stages cost a few attribute lookups and nothing is kept."""
+
+    def __init__(self, script):
+        super().__init__(script)
+
+    @contextmanager
+    def stage(self, name, **counts):
+        yield dict(counts)
+
+def get_tracer(script):
+    """
+    Returns the tracer for a script, configured from ANALYSIS_TRACE / ANALYSIS_PROFILE.
+
+    The trace is written when the interpreter exits, so scripts that stop
+    early with exit() still leave a trace of the stages they ran.
+    """
+    setting = os.environ.get(TRACE_ENV)
+    if not setting or setting == '0':
+        return NullTracer(script)
+    if setting == '1':
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        setting = os.path.join(DEFAULT_TRACE_DIR, f"{os.path.splitext(script)[0]}-{stamp}.json")
+    tracer = Tracer(script, setting, os.environ.get(PROFILE_ENV) or None)
+    atexit.register(tracer.finish)
+    return tracer
+
+# --- Reading Traces ---
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def format_mb(value):
+    return f"{value:9.1f}" if value is not None else f"{'n/a':>9}"
+
+def show_trace(trace):
+    """Prints a trace as an indented table of stages."""
+    print(f"{trace['script']}  started {trace['started']}  total {trace['total_seconds']:.3f}s  "
+          f"peak RSS {format_mb(trace['peak_rss_mb']).strip()} MB")
+    print(f"  {'stage':<32} {'seconds':>9} {'share':>6} {'RSS MB':>9} {'peak MB':>9}  counts")
+    for record in trace['stages']:
+        depth = record['path'].count('/')
+        name = '  ' * depth + record['path'].split('/')[-1]
+        share = record['seconds'] / trace['total_seconds'] if trace['total_seconds'] else 0
+        counts = ', '.join(f"{key}={value}" for key, value in record['counts'].items())
+        print(f"  {name:<32} {record['seconds']:>9.3f} {share:>6.1%} {format_mb(record['rss_after_mb'])} "
+              f"{format_mb(record['peak_rss_mb'])}  {counts}")
+
+def diff_traces(old, new):
+    """
+    Compares two traces stage by stage.
+
+    Returns:
+        list: (path, old seconds, new seconds) for every stage in either trace,
+            with None for a stage missing from one side.
+    """
+    def seconds_by_path(trace):
+        totals = collections.defaultdict(float)
+        for record in trace['stages']:
+            totals[record['path']] += record['seconds']
+        return totals
+
+    old_seconds, new_seconds = seconds_by_path(old), seconds_by_path(new)
+    paths = list(dict.fromkeys(list(old_seconds) + list(new_seconds)))
+    return [(path, old_seconds.get(path), new_seconds.get(path)) for path in paths]
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect and compare analysis traces.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show_parser = subparsers.add_parser('show', help="Print a trace.")
+    show_parser.add_argument('trace')
+    diff_parser = subparsers.add_parser('diff', help="Compare stage timings of two traces.")
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        show_trace(load_trace(args.trace))
+    else:
+        old, new = load_trace(args.old), load_trace(args.new)
+        print(f"  {'stage':<32} {'old s':>9} {'new s':>9} {'change':>8}")
+        for path, old_s, new_s in diff_traces(old, new) + [('(total)', old['total_seconds'], new['total_seconds'])]:
+            change = f"{(new_s - old_s) / old_s:+8.1%}" if old_s and new_s is not None else f"{'':>8}"
+            old_text = f"{old_s:9.3f}" if old_s is not None else f"{'-':>9}"
+            new_text = f"{new_s:9.3f}" if new_s is not None else f"{'-':>9}"
+            print(f"  {path:<32} {old_text} {new_text} {change}")
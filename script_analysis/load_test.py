@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+
+import numpy as np
+
+from scoring_service import DEFAULT_HOST, DEFAULT_PORT
+
+# --- Configuration ---
+DEFAULT_CONCURRENCY = 16
+DEFAULT_DURATION = 10.0 # Seconds
+# Used when there is no dialogue store to sample lines from
+FALLBACK_TEXTS = [
+    "I don't remember asking you a goddamn thing.",
+    "Funny how? What's funny about it?",
+    "Well, if you like hamburgers give 'em a try sometime.",
+    "As far back as I can remember, I always wanted to be a gangster.",
+    "Okay. It's a beautiful day.",
+    "Zed's dead, baby. Zed's dead.",
+]
+
+# --- HTTP Client ---
+
+async def request(reader, writer, method, path, payload=None, host=DEFAULT_HOST):
+    """Sends one keep-alive HTTP/1.1 request and returns (status, decoded JSON body)."""
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    data = await reader.readexactly(length) if length else b''
+    return status, json.loads(data) if data else None
+
+async def fetch(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return await request(reader, writer, 'GET', path, host=host)
+    finally:
+        writer.close()
+
+# --- Load Generators ---
+
+def make_payload(texts, texts_per_request, emotion):
+    return {'texts': random.sample(texts, min(texts_per_request, len(texts))), 'emotion': emotion}
+
+async def closed_loop_client(host, port, texts, deadline, texts_per_request, emotion, results):
+    """One connection sending requests back to back until the deadline."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, 'POST', '/score',
+                                      make_payload(texts, texts_per_request, emotion), host)
+            results.append((status, time.perf_counter() - start))
+    finally:
+        writer.close()
+
+async def open_loop_request(host, port, payload, results):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            status, _ = await request(reader, writer, 'POST', '/score', payload, host)
+        finally:
+            writer.close()
+    except OSError:
+        status = 'connect_error'
+    results.append((status, time.perf_counter() - start))
+
+async def run_load(host, port, texts, concurrency, duration, texts_per_request, emotion, rate=None):
+    """
+    Drives the service and returns the (status, seconds) of every request.
+
+    Closed loop (default): `concurrency` keep-alive clients, each sending its
+    next request when the previous one returns. Open loop (`rate`): requests
+    start on a fixed schedule regardless of how fast the service answers,
+    which is what exposes queueing and backpressure.
+    """
+    results = []
+    start = time.perf_counter()
+    if rate is None:
+        await asyncio.gather(*(closed_loop_client(host, port, texts, start + duration, texts_per_request,
+                                                  emotion, results) for _ in range(concurrency)))
+    else:
+        tasks = []
+        for i in range(int(duration * rate)):
+            await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+            tasks.append(asyncio.create_task(
+                open_loop_request(host, port, make_payload(texts, texts_per_request, emotion), results)))
+        await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+# --- Reporting ---
+
+def report(results, elapsed, texts_per_request, server_metrics):
+    statuses = collections.Counter(status for status, _ in results)
+    ok = np.array([seconds for status, seconds in results if status == 200]) * 1000
+    print(f"\n{len(results)} requests in {elapsed:.2f}s: {len(results) / elapsed:.1f} req/s, "
+          f"{len(ok) * texts_per_request / elapsed:.1f} texts/s scored")
+    print(f"  status: {', '.join(f'{status}={n}' for status, n in sorted(statuses.items(), key=str))}")
+    if len(ok):
+        print(f"  client latency (ms): p50 {np.percentile(ok, 50):.1f}  p90 {np.percentile(ok, 90):.1f}  "
+              f"p99 {np.percentile(ok, 99):.1f}  max {ok.max():.1f}")
+    if server_metrics:
+        for name in ('request_latency', 'queue_wait', 'batch_latency'):
+            histogram = server_metrics[name]
+            if histogram['count']:
+                print(f"  server {name.replace('_', ' ')} (ms): p50 {histogram['p50_ms']:.1f}  "
+                      f"p90 {histogram['p90_ms']:.1f}  p99 {histogram['p99_ms']:.1f}  (n={histogram['count']})")
+        sizes = {int(size): n for size, n in server_metrics['batch_sizes'].items()}
+        if sizes:
+            batches = sum(sizes.values())
+            mean = sum(size * n for size, n in sizes.items()) / batches
+            print(f"  server batches: {batches}, mean size {mean:.1f}, largest {max(sizes)}; "
+                  f"rejected (503) since start: {server_metrics['rejected']}")
+
+def load_texts(store_dir):
+    try:
+        from dialogue_store import read_columns
+        texts = read_columns(['dialogue'], store_dir)['dialogue'].tolist()
+        return texts or FALLBACK_TEXTS
+    except (FileNotFoundError, KeyError, ValueError):
+        return FALLBACK_TEXTS
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test a local scoring_service.py instance.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Closed-loop clients.")
+    parser.add_argument('--rate', type=float, help="Open loop: requests per second instead of --concurrency clients.")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="Seconds of load.")
+    parser.add_argument('--texts-per-request', type=int, default=1)
+    parser.add_argument('--no-emotion', action='store_true', help="Ask for VADER scores only.")
+    parser.add_argument('--store', default='dialogue_store', help="Dialogue store to sample lines from.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    texts = load_texts(args.store)
+
+    async def main():
+        status, health = await fetch(args.host, args.port, '/health')
+        print(f"Service: {health}")
+        before = (await fetch(args.host, args.port, '/metrics'))[1]
+        mode = f"open loop at {args.rate:g} req/s" if args.rate else f"{args.concurrency} clients"
+        print(f"Load: {mode} for {args.duration:g}s, {args.texts_per_request} texts per request, "
+              f"{len(texts)} distinct lines")
+        results, elapsed = await run_load(args.host, args.port, texts, args.concurrency, args.duration,
+                                          args.texts_per_request, not args.no_emotion, args.rate)
+        after = (await fetch(args.host, args.port, '/metrics'))[1]
+        # Batch sizes seen during this run only
+        after['batch_sizes'] = {size: n - before['batch_sizes'].get(size, 0)
+                                for size, n in after['batch_sizes'].items()
+                                if n - before['batch_sizes'].get(size, 0)}
+        report(results, elapsed, args.texts_per_request, after)
+
+    asyncio.run(main())
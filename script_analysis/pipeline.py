@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import time
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+
+from corpus_runner import resolve_manifest
+from dedup import DEDUP_MODES, DEFAULT_DEDUP_MODE, DedupReport, score_unique
+from dialogue_store import DEFAULT_STORE_DIR, EMOTION_GROUP, SPANS_GROUP, TEXT_GROUP, VADER_GROUP, new_dataset_writers
+from emotion_inference import BACKENDS, DEFAULT_MAX_LENGTH, format_length_report, length_options_key
+from score_cache import DEFAULT_CACHE_PATH, ScoreCache
+from script_index import SPAN_COLUMNS, iter_script_spans
+from vader_batch import VADER_FIELDS, BatchVaderScorer
+
+# --- Configuration ---
+DEFAULT_CHUNK_SIZE = 512             # Dialogues held in memory per chunk
+AGGREGATES_FILENAME = 'aggregates.json'
+RUNNING_STATS_FILENAME = 'running_stats.json' # Raw count/sum/sum of squares, for merging runs
+TEXT_COLUMNS = ['film', 'character', 'dialogue', 'cleaned_dialogue']
+VADER_COLUMNS = ['sentiment_score', 'vader_neg', 'vader_neu', 'vader_pos']
+
+class PipelineError(Exception):
+    """Raised when the pipeline cannot produce any output."""
+
+# --- Pipeline Stages ---
+# Each stage is a generator that takes and yields DataFrame chunks, so only one
+# chunk of dialogue is in memory at a time regardless of corpus size.
+
+def parse_stage(manifest):
+    """Streams cleaned dialogue records, with their script positions, from every screenplay in the manifest."""
+    for job in manifest:
+        chars = set(job['characters']) if job['characters'] is not None else None
+        try:
+            for record in iter_script_spans(job['path'], job['film'], chars):
+                if record['cleaned_dialogue']:
+                    yield record
+        except OSError as e:
+            # One unreadable script should not abort the whole run
+            print(f"Skipping {job['film']}: {e}")
+
+def chunk_stage(records, chunk_size):
+    """Groups records into DataFrames of at most `chunk_size` rows."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            yield pd.DataFrame(batch, columns=TEXT_COLUMNS + SPAN_COLUMNS)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=TEXT_COLUMNS + SPAN_COLUMNS)
+
+def vader_stage(chunks, scorer, cache=None, dedup=DEFAULT_DEDUP_MODE, report=None):
+    """
+    Adds the VADER compound score and neg/neu/pos proportions to each chunk.
+
+    Repeated lines within a chunk are scored once (see dedup.score_unique);
+    `report` counts rows and unique texts.
+    """
+    model_key = f"vaderSentiment-{version('vaderSentiment')}:{','.join(VADER_FIELDS)}"
+
+    def score_batch(texts):
+        scores = scorer.score(texts)
+        return np.column_stack([scores[field] for field in VADER_FIELDS])
+
+    for chunk in chunks:
+        texts = chunk['cleaned_dialogue'].tolist()
+        score_fn = (lambda texts: cache.score(model_key, texts, score_batch)) if cache else score_batch
+        scores = score_unique(texts, score_fn, dedup, report)
+        for column, field in zip(VADER_COLUMNS, ('compound', 'neg', 'neu', 'pos')):
+            chunk[column] = scores[:, VADER_FIELDS.index(field)]
+        yield chunk
+
+def emotion_stage(chunks, model, tokenizer, emotion_columns, model_key, device,
+                  batch_size, cache=None, forward=None, max_length=DEFAULT_MAX_LENGTH,
+                  chunk_long=False, report=None, dedup=DEFAULT_DEDUP_MODE):
+    """
+    Adds one float32 column per emotion to each chunk (`report` counts texts over the token limit).
+
+    Repeated lines within a chunk are classified once (see dedup.score_unique).
+    """
+    from emotion_inference import classify_batched
+
+    def score_batch(texts):
+        return classify_batched(texts, model, tokenizer, emotion_columns,
+                                batch_size=batch_size, max_length=max_length, device=device,
+                                forward=forward, chunk_long=chunk_long, report=report)
+
+    for chunk in chunks:
+        texts = chunk['cleaned_dialogue'].tolist()
+        score_fn = (lambda texts: cache.score(model_key, texts, score_batch)) if cache else score_batch
+        scores = score_unique(texts, score_fn, dedup)
+        for j, column in enumerate(emotion_columns):
+            chunk[column] = np.asarray(scores[:, j], dtype=np.float32)
+        yield chunk
+
+class RunningStats:
+    """
+    Mergeable per-(film, character) count, sum and sum of squares for score columns.
+
+    Means and standard deviations can be derived at any point without keeping
+    the rows, so aggregation also runs in constant memory.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.groups = {}
+
+    def update(self, chunk):
+        """Folds one chunk of rows into the running totals."""
+        values = chunk[self.columns].to_numpy(dtype=np.float64)
+        keys = list(zip(chunk['film'], chunk['character']))
+        codes, uniques = pd.factorize(pd.Series(keys, dtype=object))
+        for code, key in enumerate(uniques):
+            rows = values[codes == code]
+            count, total, total_sq = self.groups.get(key, (0, 0.0, 0.0))
+            self.groups[key] = (count + len(rows),
+                                total + rows.sum(axis=0),
+                                total_sq + (rows ** 2).sum(axis=0))
+
+    def merge(self, other):
+        """Adds another RunningStats over the same columns into this one."""
+        if other.columns != self.columns:
+            raise ValueError(f"Cannot merge stats over {other.columns} into stats over {self.columns}.")
+        for key, (count, total, total_sq) in other.groups.items():
+            if key in self.groups:
+                old_count, old_total, old_total_sq = self.groups[key]
+                self.groups[key] = (old_count + count, old_total + total, old_total_sq + total_sq)
+            else:
+                self.groups[key] = (count, total.copy(), total_sq.copy())
+        return self
+
+    def to_state(self):
+        """Returns the raw totals as JSON-serializable data (floats round-trip exactly)."""
+        return {'columns': self.columns,
+                'groups': [{'film': film, 'character': character, 'count': count,
+                            'sum': total.tolist(), 'sumsq': total_sq.tolist()}
+                           for (film, character), (count, total, total_sq) in self.groups.items()]}
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuilds a RunningStats from `to_state` output."""
+        stats = cls(state['columns'])
+        for group in state['groups']:
+            stats.groups[(group['film'], group['character'])] = (
+                group['count'], np.array(group['sum'], dtype=np.float64), np.array(group['sumsq'], dtype=np.float64))
+        return stats
+
+    def to_frame(self):
+        """Returns mean, std and count per (film, character) and column."""
+        records = []
+        for (film, character), (count, total, total_sq) in sorted(self.groups.items()):
+            mean = total / count
+            var = (total_sq - count * mean ** 2) / (count - 1) if count > 1 else np.full_like(mean, np.nan)
+            std = np.sqrt(np.maximum(var, 0))
+            for j, column in enumerate(self.columns):
+                records.append({'film': film, 'character': character, 'column': column,
+                                'mean': mean[j], 'std': std[j], 'count': count})
+        return pd.DataFrame(records)
+
+def aggregate_stage(chunks, stats):
+    """Updates the running statistics with each chunk and passes it through."""
+    for chunk in chunks:
+        stats.update(chunk)
+        yield chunk
+
+# --- Pipeline Driver ---
+
+def load_emotion_components(backend='torch', num_threads=None, max_length=DEFAULT_MAX_LENGTH, chunk_long=False):
+    """
+    Loads the emotion model once, for one or more pipeline runs.
+
+    Returns:
+        dict: model, tokenizer, emotion_columns, device, model_key, forward,
+            the long-text settings max_length and chunk_long, and a 'report'
+            dict counting texts over the token limit across runs.
+    """
+    from emotion_inference import EMOTION_MODEL_NAME, emotion_model_key, load_emotion_model
+
+    model, tokenizer, emotion_columns, device = load_emotion_model()
+    model_key = emotion_model_key(EMOTION_MODEL_NAME, model, emotion_columns)
+    forward = None
+    if backend != 'torch':
+        from emotion_backends import load_backend
+        forward = load_backend(backend, model, tokenizer, num_threads=num_threads)
+        model_key += f"|{backend}"
+    model_key += length_options_key(max_length, chunk_long)
+    return {'model': model, 'tokenizer': tokenizer, 'emotion_columns': emotion_columns,
+            'device': device, 'model_key': model_key, 'forward': forward,
+            'max_length': max_length, 'chunk_long': chunk_long, 'report': {}}
+
+def run_pipeline(manifest, store_dir=DEFAULT_STORE_DIR, chunk_size=DEFAULT_CHUNK_SIZE,
+                 with_emotion=True, batch_size=32, cache_path=DEFAULT_CACHE_PATH,
+                 backend='torch', num_threads=None, emotion=None, max_length=DEFAULT_MAX_LENGTH,
+                 chunk_long=False, dedup=DEFAULT_DEDUP_MODE):
+    """
+    Runs parse -> clean -> VADER -> emotion -> aggregation over a corpus in chunks.
+
+    Every chunk is appended to the dialogue store as soon as it is scored, so
+    memory use is bounded by `chunk_size` rather than by the corpus size.
+
+    Args:
+        manifest (list): Dictionaries with 'film', 'path' and 'characters' keys.
+        store_dir (str): Output dialogue store directory.
+        chunk_size (int): Dialogues per chunk.
+        with_emotion (bool): Run the distilroberta emotion stage.
+        batch_size (int): Dialogues per emotion model forward pass.
+        cache_path (str): Score cache path, or None to disable caching.
+        backend (str): Emotion model backend (see emotion_backends.BACKENDS).
+        num_threads (int): Intra-op threads for non-default CPU backends.
+        emotion (dict): Preloaded `load_emotion_components` output, to share
+            one model between several runs.
+        max_length (int): Token limit per emotion forward pass.
+        chunk_long (bool): Score texts over `max_length` as overlapping
+            windows instead of truncating them.
+        dedup (str): How repeated lines are grouped so each group is scored
+            once (see dedup.DEDUP_MODES).
+
+    Returns:
+        pd.DataFrame: Per-(film, character) mean/std/count for every score column.
+
+    Raises:
+        PipelineError: If no dialogue was extracted from the corpus.
+    """
+    cache = ScoreCache(cache_path) if cache_path else None
+    score_columns = list(VADER_COLUMNS)
+    groups = [TEXT_GROUP, SPANS_GROUP, VADER_GROUP]
+
+    chunks = chunk_stage(parse_stage(manifest), chunk_size)
+    dedup_report = DedupReport() # Both scoring stages see the same texts, so VADER's counts stand for both
+    chunks = vader_stage(chunks, BatchVaderScorer(), cache, dedup, dedup_report)
+    if with_emotion:
+        owns_emotion = emotion is None # A shared model's report is printed by whoever loaded it
+        emotion = emotion or load_emotion_components(backend, num_threads, max_length, chunk_long)
+        emotion_columns = emotion['emotion_columns']
+        chunks = emotion_stage(chunks, emotion['model'], emotion['tokenizer'], emotion_columns,
+                               emotion['model_key'], emotion['device'], batch_size, cache, emotion['forward'],
+                               emotion['max_length'], emotion['chunk_long'], emotion['report'], dedup)
+        score_columns += emotion_columns
+        groups.append(EMOTION_GROUP)
+
+    stats = RunningStats(score_columns)
+    chunks = aggregate_stage(chunks, stats)
+
+    writers = new_dataset_writers(groups, store_dir)
+    group_columns = {TEXT_GROUP: TEXT_COLUMNS, SPANS_GROUP: SPAN_COLUMNS, VADER_GROUP: VADER_COLUMNS}
+    if with_emotion:
+        group_columns[EMOTION_GROUP] = emotion_columns
+    rows = 0
+    try:
+        for n, chunk in enumerate(chunks, 1):
+            for writer in writers:
+                writer.write(chunk[group_columns[writer.group]])
+            rows += len(chunk)
+            print(f"  chunk {n}: {rows} dialogues written")
+        if rows == 0:
+            raise PipelineError("No data extracted. Please check script paths and format.")
+        for writer in writers:
+            writer.close()
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    finally:
+        if cache:
+            cache.close()
+
+    write_aggregates(stats, store_dir)
+    print(f"  dedup ({dedup}): {dedup_report}")
+    if with_emotion and owns_emotion and emotion['report']:
+        # Only texts scored in this run (cache misses) are counted
+        print(f"  emotion: {format_length_report(emotion['report'], emotion['max_length'], emotion['chunk_long'])}")
+    return stats.to_frame()
+
+def write_aggregates(stats, store_dir=DEFAULT_STORE_DIR):
+    """Writes the summary (aggregates.json) and the mergeable raw totals (running_stats.json)."""
+    with open(os.path.join(store_dir, AGGREGATES_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(stats.to_frame().to_dict(orient='records'), f, indent=1)
+    with open(os.path.join(store_dir, RUNNING_STATS_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(stats.to_state(), f)
+
+def read_running_stats(store_dir=DEFAULT_STORE_DIR):
+    """Loads the raw totals a pipeline run left in a store."""
+    with open(os.path.join(store_dir, RUNNING_STATS_FILENAME), 'r', encoding='utf-8') as f:
+        return RunningStats.from_state(json.load(f))
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Run the whole analysis (parse, clean, VADER, emotion, aggregate) in bounded memory.")
+    parser.add_argument('source', nargs='?',
+                        help="A directory of .txt screenplays or a JSON manifest "
+                             "(defaults to the two films in prepare_data.py).")
+    parser.add_argument('--characters', help="JSON file mapping film name to target characters (directory mode).")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Output dialogue store directory.")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Dialogues per chunk.")
+    parser.add_argument('--batch-size', type=int, default=32, help="Dialogues per emotion model forward pass.")
+    parser.add_argument('--no-emotion', action='store_true', help="Skip the emotion model stage.")
+    parser.add_argument('--backend', default='torch', choices=BACKENDS,
+                        help="Emotion model backend: torch, int8, onnx or onnx-int8.")
+    parser.add_argument('--threads', type=int, help="Intra-op threads for the int8/onnx backends.")
+    parser.add_argument('--max-length', type=int, default=DEFAULT_MAX_LENGTH,
+                        help="Token limit per emotion forward pass; lower it for throughput.")
+    parser.add_argument('--chunk-long', action='store_true',
+                        help="Score dialogue over --max-length as overlapping windows instead of truncating it.")
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the score cache.")
+    parser.add_argument('--dedup', choices=DEDUP_MODES, default=DEFAULT_DEDUP_MODE,
+                        help="Score repeated lines once: identical text, normalized text (case, "
+                             "whitespace, U+FFFD) or MinHash near-duplicates.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Keep one partition per film and only redo films whose script, "
+                             "characters or settings changed.")
+    parser.add_argument('--force', action='store_true', help="With --incremental, rebuild every film.")
+    args = parser.parse_args()
+
+    manifest = resolve_manifest(args.source, args.characters)
+
+    print(f"Running pipeline over {len(manifest)} screenplays (chunks of {args.chunk_size})...")
+    start = time.perf_counter()
+    options = dict(store_dir=args.store, chunk_size=args.chunk_size,
+                   with_emotion=not args.no_emotion, batch_size=args.batch_size,
+                   cache_path=None if args.no_cache else DEFAULT_CACHE_PATH,
+                   backend=args.backend, num_threads=args.threads,
+                   max_length=args.max_length, chunk_long=args.chunk_long, dedup=args.dedup)
+    try:
+        if args.incremental:
+            from incremental import run_incremental
+            summary, plan = run_incremental(manifest, force=args.force, **options)
+            for entry in plan:
+                print(f"  {entry['job']['film']}: {entry['status']}")
+        else:
+            summary = run_pipeline(manifest, **options)
+    except PipelineError as e:
+        raise SystemExit(f"Error: {e}")
+    print(f"\nPipeline finished in {time.perf_counter() - start:.2f}s.")
+
+    print("\nMean sentiment per character:")
+    print(summary[summary['column'] == 'sentiment_score'].set_index(['film', 'character'])[['mean', 'std', 'count']])
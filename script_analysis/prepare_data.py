@@ -1,6 +1,8 @@
 import pandas as pd
 import re
 import os # To check if files exist
+from dialogue_store import SPANS_GROUP, TEXT_GROUP, write_group
+from instrumentation import get_tracer
 
 # --- Configuration ---
 PULP_FICTION_SCRIPT_PATH = 'pulpfiction.txt'
@@ -16,6 +18,9 @@ MIN_CHAR_NAME_LEADING_SPACES = 30 # How much space indicates a centered characte
 MIN_DIALOGUE_LEADING_SPACES = 20   # How much space indicates an indented dialogue line
 MAX_CHAR_NAME_LENGTH = 30         # Avoid grabbing long uppercase headings
 
+EXPORT_CSV = False # Also write cleaned_dialogues.csv (the dialogue store is the main output)
+USE_SCRIPT_INDEX = True # Read scripts through mmap (script_index.py) and store where each dialogue is
+
 # --- Helper Functions ---
 
 def clean_dialogue(text):
@@ -35,7 +40,8 @@ def parse_script(filepath, film_name, target_chars):
     Args:
         filepath (str): Path to the script text file.
         film_name (str): Name of the film.
-        target_chars (set): A set of uppercase character names to extract.
+        target_chars (set or None): A set of uppercase character names to extract,
+            or None to extract every character.
 
     Returns:
         list: A list of dictionaries, each containing 'film', 'character', 'dialogue'.
@@ -72,7 +78,7 @@ def parse_script(filepath, film_name, target_chars):
             # Clean up potential additions like (O.S.), (V.O.), (CONT'D)
             potential_char_name = re.sub(r'\s*\(.*\)\s*$', '', line_stripped).strip()
 
-            if potential_char_name in target_chars:
+            if target_chars is None or potential_char_name in target_chars:
                 current_character = potential_char_name
                 dialogue_lines = []
                 # Look ahead for dialogue lines
@@ -114,56 +120,105 @@ def parse_script(filepath, film_name, target_chars):
     print(f"Parsed {film_name}: Found {len(extracted_data)} dialogues for target characters.")
     return extracted_data
 
+def parse_script_spans(filepath, film_name, target_chars):
+    """
+    Same rows as parse_script, read through script_index.read_script_spans, plus
+    byte offset, line number and scene heading per dialogue (see SPAN_COLUMNS there).
+    """
+    from script_index import read_script_spans # script_index imports this module
+
+    if not os.path.exists(filepath):
+        print(f"Error: Script file not found at {filepath}")
+        return []
+    records = read_script_spans(filepath, film_name, target_chars)
+    print(f"Parsed {film_name}: Found {len(records)} dialogues for target characters.")
+    return records
+
+def to_cleaned_dataframe(records):
+    """
+    Builds the cleaned dialogue DataFrame from parsed script records.
+
+    Args:
+        records (list): Dictionaries with 'film', 'character', 'dialogue' keys.
+
+    Returns:
+        pd.DataFrame: The records plus a 'cleaned_dialogue' column, with rows
+            whose cleaned dialogue is empty removed.
+    """
+    df = pd.DataFrame(records, columns=['film', 'character', 'dialogue'])
+    df['cleaned_dialogue'] = df['dialogue'].apply(clean_dialogue)
+    # Remove entries where cleaning resulted in empty dialogue
+    df = df[df['cleaned_dialogue'] != '']
+    df.reset_index(drop=True, inplace=True)
+    return df
+
 # --- Main Execution ---
 
-all_dialogue_data = []
-
-# Process Pulp Fiction
-print("Processing Pulp Fiction...")
-pf_data = parse_script(
-    PULP_FICTION_SCRIPT_PATH,
-    'Pulp Fiction',
-    TARGET_CHARACTERS['Pulp Fiction']
-)
-all_dialogue_data.extend(pf_data)
-
-# Process Goodfellas
-print("\nProcessing Goodfellas...")
-gf_data = parse_script(
-    GOODFELLAS_SCRIPT_PATH,
-    'Goodfellas',
-    TARGET_CHARACTERS['Goodfellas']
-)
-all_dialogue_data.extend(gf_data)
-
-# Create Pandas DataFrame
-print(f"\nCreating DataFrame with {len(all_dialogue_data)} total entries...")
-if not all_dialogue_data:
-    print("No data extracted. Please check script paths and format.")
-    # Exit or handle error appropriately
-    exit()
-
-df = pd.DataFrame(all_dialogue_data)
-
-# Clean the dialogue column
-print("Cleaning dialogue text...")
-df['cleaned_dialogue'] = df['dialogue'].apply(clean_dialogue)
-
-# Remove entries where cleaning resulted in empty dialogue
-df = df[df['cleaned_dialogue'] != '']
-df.reset_index(drop=True, inplace=True)
-
-
-# Display results
-print(f"\nCreated DataFrame with {len(df)} cleaned dialogue entries.")
-print("\nDataFrame Info:")
-df.info()
-
-print("\nFirst 5 rows of the DataFrame:")
-print(df.head())
-
-print("\nDialogue counts per character:")
-print(df.groupby(['film', 'character']).size())
-
-df.to_csv('cleaned_dialogues.csv', index=False)
-# print("\nDataFrame saved to cleaned_dialogues.csv")
\ No newline at end of file
+if __name__ == '__main__':
+    tracer = get_tracer('prepare_data.py') # Set ANALYSIS_TRACE=1 to record stage timings
+    all_dialogue_data = []
+
+    read_script = parse_script_spans if USE_SCRIPT_INDEX else parse_script
+    if USE_SCRIPT_INDEX:
+        from script_index import SPAN_COLUMNS, spans_frame
+
+    with tracer.stage('parse', files=2) as stage:
+        # Process Pulp Fiction
+        print("Processing Pulp Fiction...")
+        pf_data = read_script(
+            PULP_FICTION_SCRIPT_PATH,
+            'Pulp Fiction',
+            TARGET_CHARACTERS['Pulp Fiction']
+        )
+        all_dialogue_data.extend(pf_data)
+
+        # Process Goodfellas
+        print("\nProcessing Goodfellas...")
+        gf_data = read_script(
+            GOODFELLAS_SCRIPT_PATH,
+            'Goodfellas',
+            TARGET_CHARACTERS['Goodfellas']
+        )
+        all_dialogue_data.extend(gf_data)
+        stage['rows'] = len(all_dialogue_data)
+        stage['bytes'] = sum(os.path.getsize(path) for path in (PULP_FICTION_SCRIPT_PATH, GOODFELLAS_SCRIPT_PATH)
+                             if os.path.exists(path))
+
+    # Create Pandas DataFrame
+    print(f"\nCreating DataFrame with {len(all_dialogue_data)} total entries...")
+    if not all_dialogue_data:
+        print("No data extracted. Please check script paths and format.")
+        # Exit or handle error appropriately
+        exit()
+
+    # Clean the dialogue column
+    print("Cleaning dialogue text...")
+    with tracer.stage('clean', rows=len(all_dialogue_data)) as stage:
+        if USE_SCRIPT_INDEX:
+            # Dialogue was cleaned while reading; split the positions off into their own group
+            df = spans_frame(all_dialogue_data)
+            spans_df = df[SPAN_COLUMNS]
+            df = df.drop(columns=SPAN_COLUMNS)
+        else:
+            df = to_cleaned_dataframe(all_dialogue_data)
+        stage['rows_kept'] = len(df)
+
+
+    # Display results
+    print(f"\nCreated DataFrame with {len(df)} cleaned dialogue entries.")
+    print("\nDataFrame Info:")
+    df.info()
+
+    print("\nFirst 5 rows of the DataFrame:")
+    print(df.head())
+
+    print("\nDialogue counts per character:")
+    print(df.groupby(['film', 'character']).size())
+
+    with tracer.stage('write', rows=len(df)):
+        write_group(df, TEXT_GROUP)
+        if USE_SCRIPT_INDEX:
+            write_group(spans_df, SPANS_GROUP)
+        if EXPORT_CSV:
+            df.to_csv('cleaned_dialogues.csv', index=False)
+            # print("\nDataFrame saved to cleaned_dialogues.csv")
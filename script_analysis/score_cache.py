@@ -0,0 +1,144 @@
+import hashlib
+import sqlite3
+import time
+
+import numpy as np
+
+# --- Configuration ---
+DEFAULT_CACHE_PATH = 'score_cache.sqlite'
+DEFAULT_MAX_ENTRIES = 1_000_000 # Least recently used entries are evicted past this size
+SQL_CHUNK_SIZE = 500             # Stay well under SQLite's bound-parameter limit
+DEFAULT_TIMEOUT = 60.0           # Seconds to wait for another process's write lock (e.g. bert-analysis.py --workers)
+
+# --- Helper Functions ---
+
+def cache_key(model_key, text):
+    """Returns the content hash used to look up a text's scores for a given model."""
+    digest = hashlib.sha256()
+    digest.update(model_key.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+# --- Score Cache ---
+
+class ScoreCache:
+    """
+    Persistent SQLite cache of per-text model scores.
+
+    Entries are keyed on a hash of the text plus a model key (model name,
+    version and output fields), so changing any of those invalidates the old
+    scores instead of silently reusing them. Scores are stored as float64
+    vectors so cached values are bit-identical to freshly computed ones.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        # Write-ahead logging lets readers carry on while another process writes, and
+        # writers queue on the lock for `timeout` instead of failing with 'database is locked'
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " scores BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, keys):
+        """Returns a dict mapping each cached key to its score vector."""
+        found = {}
+        keys = list(keys)
+        now = time.time()
+        for start in range(0, len(keys), SQL_CHUNK_SIZE):
+            chunk = keys[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, scores FROM scores WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float64)
+            self.conn.execute(
+                f"UPDATE scores SET last_used = ? WHERE key IN ({placeholders})", [now] + chunk
+            )
+        self.conn.commit()
+        return found
+
+    def put_many(self, model_key, entries):
+        """Stores (key, score vector) pairs and evicts old entries if over capacity."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO scores (key, model, scores, last_used) VALUES (?, ?, ?, ?)",
+            [(key, model_key, np.asarray(scores, dtype=np.float64).tobytes(), now)
+             for key, scores in entries]
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drops the least recently used entries beyond `max_entries`."""
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM scores WHERE key IN"
+                " (SELECT key FROM scores ORDER BY last_used ASC LIMIT ?)", (excess,)
+            )
+            self.conn.commit()
+
+    def score(self, model_key, texts, score_fn):
+        """
+        Scores texts, only calling the model for texts missing from the cache.
+
+        Args:
+            model_key (str): Identifies the model, its version and output fields.
+            texts (list): Texts to score, in row order.
+            score_fn (callable): Takes a list of texts and returns an array-like
+                of shape (len(texts), n_scores).
+
+        Returns:
+            np.ndarray: A float64 array of shape (len(texts), n_scores) in row order.
+        """
+        keys = [cache_key(model_key, text) if isinstance(text, str) else None for text in texts]
+        cached = self.get_many({key for key in keys if key is not None})
+
+        # Each distinct missing text is scored once, even if it repeats
+        miss_rows = {}
+        for i, key in enumerate(keys):
+            if key is None or key not in cached:
+                miss_rows.setdefault(key if key is not None else ('row', i), i)
+        self.hits += len(texts) - sum(1 for key in keys if key is None or key not in cached)
+        self.misses += len(miss_rows)
+
+        fresh = {}
+        if miss_rows:
+            miss_keys = list(miss_rows)
+            miss_scores = np.asarray(score_fn([texts[miss_rows[key]] for key in miss_keys]),
+                                     dtype=np.float64)
+            fresh = dict(zip(miss_keys, miss_scores))
+            self.put_many(model_key, [(key, fresh[key]) for key in miss_keys if isinstance(key, str)])
+
+        rows = []
+        for i, key in enumerate(keys):
+            if key is None:
+                rows.append(fresh[('row', i)])
+            elif key in cached:
+                rows.append(cached[key])
+            else:
+                rows.append(fresh[key])
+        return np.vstack(rows) if rows else np.empty((0, 0))
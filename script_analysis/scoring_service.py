@@ -0,0 +1,400 @@
+import argparse
+import asyncio
+import bisect
+import collections
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from aggregate_cube import SENTIMENT_CATEGORIES, sentiment_category_codes
+from emotion_inference import BACKENDS, DEFAULT_BATCH_SIZE, DEFAULT_MAX_LENGTH
+from screenplay_tokenizer import clean_dialogue
+from scoring_worker import DEFAULT_ARTIFACT_DIR, EmotionScorer
+from vader_batch import VADER_FIELDS, BatchVaderScorer
+
+# --- Configuration ---
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BATCH_WAIT_MS = 5           # How long the first queued text waits for others to share its forward pass
+DEFAULT_QUEUE_SIZE = 1024       # Texts waiting for the emotion model; beyond this requests get 503
+MAX_TEXTS_PER_REQUEST = 64
+MAX_BODY_BYTES = 1 << 20
+RETRY_AFTER_SECONDS = 1
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+class Overloaded(Exception):
+    """Raised when the scoring queue has no room for a request's texts."""
+
+class BadRequest(Exception):
+    """Raised for a malformed request; the message is returned to the client."""
+
+# --- Metrics ---
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram (Prometheus-style cumulative buckets, in ms).
+
+    Quantiles are estimated by interpolating inside the bucket that holds
+    them, so recording stays O(log buckets) however long the service runs.
+    """
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = list(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1) # Last bucket: above the largest bound
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.buckets_ms[i - 1] if i > 0 else 0.0
+                high = self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+                return min(low + (high - low) * (rank - seen) / count, self.max_ms)
+            seen += count
+        return self.max_ms
+
+    def to_dict(self):
+        cumulative = np.cumsum(self.counts).tolist()
+        return {'count': self.count,
+                'mean_ms': self.total_ms / self.count if self.count else None,
+                'p50_ms': self.quantile(0.5), 'p90_ms': self.quantile(0.9), 'p99_ms': self.quantile(0.99),
+                'max_ms': self.max_ms,
+                'buckets': {f"le_{bound}": n for bound, n in zip(self.buckets_ms, cumulative)} | {'le_inf': cumulative[-1]}}
+
+class ServiceMetrics:
+    """Counters and latency histograms exposed on GET /metrics."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = collections.Counter() # By HTTP status
+        self.texts = 0
+        self.rejected = 0
+        self.request_latency = LatencyHistogram()
+        self.queue_wait = LatencyHistogram()
+        self.batch_latency = LatencyHistogram()
+        self.batch_sizes = collections.Counter()
+
+    def to_dict(self, queue_depth, queue_size):
+        return {'uptime_s': time.time() - self.started,
+                'requests': {str(status): n for status, n in sorted(self.requests.items())},
+                'texts': self.texts, 'rejected': self.rejected,
+                'queue': {'depth': queue_depth, 'size': queue_size},
+                'request_latency': self.request_latency.to_dict(),
+                'queue_wait': self.queue_wait.to_dict(),
+                'batch_latency': self.batch_latency.to_dict(),
+                'batch_sizes': {str(size): n for size, n in sorted(self.batch_sizes.items())}}
+
+# --- Micro-Batching ---
+
+class MicroBatcher:
+    """
+    Coalesces texts from concurrent requests into shared emotion model forward passes.
+
+    Texts wait in a bounded queue. A batch is closed when it reaches
+    `max_batch_size` texts or when its first text has waited `max_wait`
+    seconds, then scored in a worker thread so the event loop keeps accepting
+    requests. A request whose texts do not fit in the queue is rejected
+    immediately instead of waiting (backpressure).
+    """
+
+    def __init__(self, score_fn, metrics, max_batch_size=DEFAULT_BATCH_SIZE,
+                 max_wait=MAX_BATCH_WAIT_MS / 1000, queue_size=DEFAULT_QUEUE_SIZE):
+        self.score_fn = score_fn
+        self.metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # One model, one thread: forward passes run back to back, never interleaved
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='emotion')
+
+    def submit(self, texts):
+        """
+        Queues texts for scoring.
+
+        Returns:
+            list: One future per text, resolved with its score row.
+
+        Raises:
+            Overloaded: If the queue cannot take all of the texts.
+        """
+        if self.queue.maxsize - self.queue.qsize() < len(texts):
+            raise Overloaded(f"Scoring queue full ({self.queue.qsize()}/{self.queue.maxsize} texts waiting).")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self.queue.put_nowait((text, future, loop.time()))
+            futures.append(future)
+        return futures
+
+    async def next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        """Scores batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            start = loop.time()
+            for _, _, queued in batch:
+                self.metrics.queue_wait.record(start - queued)
+            try:
+                scores = await loop.run_in_executor(self.executor, self.score_fn, [text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.metrics.batch_latency.record(loop.time() - start)
+            self.metrics.batch_sizes[len(batch)] += 1
+            for (_, future, _), row in zip(batch, scores):
+                if not future.done(): # The client may have gone away
+                    future.set_result(row)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# --- Service ---
+
+class ScoringService:
+    """
+    Scores arbitrary lines with VADER and the emotion model over HTTP.
+
+    Endpoints:
+        POST /score    {"texts": [...]} or {"text": "..."}, optional "emotion": false
+        GET  /health   model and queue status
+        GET  /metrics  request/queue/batch latency histograms and batch sizes
+
+    Texts are cleaned like the dataset's 'cleaned_dialogue' column before
+    scoring. VADER runs inline (microseconds per line); emotion scoring goes
+    through the micro-batcher.
+    """
+
+    def __init__(self, scorer=None, batch_size=DEFAULT_BATCH_SIZE, max_wait=MAX_BATCH_WAIT_MS / 1000,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.scorer = scorer
+        self.vader = BatchVaderScorer()
+        self.metrics = ServiceMetrics()
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.batcher = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        if self.scorer is not None:
+            self.batcher = MicroBatcher(self.scorer.score, self.metrics, self.batch_size,
+                                        self.max_wait, self.queue_size)
+            self.batcher_task = asyncio.create_task(self.batcher.run())
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        if self.batcher is not None:
+            self.batcher_task.cancel()
+            self.batcher.close()
+
+    # --- Requests ---
+
+    async def score(self, payload):
+        if not isinstance(payload, dict):
+            raise BadRequest("Expected a JSON object.")
+        texts = payload.get('texts', [payload['text']] if 'text' in payload else None)
+        if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+            raise BadRequest("Provide 'text' (a string) or 'texts' (a non-empty list of strings).")
+        if len(texts) > MAX_TEXTS_PER_REQUEST:
+            raise BadRequest(f"At most {MAX_TEXTS_PER_REQUEST} texts per request.")
+        with_emotion = bool(payload.get('emotion', True)) and self.batcher is not None
+
+        cleaned = [clean_dialogue(text) for text in texts]
+        futures = self.batcher.submit(cleaned) if with_emotion else None
+        vader = self.vader.score(cleaned)
+        categories = sentiment_category_codes(vader['compound'])
+        results = []
+        for i, text in enumerate(texts):
+            result = {'text': text, 'cleaned_dialogue': cleaned[i],
+                      'sentiment_score': float(vader['compound'][i]),
+                      'sentiment_category': SENTIMENT_CATEGORIES[categories[i]]}
+            for field in VADER_FIELDS:
+                if field != 'compound':
+                    result[f'vader_{field}'] = float(vader[field][i])
+            results.append(result)
+        if futures is not None:
+            rows = await asyncio.gather(*futures)
+            for result, row in zip(results, rows):
+                result['emotions'] = {label: float(p) for label, p in zip(self.scorer.columns(), row)}
+        self.metrics.texts += len(texts)
+        return {'results': results}
+
+    async def dispatch(self, method, path, body):
+        """
+        Returns (HTTP status, JSON payload) for one request.
+
+        Unexpected errors (e.g. the emotion model failing on a batch) are
+        logged and answered with a 500, so the client always gets a status.
+        """
+        try:
+            return await self.route(method, path, body)
+        except Exception as e:
+            traceback.print_exc()
+            return 500, {'error': f"Internal error: {type(e).__name__}: {e}"}
+
+    async def route(self, method, path, body):
+        if method == 'OPTIONS':
+            return 204, None
+        if path == '/health' and method == 'GET':
+            return 200, {'status': 'ok', 'emotion': self.batcher is not None,
+                         'model': self.scorer.cache_key() if self.scorer else None,
+                         'queue_depth': self.batcher.queue.qsize() if self.batcher else 0}
+        if path == '/metrics' and method == 'GET':
+            depth = self.batcher.queue.qsize() if self.batcher else 0
+            return 200, self.metrics.to_dict(depth, self.queue_size)
+        if path == '/score' and method == 'POST':
+            try:
+                return 200, await self.score(json.loads(body or b'null'))
+            except json.JSONDecodeError as e:
+                return 400, {'error': f"Invalid JSON: {e}"}
+            except BadRequest as e:
+                return 400, {'error': str(e)}
+            except Overloaded as e:
+                self.metrics.rejected += 1
+                return 503, {'error': str(e)}
+        return 404, {'error': f"No route for {method} {path}"}
+
+    async def handle_connection(self, reader, writer):
+        """Serves HTTP/1.1 requests on one connection (keep-alive) until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    # Malformed request line or Content-Length: answer, then drop the connection
+                    self.metrics.requests[400] += 1
+                    writer.write(http_response(400, {'error': "Malformed request."}, False))
+                    await writer.drain()
+                    break
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                start = time.perf_counter()
+                if length < 0:
+                    status, payload, keep_alive = 400, {'error': "Invalid Content-Length."}, False
+                elif length > MAX_BODY_BYTES:
+                    status, payload, keep_alive = 413, {'error': "Request body too large."}, False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, target.split('?')[0], body)
+                self.metrics.requests[status] += 1
+                if target.startswith('/score'):
+                    self.metrics.request_latency.record(time.perf_counter() - start)
+
+                writer.write(http_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError): # ValueError: line over the stream limit
+            pass
+        finally:
+            writer.close()
+
+REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+def http_response(status, payload, keep_alive):
+    body = b'' if payload is None else json.dumps(payload).encode()
+    headers = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+               "Content-Type: application/json",
+               f"Content-Length: {len(body)}",
+               # The Next.js site calls the service from the browser
+               "Access-Control-Allow-Origin: *",
+               "Access-Control-Allow-Methods: GET, POST, OPTIONS",
+               "Access-Control-Allow-Headers: Content-Type",
+               f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if status == 503:
+        headers.append(f"Retry-After: {RETRY_AFTER_SECONDS}")
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body
+
+async def serve(service, host, port):
+    server = await service.start(host, port)
+    print(f"Scoring service listening on http://{host}:{port} "
+          f"(emotion: {'on' if service.batcher else 'off'}, batch {service.batch_size}, "
+          f"wait {service.max_wait * 1000:.0f} ms, queue {service.queue_size})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local HTTP service scoring dialogue with VADER and the emotion model.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--no-emotion', action='store_true', help="Serve VADER scores only.")
+    parser.add_argument('--artifact', default=DEFAULT_ARTIFACT_DIR, help="Local model artifact directory.")
+    parser.add_argument('--backend', default='torch', choices=BACKENDS,
+                        help="Emotion model backend: torch, int8, onnx or onnx-int8.")
+    parser.add_argument('--threads', type=int, help="Intra-op threads for the int8/onnx backends.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Most texts per forward pass.")
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_BATCH_WAIT_MS,
+                        help="How long a text may wait for others to join its batch.")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Texts allowed to wait for the model before requests are rejected with 503.")
+    parser.add_argument('--max-length', type=int, default=DEFAULT_MAX_LENGTH, help="Token limit per forward pass.")
+    parser.add_argument('--chunk-long', action='store_true',
+                        help="Score texts over --max-length as overlapping windows instead of truncating them.")
+    args = parser.parse_args()
+
+    scorer = None
+    if not args.no_emotion:
+        scorer = EmotionScorer(args.artifact, batch_size=args.batch_size, backend=args.backend,
+                               num_threads=args.threads, max_length=args.max_length, chunk_long=args.chunk_long)
+        print("Loading the emotion model...")
+        scorer.load()
+        scorer.score(["Warming up."]) # The first forward pass is slow; pay for it before serving
+    service = ScoringService(scorer, args.batch_size, args.max_wait_ms / 1000, args.queue_size)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nStopped.")
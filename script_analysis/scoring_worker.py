@@ -0,0 +1,281 @@
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from emotion_inference import (BACKENDS, DEFAULT_BATCH_SIZE, DEFAULT_MAX_LENGTH, EMOTION_MODEL_NAME,
+                               length_options_key)
+
+# torch and transformers are only imported when the first job needs the model,
+# so a worker that only answers cache hits never pays for them.
+
+# --- Configuration ---
+DEFAULT_ARTIFACT_DIR = os.path.join('models', EMOTION_MODEL_NAME.split('/')[-1])
+ARTIFACT_INFO_FILENAME = 'artifact.json'
+STARTUP_PROBE_TEXT = "I'm gonna get medieval on your ass."
+MODEL_LIBRARIES = ('torch', 'transformers.pipelines') # transformers loads its submodules lazily
+
+# --- Model Artifact ---
+
+def import_model_libraries():
+    """Imports torch and the transformers pipeline code; returns the seconds it took."""
+    start = time.perf_counter()
+    for module in MODEL_LIBRARIES:
+        importlib.import_module(module)
+    return time.perf_counter() - start
+
+def export_artifact(artifact_dir=DEFAULT_ARTIFACT_DIR, model_name=EMOTION_MODEL_NAME):
+    """
+    Saves the emotion model and tokenizer as a local artifact.
+
+    Weights are written as safetensors, which transformers memory-maps on load,
+    so later loads skip the Hub lookup and avoid copying the weights. The Hub
+    revision and label order are recorded in artifact.json so score cache keys
+    stay the same whether the model came from the Hub or from the artifact.
+    """
+    import torch
+    from emotion_inference import load_emotion_model
+
+    model, tokenizer, emotion_columns, _ = load_emotion_model(model_name, device=torch.device('cpu'))
+    os.makedirs(artifact_dir, exist_ok=True)
+    model.save_pretrained(artifact_dir, safe_serialization=True)
+    tokenizer.save_pretrained(artifact_dir)
+    info = {'model_name': model_name,
+            'revision': getattr(model.config, '_commit_hash', None) or 'local',
+            'emotion_columns': emotion_columns}
+    with open(os.path.join(artifact_dir, ARTIFACT_INFO_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=1)
+    print(f"Saved model artifact to {artifact_dir}")
+    return info
+
+def read_artifact_info(artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """Returns the artifact's recorded model name, revision and labels, or None if there is no artifact."""
+    path = os.path.join(artifact_dir, ARTIFACT_INFO_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# --- Scoring Worker ---
+
+class EmotionScorer:
+    """
+    Holds one emotion model for the lifetime of a worker process.
+
+    The model is loaded on first use (from the local artifact if one exists,
+    otherwise from the Hub) and then reused for every job, so per-job cost is
+    only tokenization and forward passes.
+    """
+
+    def __init__(self, artifact_dir=DEFAULT_ARTIFACT_DIR, batch_size=DEFAULT_BATCH_SIZE,
+                 backend='torch', num_threads=None, max_length=DEFAULT_MAX_LENGTH, chunk_long=False):
+        self.artifact_dir = artifact_dir
+        self.batch_size = batch_size
+        self.backend = backend
+        self.num_threads = num_threads
+        self.max_length = max_length
+        self.chunk_long = chunk_long
+        self.last_report = {}
+        self.info = read_artifact_info(artifact_dir)
+        self.model = None
+        self.timings = {}
+
+    def load(self):
+        """Imports torch/transformers and loads the model, once; records the time of each in `timings`."""
+        if self.model is not None:
+            return
+        # emotion_inference defers these imports to load_emotion_model; do them here so they are timed apart
+        self.timings['import_s'] = import_model_libraries()
+
+        from emotion_inference import emotion_model_key, load_emotion_model
+
+        start = time.perf_counter()
+        source = self.artifact_dir if self.info else EMOTION_MODEL_NAME
+        self.model, self.tokenizer, self.emotion_columns, self.device = load_emotion_model(source)
+        self.forward = None
+        if self.backend != 'torch':
+            from emotion_backends import load_backend
+            self.forward = load_backend(self.backend, self.model, self.tokenizer, num_threads=self.num_threads,
+                                        revision=self.info['revision'] if self.info else None)
+        self.model_key = emotion_model_key(EMOTION_MODEL_NAME, self.model, self.emotion_columns,
+                                           revision=self.info['revision'] if self.info else None)
+        if self.backend != 'torch':
+            self.model_key += f"|{self.backend}"
+        self.model_key += length_options_key(self.max_length, self.chunk_long)
+        self.timings['load_s'] = time.perf_counter() - start
+
+    def cache_key(self):
+        """Returns the score cache key, loading the model only if no artifact describes it."""
+        if self.model is None and self.info and self.backend == 'torch':
+            return (f"{EMOTION_MODEL_NAME}@{self.info['revision']}:{','.join(self.info['emotion_columns'])}"
+                    + length_options_key(self.max_length, self.chunk_long))
+        self.load()
+        return self.model_key
+
+    def columns(self):
+        """Returns the emotion labels in column order."""
+        if self.model is None and self.info:
+            return self.info['emotion_columns']
+        self.load()
+        return self.emotion_columns
+
+    def score(self, texts):
+        """Scores a list of texts, returning a float32 array in `columns()` order."""
+        from emotion_inference import classify_batched
+
+        self.load()
+        return classify_batched(texts, self.model, self.tokenizer, self.emotion_columns,
+                                batch_size=self.batch_size, max_length=self.max_length, device=self.device,
+                                forward=self.forward, chunk_long=self.chunk_long, report=self.last_report)
+
+def run_job(scorer, job, cache=None):
+    """
+    Runs one scoring job.
+
+    Jobs are dictionaries, either:
+        {"store": "dialogue_store"}               - adds the emotion group to a dialogue store
+        {"csv": "in.csv", "output": "out.csv"}    - adds emotion columns to a CSV
+
+    Returns:
+        dict: The job plus 'status', 'rows', 'long_rows' (texts over the token
+            limit among those scored), 'seconds' and, on failure, 'error'.
+    """
+    import pandas as pd
+    from dialogue_store import EMOTION_GROUP, read_columns, write_group
+
+    start = time.perf_counter()
+    result = dict(job)
+    try:
+        if 'store' in job:
+            df = read_columns(['cleaned_dialogue'], store_dir=job['store'])
+        else:
+            df = pd.read_csv(job['csv'])
+        texts = df['cleaned_dialogue'].tolist()
+        scorer.last_report = {}
+        if cache is not None:
+            scores = cache.score(scorer.cache_key(), texts, scorer.score)
+        else:
+            scores = scorer.score(texts)
+        emotion_df = pd.DataFrame(np.asarray(scores, dtype=np.float32), columns=scorer.columns())
+
+        if 'store' in job:
+            write_group(emotion_df, EMOTION_GROUP, store_dir=job['store'])
+        else:
+            # Overwrite emotion columns left by an earlier run instead of adding a second copy
+            df[list(emotion_df.columns)] = emotion_df.to_numpy(dtype=np.float64)
+            df.to_csv(job.get('output', job['csv']), index=False)
+        result.update(status='ok', rows=len(texts), long_rows=scorer.last_report.get('long_rows', 0))
+    except Exception as e:
+        result.update(status='error', rows=0, error=f"{type(e).__name__}: {e}")
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def serve(scorer, lines, out=sys.stdout, cache=None):
+    """
+    Processes one JSON job per input line and writes one JSON result per line.
+
+    Progress messages printed while a job runs go to stderr, so `out` only
+    ever carries results.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            result = {'status': 'error', 'error': f"Invalid job: {e}"}
+        else:
+            with contextlib.redirect_stdout(sys.stderr):
+                result = run_job(scorer, job, cache)
+        out.write(json.dumps(result) + '\n')
+        out.flush()
+
+# --- Startup Benchmark ---
+
+def startup_probe(artifact_dir):
+    """Measures import, model load and first/second inference in this (fresh) process."""
+    timings = {'import_s': import_model_libraries()}
+
+    scorer = EmotionScorer(artifact_dir)
+    start = time.perf_counter()
+    scorer.load()
+    timings['load_s'] = time.perf_counter() - start
+    timings['source'] = 'artifact' if scorer.info else 'hub'
+
+    for name in ('first_inference_s', 'warm_inference_s'):
+        start = time.perf_counter()
+        scorer.score([STARTUP_PROBE_TEXT])
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def bench_startup(artifact_dir, repeat=3):
+    """Runs the startup probe in `repeat` fresh interpreters and prints the median of each phase."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--startup-probe', '--artifact', artifact_dir],
+            check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"Startup time over {repeat} fresh processes (model from {runs[0]['source']}):")
+    for phase in ('import_s', 'load_s', 'first_inference_s', 'warm_inference_s'):
+        values = [run[phase] for run in runs]
+        print(f"  {phase[:-2]:<19} median {np.median(values) * 1000:8.1f} ms   "
+              f"(min {min(values) * 1000:.1f}, max {max(values) * 1000:.1f})")
+    total = np.median([run['import_s'] + run['load_s'] + run['first_inference_s'] for run in runs])
+    print(f"  {'time to first score':<19} median {total * 1000:8.1f} ms")
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Long-lived emotion scoring worker: reads JSON jobs, one per line, from stdin or --jobs.")
+    parser.add_argument('--jobs', help="File of JSON jobs (default: stdin).")
+    parser.add_argument('--artifact', default=DEFAULT_ARTIFACT_DIR, help="Local model artifact directory.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--backend', default='torch', choices=BACKENDS,
+                        help="Emotion model backend: torch, int8, onnx or onnx-int8.")
+    parser.add_argument('--threads', type=int, help="Intra-op threads for the int8/onnx backends.")
+    parser.add_argument('--max-length', type=int, default=DEFAULT_MAX_LENGTH,
+                        help="Token limit per forward pass; lower it for throughput.")
+    parser.add_argument('--chunk-long', action='store_true',
+                        help="Score texts over --max-length as overlapping windows instead of truncating them.")
+    parser.add_argument('--cache', help="Score cache path (default: no cache).")
+    parser.add_argument('--export-artifact', action='store_true',
+                        help="Save the model as a local safetensors artifact and exit.")
+    parser.add_argument('--bench-startup', action='store_true',
+                        help="Measure import, model load and first-inference time and exit.")
+    parser.add_argument('--repeat', type=int, default=3, help="Fresh processes for --bench-startup.")
+    parser.add_argument('--startup-probe', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.export_artifact:
+        export_artifact(args.artifact)
+    elif args.startup_probe:
+        print(json.dumps(startup_probe(args.artifact)))
+    elif args.bench_startup:
+        bench_startup(args.artifact, args.repeat)
+    else:
+        scorer = EmotionScorer(args.artifact, batch_size=args.batch_size,
+                               backend=args.backend, num_threads=args.threads,
+                               max_length=args.max_length, chunk_long=args.chunk_long)
+        cache = None
+        if args.cache:
+            from score_cache import ScoreCache
+            cache = ScoreCache(args.cache)
+        try:
+            if args.jobs:
+                with open(args.jobs, 'r', encoding='utf-8') as f:
+                    serve(scorer, f, cache=cache)
+            else:
+                serve(scorer, sys.stdin, cache=cache)
+        finally:
+            if cache is not None:
+                cache.close()
@@ -0,0 +1,235 @@
+import argparse
+import os
+import re
+import time
+
+import pandas as pd
+
+from prepare_data import (GOODFELLAS_SCRIPT_PATH, MAX_CHAR_NAME_LENGTH, MIN_CHAR_NAME_LEADING_SPACES,
+                          MIN_DIALOGUE_LEADING_SPACES, PULP_FICTION_SCRIPT_PATH, TARGET_CHARACTERS)
+
+# --- Precompiled Patterns ---
+# These mirror the heuristics in prepare_data.parse_script and clean_dialogue exactly,
+# but are compiled once instead of on every line / every row.
+CUE_SUFFIX_RE = re.compile(r'\s*\(.*\)\s*$')                   # (O.S.), (V.O.), (CONT'D)
+PARENTHETICAL_RE = re.compile(r'\([^)]*\)')
+NAME_PREFIX_RE = re.compile(r'^[A-Z\s]+\s*(\(.*\))?:\s*')
+WHITESPACE_RE = re.compile(r'\s+')
+
+NON_CUE_PREFIXES = ('INT.', 'EXT.', 'CUT TO:', 'FADE IN:', 'FADE OUT:')
+SCENE_HEADING_PREFIXES = ('INT.', 'EXT.')
+
+# Line kinds yielded by tokenize_lines
+CUE = 'cue'
+DIALOGUE = 'dialogue'
+PARENTHETICAL = 'parenthetical'
+SCENE_HEADING = 'scene_heading'
+OTHER = 'other'
+
+# --- Tokenizer ---
+
+def clean_dialogue(text):
+    """Removes parenthetical remarks and extra whitespace (same output as prepare_data.clean_dialogue)."""
+    text = PARENTHETICAL_RE.sub('', text)
+    text = NAME_PREFIX_RE.sub('', text)
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+def classify_line(line):
+    """
+    Classifies a single screenplay line.
+
+    Returns:
+        tuple: (kind, text) where text is the stripped line, or the bare character
+            name for a cue.
+    """
+    stripped = line.strip()
+    if not stripped:
+        return OTHER, stripped
+    indent = len(line) - len(line.lstrip(' '))
+    upper = stripped.isupper()
+
+    if indent >= MIN_CHAR_NAME_LEADING_SPACES:
+        if upper and len(stripped) < MAX_CHAR_NAME_LENGTH and not stripped.startswith(NON_CUE_PREFIXES):
+            return CUE, CUE_SUFFIX_RE.sub('', stripped).strip()
+    elif indent >= MIN_DIALOGUE_LEADING_SPACES and not upper:
+        # Parentheticals sit inside the dialogue block; clean_dialogue strips them later
+        return (PARENTHETICAL if stripped.startswith('(') else DIALOGUE), stripped
+
+    if stripped.startswith(SCENE_HEADING_PREFIXES):
+        return SCENE_HEADING, stripped
+    return OTHER, stripped
+
+def tokenize_lines(lines):
+    """
+    Classifies an iterable of screenplay lines lazily.
+
+    Yields:
+        tuple: (kind, line_number, text) for each non-blank line.
+    """
+    for line_number, line in enumerate(lines, 1):
+        kind, text = classify_line(line)
+        if text:
+            yield kind, line_number, text
+
+def iter_speeches(lines, target_chars):
+    """
+    Groups screenplay lines into speeches in a single pass.
+
+    A cue for a target character opens a speech; consecutive dialogue and
+    parenthetical lines extend it; any other line (including a blank one)
+    closes it. This reproduces the look-ahead loop in prepare_data.parse_script.
+    Both iter_dialogues and script_index.iter_dialogue_spans group through
+    here, so the two readers always extract the same speeches.
+
+    Args:
+        lines (iterable): (line, position) pairs; positions (e.g. byte offsets)
+            are passed through untouched and may be None.
+        target_chars (set or None): Uppercase character names to extract, or
+            None to extract every character.
+
+    Yields:
+        tuple: (character, dialogue, position of the cue, position of the
+            speech's last line, last INT./EXT. scene heading above the cue).
+    """
+    character = cue_position = cue_scene = None
+    speech = []
+    scene_heading = ''
+    for line, position in lines:
+        kind, text = classify_line(line)
+        if character is not None:
+            if kind is DIALOGUE or kind is PARENTHETICAL:
+                speech.append(text)
+                last_position = position
+                continue
+            if speech:
+                yield character, " ".join(speech), cue_position, last_position, cue_scene
+            character = None
+            speech = []
+        if kind is SCENE_HEADING:
+            scene_heading = text
+        if kind is CUE and (target_chars is None or text in target_chars):
+            character, cue_position, cue_scene = text, position, scene_heading
+
+    if character is not None and speech:
+        yield character, " ".join(speech), cue_position, last_position, cue_scene
+
+def dialogue_record(film_name, character, dialogue):
+    return {'film': film_name, 'character': character,
+            'dialogue': dialogue, 'cleaned_dialogue': clean_dialogue(dialogue)}
+
+def iter_dialogues(lines, film_name, target_chars):
+    """
+    Extracts cleaned dialogue records from screenplay lines (see iter_speeches).
+
+    Args:
+        lines (iterable): Screenplay lines, e.g. an open file.
+        film_name (str): Name of the film.
+        target_chars (set or None): Uppercase character names to extract, or
+            None to extract every character.
+
+    Yields:
+        dict: 'film', 'character', 'dialogue' and 'cleaned_dialogue' for each speech.
+    """
+    for character, dialogue, _, _, _ in iter_speeches(((line, None) for line in lines), target_chars):
+        yield dialogue_record(film_name, character, dialogue)
+
+def parse_script_streaming(filepath, film_name, target_chars):
+    """
+    Streaming replacement for prepare_data.parse_script.
+
+    Reads the file line by line instead of loading it with readlines(), and
+    returns the same records plus a 'cleaned_dialogue' key. Errors propagate
+    to the caller instead of being printed.
+    """
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        return list(iter_dialogues(f, film_name, target_chars))
+
+def dialogue_frame(records):
+    """Builds the cleaned dialogue DataFrame, dropping rows whose cleaned dialogue is empty."""
+    df = pd.DataFrame(records, columns=['film', 'character', 'dialogue', 'cleaned_dialogue'])
+    df = df[df['cleaned_dialogue'] != '']
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+# --- Regression Check & Benchmark ---
+
+def default_scripts():
+    """Returns (path, film, target characters) for the two bundled screenplays."""
+    return [
+        (PULP_FICTION_SCRIPT_PATH, 'Pulp Fiction', TARGET_CHARACTERS['Pulp Fiction']),
+        (GOODFELLAS_SCRIPT_PATH, 'Goodfellas', TARGET_CHARACTERS['Goodfellas']),
+    ]
+
+def check_against_parse_script(scripts):
+    """
+    Compares the streaming tokenizer against prepare_data.parse_script.
+
+    Both the target-character extraction and the every-character extraction
+    must produce identical rows, and the inline cleaning must match
+    prepare_data.clean_dialogue row for row.
+
+    Returns:
+        bool: True if every script matched.
+    """
+    from prepare_data import clean_dialogue as reference_clean, parse_script
+
+    all_ok = True
+    for path, film, chars in scripts:
+        for label, target in (('target characters', chars), ('all characters', None)):
+            expected = parse_script(path, film, target)
+            actual = parse_script_streaming(path, film, target)
+            rows_ok = [(r['film'], r['character'], r['dialogue']) for r in expected] == \
+                      [(r['film'], r['character'], r['dialogue']) for r in actual]
+            clean_ok = all(r['cleaned_dialogue'] == reference_clean(r['dialogue']) for r in actual)
+            ok = rows_ok and clean_ok
+            all_ok = all_ok and ok
+            print(f"  {'OK  ' if ok else 'FAIL'} {film} ({label}): {len(actual)} rows"
+                  f"{'' if rows_ok else ', rows differ'}{'' if clean_ok else ', cleaning differs'}")
+    return all_ok
+
+def benchmark(scripts, repeat=5):
+    """Prints parse+clean throughput for parse_script vs the streaming tokenizer."""
+    from contextlib import redirect_stdout
+    from prepare_data import clean_dialogue as reference_clean, parse_script
+
+    total_bytes = sum(os.path.getsize(path) for path, _, _ in scripts)
+
+    def reference():
+        for path, film, chars in scripts:
+            # parse_script prints a summary per file; keep the benchmark output readable
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                rows = parse_script(path, film, chars)
+            for row in rows:
+                reference_clean(row['dialogue'])
+
+    def streaming():
+        for path, film, chars in scripts:
+            parse_script_streaming(path, film, chars)
+
+    for name, fn in (('parse_script + clean_dialogue', reference), ('streaming tokenizer', streaming)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f"  {name:<30} best of {repeat}: {best * 1000:8.2f} ms  "
+              f"({total_bytes / best / 1e6:6.1f} MB/s)")
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Streaming screenplay tokenizer checks.")
+    parser.add_argument('command', choices=['check', 'bench'],
+                        help="'check' compares against parse_script; 'bench' measures throughput.")
+    parser.add_argument('--repeat', type=int, default=5, help="Benchmark repetitions.")
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        print("Comparing streaming tokenizer against parse_script...")
+        if not check_against_parse_script(default_scripts()):
+            raise SystemExit("Streaming tokenizer output differs from parse_script.")
+        print("All rows match.")
+    else:
+        print("Benchmarking screenplay parsing...")
+        benchmark(default_scripts(), repeat=args.repeat)
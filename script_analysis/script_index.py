@@ -0,0 +1,221 @@
+import argparse
+import mmap
+import os
+import re
+
+import pandas as pd
+
+from corpus_runner import resolve_manifest
+from dialogue_store import DEFAULT_STORE_DIR, SPANS_GROUP, TEXT_GROUP, open_group, read_columns, write_group
+from screenplay_tokenizer import (CUE, classify_line, default_scripts, dialogue_record, iter_speeches,
+                                  parse_script_streaming)
+
+# --- Configuration ---
+# Where each dialogue came from, stored row-aligned with the text group as the 'spans' group
+SPAN_COLUMNS = ['script_path', 'script_offset', 'script_end', 'script_line', 'scene_heading']
+TEXT_COLUMNS = ['film', 'character', 'dialogue', 'cleaned_dialogue']
+DEFAULT_CONTEXT_BEFORE = 3 # Script lines shown above a dialogue's cue
+DEFAULT_CONTEXT_AFTER = 1  # Script lines shown after its last line
+
+# Line ends as universal newlines see them (open() in text mode, as parse_script reads):
+# '\r\n', a lone '\r' or '\n'
+LINE_BREAK_RE = re.compile(rb'\r\n|\r|\n')
+LINE_RE = re.compile(rb'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+\Z')
+
+# --- Memory-Mapped Reader ---
+
+def iter_lines(buffer):
+    """
+    Splits a memory-mapped script into lines without copying the whole file.
+
+    Lines end at '\n', '\r\n' or a lone '\r', like the universal newlines
+    parse_script reads with, so CRLF and old Mac (CR-only) scripts get the
+    same lines and line numbers.
+
+    Yields:
+        tuple: (byte offset, byte end, line number, decoded line) per line; the
+            end includes the line break.
+    """
+    for line_number, match in enumerate(LINE_RE.finditer(buffer), 1):
+        yield match.start(), match.end(), line_number, match.group().decode('utf-8', errors='ignore')
+
+def iter_dialogue_spans(buffer, film_name, target_chars, script_path):
+    """
+    Extracts dialogue from a memory-mapped script, recording where each speech is.
+
+    Speeches are grouped by screenplay_tokenizer.iter_speeches, like
+    iter_dialogues (and so prepare_data.parse_script); each record additionally has the byte range
+    from the character cue to the end of the speech, the cue's line number and
+    the last INT./EXT. scene heading above it.
+
+    Yields:
+        dict: TEXT_COLUMNS plus SPAN_COLUMNS for each speech.
+    """
+    lines = ((line, (offset, end, line_number)) for offset, end, line_number, line in iter_lines(buffer))
+    for character, dialogue, cue, last, scene_heading in iter_speeches(lines, target_chars):
+        record = dialogue_record(film_name, character, dialogue)
+        record.update(script_path=script_path, script_offset=cue[0], script_end=last[1],
+                      script_line=cue[2], scene_heading=scene_heading)
+        yield record
+
+def iter_script_spans(filepath, film_name, target_chars):
+    """
+    Memory-maps a screenplay and streams its dialogue records with their spans.
+
+    Only the pages being scanned are resident, so a script is never held in
+    memory as a whole (unlike readlines() in prepare_data.parse_script).
+    Records carry the script's absolute path, so read_context works from any
+    working directory.
+    """
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return # mmap cannot map an empty file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from iter_dialogue_spans(buffer, film_name, target_chars, os.path.abspath(filepath))
+
+def read_script_spans(filepath, film_name, target_chars):
+    """Returns every dialogue record of one screenplay, with spans (see iter_script_spans)."""
+    return list(iter_script_spans(filepath, film_name, target_chars))
+
+def spans_frame(records):
+    """Builds the cleaned dialogue DataFrame with span columns, dropping rows whose cleaned dialogue is empty."""
+    df = pd.DataFrame(records, columns=TEXT_COLUMNS + SPAN_COLUMNS)
+    df = df[df['cleaned_dialogue'] != '']
+    df.reset_index(drop=True, inplace=True)
+    return df.astype({'script_offset': 'int64', 'script_end': 'int64', 'script_line': 'int64'})
+
+# --- Random Access ---
+
+def previous_line_start(buffer, start):
+    """Byte offset of the line before the one starting at `start` (which must be > 0)."""
+    end = start - 1 # Last byte of the previous line's break
+    if end > 0 and buffer[end - 1:end + 1] == b'\r\n':
+        end -= 1
+    return max(buffer.rfind(b'\n', 0, end), buffer.rfind(b'\r', 0, end)) + 1
+
+def next_line_end(buffer, start):
+    """Byte offset just past the line break of the line starting at `start` (or the end of the file)."""
+    match = LINE_BREAK_RE.search(buffer, start)
+    return len(buffer) if match is None else match.end()
+
+def read_context(script_path, offset, end, line_number, before=DEFAULT_CONTEXT_BEFORE, after=DEFAULT_CONTEXT_AFTER):
+    """
+    Reads a dialogue and its surrounding lines straight from the script by byte offset.
+
+    Returns:
+        tuple: (line number of the first returned line, list of lines).
+    """
+    with open(script_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        start = offset
+        for _ in range(before):
+            if start == 0:
+                break
+            start = previous_line_start(buffer, start)
+        stop = end
+        for _ in range(after):
+            if stop >= len(buffer):
+                break
+            stop = next_line_end(buffer, stop)
+        first_line = line_number - len(LINE_BREAK_RE.findall(buffer, start, offset))
+        # bytes.splitlines breaks only on \r, \n and \r\n, like iter_lines
+        return first_line, [line.decode('utf-8', errors='ignore') for line in buffer[start:stop].splitlines()]
+
+def show_extremes(column='sentiment_score', n=5, lowest=False, film=None, before=DEFAULT_CONTEXT_BEFORE,
+                  after=DEFAULT_CONTEXT_AFTER, store_dir=DEFAULT_STORE_DIR):
+    """Prints the n highest (or lowest) scoring dialogues for a column, each with its scene and script context."""
+    df = read_columns(['film', 'character', column] + SPAN_COLUMNS, store_dir)
+    if film is not None:
+        df = df[df['film'] == film]
+    rows = df.nsmallest(n, column) if lowest else df.nlargest(n, column)
+    for row in rows.itertuples(index=False):
+        first_line, lines = read_context(row.script_path, row.script_offset, row.script_end,
+                                         row.script_line, before, after)
+        print(f"\n{row.film} / {row.character}  {column}={getattr(row, column):.4f}  "
+              f"{row.script_path}:{row.script_line}  {row.scene_heading or '(no scene heading)'}")
+        for number, line in enumerate(lines, first_line):
+            print(f"  {number:>6} | {line}")
+
+# --- Index Building & Checks ---
+
+def index_manifest(manifest):
+    """Parses every screenplay in a manifest with the mmap reader; returns the spans DataFrame."""
+    records = []
+    for job in manifest:
+        chars = set(job['characters']) if job['characters'] is not None else None
+        records.extend(iter_script_spans(job['path'], job['film'], chars))
+    return spans_frame(records)
+
+def build_index(manifest, store_dir=DEFAULT_STORE_DIR):
+    """
+    Adds the spans group to an existing store by re-reading its scripts.
+
+    The scripts must still produce exactly the rows of the text group, so the
+    spans line up with the stored dialogue.
+
+    Raises:
+        ValueError: If the scripts no longer match the text group.
+    """
+    df = index_manifest(manifest)
+    stored = open_group(TEXT_GROUP, store_dir).select(['film', 'character', 'dialogue']).to_pandas()
+    if not df[['film', 'character', 'dialogue']].equals(stored):
+        raise ValueError("The scripts no longer match the stored dialogue; rerun prepare_data.py or pipeline.py.")
+    write_group(df[SPAN_COLUMNS], SPANS_GROUP, store_dir)
+    return df
+
+def check_against_streaming(scripts):
+    """
+    Checks the mmap reader against screenplay_tokenizer.parse_script_streaming.
+
+    Rows must be identical, and every recorded span must start at the
+    character's cue line in the script.
+
+    Returns:
+        bool: True if every script matched.
+    """
+    all_ok = True
+    for path, film, chars in scripts:
+        expected = parse_script_streaming(path, film, chars)
+        actual = read_script_spans(path, film, chars)
+        rows_ok = [tuple(r[c] for c in TEXT_COLUMNS) for r in expected] == \
+                  [tuple(r[c] for c in TEXT_COLUMNS) for r in actual]
+        with open(path, 'rb') as f:
+            data = f.read()
+        spans_ok = all(classify_line(LINE_BREAK_RE.split(data[r['script_offset']:], maxsplit=1)[0]
+                                     .decode('utf-8', errors='ignore')) == (CUE, r['character'])
+                       for r in actual)
+        ok = rows_ok and spans_ok
+        all_ok = all_ok and ok
+        print(f"  {'OK  ' if ok else 'FAIL'} {film}: {len(actual)} rows"
+              f"{'' if rows_ok else ', rows differ'}{'' if spans_ok else ', spans misplaced'}")
+    return all_ok
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Memory-mapped script reader and dialogue position index.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Store directory.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('check', help="Compare the mmap reader with the streaming tokenizer.")
+    build_parser = subparsers.add_parser('build', help="Add the spans group to an existing store.")
+    build_parser.add_argument('source', nargs='?',
+                              help="Directory of screenplays or JSON manifest (default: the two films).")
+    build_parser.add_argument('--characters', help="JSON file mapping film name to target characters.")
+    context_parser = subparsers.add_parser('context', help="Show the script around the top-scoring dialogues.")
+    context_parser.add_argument('--column', default='sentiment_score', help="Score column, e.g. anger.")
+    context_parser.add_argument('-n', type=int, default=5, help="Number of dialogues.")
+    context_parser.add_argument('--lowest', action='store_true', help="Lowest instead of highest scores.")
+    context_parser.add_argument('--film', help="Only this film.")
+    context_parser.add_argument('--before', type=int, default=DEFAULT_CONTEXT_BEFORE)
+    context_parser.add_argument('--after', type=int, default=DEFAULT_CONTEXT_AFTER)
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        print("Comparing mmap reader against the streaming tokenizer...")
+        if not check_against_streaming(default_scripts()):
+            raise SystemExit("mmap reader output differs from the streaming tokenizer.")
+        print("All rows match.")
+    elif args.command == 'build':
+        df = build_index(resolve_manifest(args.source, args.characters), args.store)
+        print(f"Indexed {len(df)} dialogues in {df['script_path'].nunique()} scripts.")
+    else:
+        show_extremes(args.column, args.n, args.lowest, args.film, args.before, args.after, args.store)
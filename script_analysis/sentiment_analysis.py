@@ -1,6 +1,22 @@
-import pandas as pd
+import numpy as np
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import nltk # VADER often uses nltk resources
+from importlib.metadata import version
+from score_cache import ScoreCache
+from dialogue_store import VADER_GROUP, format_memory_report, read_columns, write_group
+from vader_batch import VADER_FIELDS, BatchVaderScorer
+from dedup import DedupReport, score_unique
+from aggregate_cube import AggregateCube, save_cube, sentiment_categories
+from instrumentation import get_tracer
+
+# --- Configuration ---
+USE_SCORE_CACHE = True                 # Only score dialogue not seen by this VADER version before
+SCORE_CACHE_PATH = 'score_cache.sqlite'
+VADER_MODEL_KEY = f"vaderSentiment-{version('vaderSentiment')}:{','.join(VADER_FIELDS)}"
+DEDUP_MODE = 'normalized' # Score repeated lines once: 'off', 'exact', 'normalized' or 'minhash' (see dedup.py)
+EXPORT_CSV = False # Also write dialogues_with_sentiment.csv (the dialogue store is the main output)
+
+tracer = get_tracer('sentiment_analysis.py') # Set ANALYSIS_TRACE=1 to record stage timings
 
 # --- Optional: Download VADER lexicon if needed (run once) ---
 # try:
@@ -14,9 +30,11 @@ import nltk # VADER often uses nltk resources
 
 # --- Load the DataFrame ---
 # If 'df' is already in memory from the previous script, you can skip this.
-# Otherwise, uncomment the next line:
-df = pd.read_csv('cleaned_dialogues.csv')
-print("Loaded DataFrame from cleaned_dialogues.csv")
+# Otherwise, load the text columns from the dialogue store (film and character as categoricals):
+with tracer.stage('load') as stage:
+    df = read_columns(['film', 'character', 'dialogue', 'cleaned_dialogue'], compact=True)
+    stage['rows'] = len(df)
+print("Loaded DataFrame from the dialogue store")
 
 # --- Ensure the DataFrame exists and has the right column ---
 if 'df' not in locals() and 'df' not in globals():
@@ -34,33 +52,59 @@ elif df.empty:
 
 print("\nInitializing VADER Sentiment Analyzer...")
 analyzer = SentimentIntensityAnalyzer()
+batch_scorer = BatchVaderScorer(analyzer)
 
-def get_vader_score(text):
-    """Calculates the VADER compound score for a given text."""
-    # Ensure text is a string, handle potential non-string data
-    if not isinstance(text, str):
-        return 0.0 # Assign neutral score to non-string input
-    return analyzer.polarity_scores(text)['compound']
+def score_batch(texts):
+    """Scores a list of texts in one pass, returning an array with one column per VADER field."""
+    scores = batch_scorer.score(texts)
+    return np.column_stack([scores[field] for field in VADER_FIELDS])
 
 print("Applying VADER analysis to cleaned dialogue...")
-# Apply the function to the 'cleaned_dialogue' column
-df['sentiment_score'] = df['cleaned_dialogue'].apply(get_vader_score)
+with tracer.stage('vader', rows=len(df), cache=USE_SCORE_CACHE, dedup=DEDUP_MODE) as stage:
+    # Each repeated line ("Yeah.", "What?") is scored once and its scores copied to every occurrence
+    dedup_report = DedupReport()
+    if USE_SCORE_CACHE:
+        # Look up previously scored dialogue; only cache misses go to VADER
+        with ScoreCache(SCORE_CACHE_PATH) as cache:
+            scores = score_unique(df['cleaned_dialogue'].tolist(),
+                                  lambda texts: cache.score(VADER_MODEL_KEY, texts, score_batch),
+                                  DEDUP_MODE, dedup_report)
+            print(f"Score cache: {cache.hits} hits, {cache.misses} texts scored.")
+            stage.update(cache_hits=cache.hits, cache_misses=cache.misses)
+    else:
+        scores = score_unique(df['cleaned_dialogue'].tolist(), score_batch, DEDUP_MODE, dedup_report)
+    print(f"Dedup ({DEDUP_MODE}): {dedup_report}")
+    stage.update(unique_texts=dedup_report.unique, full_rule_scoring=batch_scorer.full_scored)
+
+# Keep the compound score as 'sentiment_score', plus the neg/neu/pos proportions
+df['sentiment_score'] = scores[:, VADER_FIELDS.index('compound')]
+for field in ('neg', 'neu', 'pos'):
+    df[f'vader_{field}'] = scores[:, VADER_FIELDS.index(field)]
+# Vectorized Negative/Neutral/Positive label, stored as int8 category codes
+df['sentiment_category'] = sentiment_categories(df['sentiment_score'])
 
 print("Sentiment analysis complete.")
+# The VADER scores stay float64 here because that is how the store keeps them;
+# later stages read them back as float32 (read_columns(compact=True))
+print(f"Memory: {format_memory_report(df)}")
 
 # --- Calculate Basic Statistics ---
 
 print("\nCalculating statistics per character...")
-# Group by film and character, then aggregate sentiment scores
-character_stats = df.groupby(['film', 'character'])['sentiment_score'].agg(['mean', 'median', 'std', 'count'])
+# Summarize the scores once per (film, character, sentiment category); every report below,
+# and visualizations.py later, reads its groups from this aggregate cube instead of the rows
+with tracer.stage('stats') as stage:
+    cube = AggregateCube.from_frame(df, ['sentiment_score'])
+    character_stats = cube.stats('sentiment_score', by=['film', 'character'])
+    film_stats = cube.stats('sentiment_score', by=['film'])
+    stage['cells'] = len(cube.cells)
 # Rename columns for clarity
 character_stats.rename(columns={'mean': 'Mean Sentiment', 'median': 'Median Sentiment', 'std': 'Std Dev Sentiment', 'count': 'Dialogue Count'}, inplace=True)
 print(character_stats)
 
 
 print("\nCalculating overall statistics per film...")
-# Group by film only, then aggregate sentiment scores
-film_stats = df.groupby('film')['sentiment_score'].agg(['mean', 'median', 'std', 'count'])
+# Per-film totals come from the same cube cells as the per-character stats
 # Rename columns for clarity
 film_stats.rename(columns={'mean': 'Mean Sentiment', 'median': 'Median Sentiment', 'std': 'Std Dev Sentiment', 'count': 'Dialogue Count'}, inplace=True)
 print(film_stats)
@@ -70,6 +114,12 @@ print(film_stats)
 print("\nFirst 5 rows of DataFrame with Sentiment Score:")
 print(df.head())
 
-# Optional: Save the DataFrame with sentiment scores
-df.to_csv('dialogues_with_sentiment.csv', index=False)
-# print("\nDataFrame with sentiment scores saved to dialogues_with_sentiment.csv")
\ No newline at end of file
+# Save only the new score columns; the text columns are already in the store
+with tracer.stage('write', rows=len(df)):
+    write_group(df[['sentiment_score', 'vader_neg', 'vader_neu', 'vader_pos']], VADER_GROUP)
+    save_cube(cube) # After the group it summarizes, so the cube is recorded as up to date
+
+    # Optional: Save the DataFrame with sentiment scores
+    if EXPORT_CSV:
+        df.to_csv('dialogues_with_sentiment.csv', index=False)
+    # print("\nDataFrame with sentiment scores saved to dialogues_with_sentiment.csv")
\ No newline at end of file
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPT_DIR) # The scripts import each other by bare module name
+
+@pytest.fixture
+def bundled_scripts():
+    """(absolute path, film, target characters) for the two bundled screenplays."""
+    from screenplay_tokenizer import default_scripts
+    return [(os.path.join(SCRIPT_DIR, path), film, chars) for path, film, chars in default_scripts()]
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregate_cube import AggregateCube, sentiment_categories
+
+def dialogue_rows():
+    scores = np.array([-0.6, 0.0, 0.3, 0.9, -0.2, 0.04], dtype=np.float32)
+    return pd.DataFrame({'film': ['Pulp Fiction'] * 3 + ['Goodfellas'] * 3,
+                         'character': ['JULES', 'JULES', 'VINCENT', 'HENRY', 'HENRY', 'KAREN'],
+                         'sentiment_score': scores,
+                         'sentiment_category': sentiment_categories(scores)})
+
+def test_string_categories_match_categorical():
+    df = dialogue_rows()
+    expected = AggregateCube.from_frame(df, ['sentiment_score'])
+    # As loaded from a CSV: plain strings
+    actual = AggregateCube.from_frame(df.astype({'sentiment_category': str}), ['sentiment_score'])
+    pd.testing.assert_frame_equal(actual.cells, expected.cells)
+    pd.testing.assert_frame_equal(actual.category_counts(by=['film']), expected.category_counts(by=['film']))
+
+def test_categories_match_recomputed_codes():
+    df = dialogue_rows()
+    from_column = AggregateCube.from_frame(df, ['sentiment_score'])
+    recomputed = AggregateCube.from_frame(df.drop(columns='sentiment_category'), ['sentiment_score'])
+    pd.testing.assert_frame_equal(from_column.cells, recomputed.cells)
+
+def test_unknown_category_is_rejected():
+    df = dialogue_rows().astype({'sentiment_category': str})
+    df.loc[2, 'sentiment_category'] = 'Mixed'
+    with pytest.raises(ValueError, match='Mixed'):
+        AggregateCube.from_frame(df, ['sentiment_score'])
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from checkpoint import ShardCheckpoint, parse_shard_range, split_shards
+
+RUN = {'dataset': 'abc123', 'model': 'emotion'}
+
+def test_resume_skips_saved_shards(tmp_path):
+    directory = str(tmp_path / 'ckpt')
+    scores = np.arange(10, dtype=np.float32)
+    checkpoint = ShardCheckpoint(directory, RUN, rows=10, shard_size=4)
+    assert checkpoint.shards == 3
+    checkpoint.save(0, scores=scores[checkpoint.shard_rows(0)])
+    checkpoint.save(2, scores=scores[checkpoint.shard_rows(2)])
+
+    resumed = ShardCheckpoint(directory, RUN, rows=10, shard_size=4, reset=False)
+    assert resumed.pending() == [1]
+    assert resumed.pending(range(2)) == [1]
+    with pytest.raises(ValueError):
+        resumed.load('scores')
+    resumed.save(1, scores=scores[resumed.shard_rows(1)])
+    np.testing.assert_array_equal(resumed.load('scores'), scores)
+    assert resumed.load('embeddings') is None
+
+    resumed.clear()
+    assert not (tmp_path / 'ckpt').exists()
+
+def test_save_rejects_wrong_row_count(tmp_path):
+    checkpoint = ShardCheckpoint(str(tmp_path), RUN, rows=10, shard_size=4)
+    with pytest.raises(ValueError):
+        checkpoint.save(2, scores=np.zeros(4)) # The last shard covers rows 8-9 only
+    assert checkpoint.pending() == [0, 1, 2]
+
+@pytest.mark.parametrize('run, shard_size', [(dict(RUN, dataset='def456'), 4), (RUN, 5)])
+def test_different_run_is_rejected_or_discarded(tmp_path, run, shard_size):
+    directory = str(tmp_path / 'ckpt')
+    ShardCheckpoint(directory, RUN, rows=10, shard_size=4).save(0, scores=np.zeros(4))
+
+    with pytest.raises(ValueError):
+        ShardCheckpoint(directory, run, rows=10, shard_size=shard_size, reset=False)
+    fresh = ShardCheckpoint(directory, run, rows=10, shard_size=shard_size)
+    assert fresh.pending() == list(range(fresh.shards))
+    reopened = ShardCheckpoint(directory, run, rows=10, shard_size=shard_size, reset=False)
+    assert reopened.pending() == list(range(fresh.shards))
+
+def test_parse_shard_range():
+    assert parse_shard_range('2:5', 10) == range(2, 5)
+    assert parse_shard_range(':3', 10) == range(0, 3)
+    assert parse_shard_range('7:', 10) == range(7, 10)
+    assert parse_shard_range('8:20', 10) == range(8, 10)
+    with pytest.raises(ValueError):
+        parse_shard_range('3', 10)
+
+def test_split_shards():
+    assert split_shards([0, 1, 2, 3, 4], 2) == [[0, 1, 2], [3, 4]]
+    assert split_shards([5, 9], 4) == [[5], [9]]
+    assert split_shards([], 3) == []
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from dedup import DEDUP_MODES, DedupReport, dedup_groups, score_unique
+
+TEXTS = [
+    "Say what again.",
+    "I'm gonna get medieval on your ass.",
+    "Say what again.",
+    "say   WHAT again.",
+    "Funny how?",
+    "Say what � again.",
+    "I'm gonna get medieval on your ass!",
+]
+
+def fake_scores(texts):
+    """Deterministic per-text scores, so fanned-out rows can be checked against their representative."""
+    return np.array([[len(text), sum(map(ord, text)) % 97] for text in texts], dtype=np.float32)
+
+class CountingScorer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return fake_scores(texts)
+
+@pytest.mark.parametrize('mode', DEDUP_MODES)
+def test_scores_fan_out_from_representatives(mode):
+    representatives, inverse = dedup_groups(TEXTS, mode)
+    scorer, report = CountingScorer(), DedupReport()
+    scores = score_unique(TEXTS, scorer, mode, report)
+
+    assert scorer.calls == [[TEXTS[i] for i in representatives]]
+    assert scores.shape == (len(TEXTS), 2)
+    for row, group in enumerate(inverse):
+        np.testing.assert_array_equal(scores[row], fake_scores([TEXTS[representatives[group]]])[0])
+    # Every representative scores itself: its own text, first occurrence of its group
+    for group, row in enumerate(representatives):
+        assert inverse[row] == group
+        assert row == min(np.flatnonzero(inverse == group))
+    assert (report.rows, report.unique) == (len(TEXTS), len(representatives))
+
+def test_modes_group_progressively_more():
+    unique = {mode: len(dedup_groups(TEXTS, mode)[0]) for mode in DEDUP_MODES}
+    assert unique == {'off': 7, 'exact': 6, 'normalized': 4, 'minhash': 3}
+
+def test_exact_repeats_keep_their_own_scores():
+    scores = score_unique(TEXTS, fake_scores, 'exact')
+    np.testing.assert_array_equal(scores, fake_scores(TEXTS))
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        dedup_groups(TEXTS, 'fuzzy')
+
+def test_report_accumulates_over_chunks():
+    report = DedupReport()
+    score_unique(TEXTS[:3], fake_scores, 'exact', report)
+    score_unique(TEXTS[3:], fake_scores, 'exact', report)
+    assert (report.rows, report.unique) == (7, 6)
+    assert report.ratio == pytest.approx(1 / 7)
@@ -0,0 +1,71 @@
+import asyncio
+
+import numpy as np
+
+from load_test import request
+from scoring_service import ScoringService
+
+class FakeScorer:
+    """Stands in for scoring_worker.EmotionScorer; optionally fails every batch."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def cache_key(self):
+        return 'fake'
+
+    def columns(self):
+        return ['joy', 'sadness']
+
+    def score(self, texts):
+        if self.fail:
+            raise RuntimeError("model exploded")
+        return np.tile(np.array([0.75, 0.25], dtype=np.float32), (len(texts), 1))
+
+async def exchange(scorer, send):
+    """Starts a service on a free port, runs `send(reader, writer)` against it and returns its result."""
+    service = ScoringService(scorer, max_wait=0.001)
+    server = await service.start('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            return await send(reader, writer)
+        finally:
+            writer.close()
+    finally:
+        await service.close()
+
+def score(scorer, payload):
+    return asyncio.run(exchange(scorer, lambda reader, writer: request(reader, writer, 'POST', '/score', payload)))
+
+def test_scores_texts():
+    status, body = score(FakeScorer(), {'texts': ["Funny how?", "Zed's dead, baby."]})
+    assert status == 200
+    assert [r['emotions'] for r in body['results']] == [{'joy': 0.75, 'sadness': 0.25}] * 2
+    assert all(-1 <= r['sentiment_score'] <= 1 for r in body['results'])
+
+def test_scorer_failure_returns_500():
+    status, body = score(FakeScorer(fail=True), {'text': "Funny how?"})
+    assert status == 500
+    assert 'model exploded' in body['error']
+
+def test_scorer_failure_keeps_connection_usable():
+    async def send(reader, writer):
+        first = await request(reader, writer, 'POST', '/score', {'text': "Funny how?"})
+        second = await request(reader, writer, 'POST', '/score', {'text': "Funny how?", 'emotion': False})
+        return first[0], second[0]
+    assert asyncio.run(exchange(FakeScorer(fail=True), send)) == (500, 200)
+
+def test_invalid_payload_returns_400():
+    status, _ = score(FakeScorer(), {'texts': []})
+    assert status == 400
+
+def test_malformed_request_line_returns_400():
+    async def send(reader, writer):
+        writer.write(b"GARBAGE\r\n\r\n")
+        await writer.drain()
+        return await reader.read()
+    response = asyncio.run(exchange(FakeScorer(), send))
+    assert response.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    assert b"Connection: close" in response
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from scoring_worker import run_job
+
+class FakeScorer:
+    """Stands in for EmotionScorer: scores every text the same."""
+
+    last_report = {}
+
+    def cache_key(self):
+        return 'fake'
+
+    def columns(self):
+        return ['joy', 'sadness']
+
+    def score(self, texts):
+        return np.tile(np.array([0.75, 0.25], dtype=np.float32), (len(texts), 1))
+
+def test_csv_job_overwrites_existing_emotion_columns(tmp_path):
+    path = tmp_path / 'dialogues.csv'
+    pd.DataFrame({'cleaned_dialogue': ["Funny how?", "Zed's dead."],
+                  'joy': [0.1, 0.2], 'sadness': [0.9, 0.8], 'sentiment_score': [0.5, -0.5]}).to_csv(path, index=False)
+
+    result = run_job(FakeScorer(), {'csv': str(path)})
+    assert result['status'] == 'ok' and result['rows'] == 2
+    df = pd.read_csv(path)
+    assert list(df.columns) == ['cleaned_dialogue', 'joy', 'sadness', 'sentiment_score']
+    assert df['joy'].tolist() == [0.75, 0.75]
+    assert df['sadness'].tolist() == [0.25, 0.25]
+
+def test_csv_job_adds_emotion_columns(tmp_path):
+    path, output = tmp_path / 'dialogues.csv', tmp_path / 'scored.csv'
+    pd.DataFrame({'cleaned_dialogue': ["Funny how?"]}).to_csv(path, index=False)
+
+    assert run_job(FakeScorer(), {'csv': str(path), 'output': str(output)})['status'] == 'ok'
+    assert list(pd.read_csv(output).columns) == ['cleaned_dialogue', 'joy', 'sadness']
@@ -0,0 +1,28 @@
+import re
+
+import pytest
+
+from prepare_data import clean_dialogue as reference_clean, parse_script
+from screenplay_tokenizer import parse_script_streaming
+
+def rows(records, columns=('film', 'character', 'dialogue')):
+    return [tuple(r[c] for c in columns) for r in records]
+
+@pytest.mark.parametrize('all_characters', [False, True])
+def test_streaming_tokenizer_matches_parse_script(bundled_scripts, all_characters):
+    for path, film, chars in bundled_scripts:
+        target = None if all_characters else chars
+        expected = parse_script(path, film, target)
+        actual = parse_script_streaming(path, film, target)
+        assert expected
+        assert rows(actual) == rows(expected)
+        assert [r['cleaned_dialogue'] for r in actual] == [reference_clean(r['dialogue']) for r in actual]
+
+@pytest.mark.parametrize('newline', [b'\r\n', b'\r'])
+def test_other_line_endings_match_parse_script(bundled_scripts, tmp_path, newline):
+    path, film, chars = bundled_scripts[0]
+    with open(path, 'rb') as f:
+        data = f.read()
+    converted = tmp_path / 'script.txt'
+    converted.write_bytes(re.sub(rb'\r\n|\r|\n', newline, data))
+    assert rows(parse_script_streaming(str(converted), film, chars)) == rows(parse_script(path, film, chars))
@@ -0,0 +1,48 @@
+import pytest
+
+from prepare_data import parse_script
+from screenplay_tokenizer import CUE, classify_line, parse_script_streaming
+from script_index import LINE_BREAK_RE, TEXT_COLUMNS, read_context, read_script_spans
+
+def rows(records, columns=('film', 'character', 'dialogue')):
+    return [tuple(r[c] for c in columns) for r in records]
+
+@pytest.mark.parametrize('all_characters', [False, True])
+def test_mmap_index_matches_parse_script(bundled_scripts, all_characters):
+    for path, film, chars in bundled_scripts:
+        target = None if all_characters else chars
+        actual = read_script_spans(path, film, target)
+        assert rows(actual) == rows(parse_script(path, film, target))
+        assert rows(actual, TEXT_COLUMNS) == rows(parse_script_streaming(path, film, target), TEXT_COLUMNS)
+
+def test_spans_point_at_cue_lines(bundled_scripts):
+    for path, film, chars in bundled_scripts:
+        with open(path, 'rb') as f:
+            data = f.read()
+        for r in read_script_spans(path, film, chars):
+            cue = LINE_BREAK_RE.split(data[r['script_offset']:], maxsplit=1)[0].decode('utf-8', errors='ignore')
+            assert classify_line(cue) == (CUE, r['character'])
+
+@pytest.mark.parametrize('newline', [b'\r\n', b'\r'])
+def test_other_line_endings_keep_lines_and_context(bundled_scripts, tmp_path, newline):
+    path, film, chars = bundled_scripts[0]
+    with open(path, 'rb') as f:
+        data = f.read()
+    converted = tmp_path / 'script.txt'
+    converted.write_bytes(LINE_BREAK_RE.sub(newline, data))
+
+    original, actual = read_script_spans(path, film, chars), read_script_spans(str(converted), film, chars)
+    assert rows(actual) == rows(parse_script(path, film, chars))
+    assert [r['script_line'] for r in actual] == [r['script_line'] for r in original]
+    for before, after in zip(original[:50], actual[:50]):
+        assert read_context(str(converted), after['script_offset'], after['script_end'], after['script_line']) == \
+               read_context(path, before['script_offset'], before['script_end'], before['script_line'])
+
+def test_spans_record_absolute_paths(bundled_scripts, tmp_path, monkeypatch):
+    path, film, chars = bundled_scripts[0]
+    record = read_script_spans(path, film, chars)[0]
+    monkeypatch.chdir(tmp_path)
+    first_line, lines = read_context(record['script_path'], record['script_offset'], record['script_end'],
+                                     record['script_line'], before=0, after=0)
+    assert first_line == record['script_line']
+    assert classify_line(lines[0]) == (CUE, record['character'])
@@ -0,0 +1,58 @@
+import random
+
+import numpy as np
+import pytest
+from vaderSentiment.vaderSentiment import BOOSTER_DICT, NEGATE, SentimentIntensityAnalyzer
+
+from vader_batch import VADER_FIELDS, BatchVaderScorer
+
+RULE_TEXTS = [
+    "This is good.",
+    "This is NOT good!!",
+    "I don't really love it",
+    "no good at all",
+    "No, I'm not sad or happy",
+    "never so happy",
+    "without doubt the best",
+    "at least it's fine, the least bad",
+    "it's kind of nice",
+    "it's sort of nice",
+    "good but bad but good",
+    "The EXTREMELY BAD day???",
+    "Yeah, the bomb 😀",
+    "...",
+    "",
+]
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return SentimentIntensityAnalyzer()
+
+def assert_matches_polarity_scores(analyzer, texts):
+    scores = BatchVaderScorer(analyzer).score(texts)
+    for i, text in enumerate(texts):
+        expected = analyzer.polarity_scores(text)
+        assert {field: scores[field][i] for field in VADER_FIELDS} == expected, text
+
+def test_rule_texts_match_polarity_scores(analyzer):
+    assert_matches_polarity_scores(analyzer, RULE_TEXTS)
+
+def test_random_rule_combinations_match_polarity_scores(analyzer):
+    rng = random.Random(0)
+    words = (rng.sample(sorted(analyzer.lexicon), 50) + NEGATE[:20] + list(BOOSTER_DICT)[:20]
+             + ['no', 'never', 'so', 'this', 'without', 'doubt', 'least', 'at', 'very', 'or', 'kind', 'of', 'but'])
+    texts = []
+    for _ in range(2000):
+        text = [rng.choice(words) for _ in range(rng.randint(1, 10))]
+        texts.append(' '.join(word.upper() if rng.random() < 0.1 else word for word in text) + rng.choice(['', '!', '??']))
+    assert_matches_polarity_scores(analyzer, texts)
+
+def test_only_phrases_and_emoji_use_polarity_scores(analyzer):
+    scorer = BatchVaderScorer(analyzer)
+    scorer.score(RULE_TEXTS)
+    assert scorer.full_scored == 3 # 'kind of', 'sort of', and 'the bomb' with its emoji
+
+def test_non_strings_score_zero(analyzer):
+    scores = BatchVaderScorer(analyzer).score(["good", None, float('nan'), "good"])
+    np.testing.assert_array_equal(scores['compound'][[1, 2]], 0.0)
+    assert scores['compound'][0] == scores['compound'][3] == analyzer.polarity_scores("good")['compound']
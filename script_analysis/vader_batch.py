@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+from vaderSentiment.vaderSentiment import (BOOSTER_DICT, C_INCR, N_SCALAR, NEGATE, SPECIAL_CASES, SentiText,
+                                           SentimentIntensityAnalyzer)
+
+# --- Configuration ---
+VADER_FIELDS = ('neg', 'neu', 'pos', 'compound')
+
+# Multi-word boosters and special-case idioms ('sort of', 'the bomb', ...), padded to match whole words.
+# Texts containing one or an emoji are scored by analyzer.polarity_scores itself
+RULE_PHRASES = tuple(f" {phrase} " for phrase in (*BOOSTER_DICT, *SPECIAL_CASES) if ' ' in phrase)
+
+# Constants of SentimentIntensityAnalyzer.score_valence
+EXCLAMATION_WEIGHT = 0.292 # Per '!', at most MAX_EXCLAMATIONS of them
+MAX_EXCLAMATIONS = 4
+QUESTION_WEIGHT = 0.18     # Per '?' when there are 2 or 3
+MAX_QUESTION_EMPHASIS = 0.96
+NORMALIZE_ALPHA = 15
+
+# --- Helper Functions ---
+
+def shifted(values, distance, position, counts, fill=False):
+    """
+    Per-token view of the token `distance` places earlier (negative: later) in the same text.
+
+    `counts` holds the word count of each token's text; tokens without such
+    a neighbour get `fill`.
+    """
+    out = np.full(len(values), fill, dtype=values.dtype)
+    if distance > 0:
+        out[distance:] = values[:-distance]
+        out[position < distance] = fill
+    else:
+        out[:distance] = values[-distance:]
+        out[position - distance >= counts] = fill
+    return out
+
+# --- Batch Scoring ---
+
+class BatchVaderScorer:
+    """
+    Scores many texts with VADER in one pass, returning NumPy arrays.
+
+    Each distinct text is tokenized once into one flat token array, and each
+    distinct token is looked up once (lexicon valence, booster, negation,
+    case). VADER's per-word rules - 'no', ALL CAPS emphasis, boosters and
+    dampeners up to three words back, negation, 'never so', 'without doubt',
+    'least' - are then applied to all lexicon words at once as array
+    operations; 'but' reweights each text's values with VADER's own
+    _but_check. The sums, punctuation emphasis and normalization of
+    score_valence are computed for all texts at once.
+
+    Every operation mirrors polarity_scores in the same order, so scores are
+    identical to it. Texts with a construct whose rule is not vectorized (see
+    RULE_PHRASES) are scored by polarity_scores directly.
+    """
+
+    def __init__(self, analyzer=None):
+        self.analyzer = analyzer or SentimentIntensityAnalyzer()
+        self.emoji_chars = frozenset(self.analyzer.emojis)
+        self.full_scored = 0 # Texts that needed the per-text rule engine in the last call
+
+    def analyze(self, texts):
+        """
+        Computes VADER's sentiment value of every word of every text.
+
+        Args:
+            texts (list): Strings to score.
+
+        Returns:
+            tuple: (sentiments, token_text, counts, per_text): the value of each
+                word in text order, the text each word belongs to, the number of
+                words per text, and a boolean array flagging the texts that
+                must be scored by polarity_scores instead.
+        """
+        token_lists = [text.split() for text in texts]
+        counts = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(texts))
+        flat_tokens = [token for tokens in token_lists for token in tokens]
+        token_text = np.repeat(np.arange(len(texts)), counts)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        position = np.arange(len(flat_tokens)) - offsets[token_text]
+        text_counts = counts[token_text]
+
+        # Look every distinct token up once, stripped and lowercased the way SentiText does it
+        token_codes, vocabulary = pd.factorize(pd.Series(flat_tokens, dtype=object))
+        words = [SentiText._strip_punc_if_word(token) for token in vocabulary]
+        lowered = [word.lower() for word in words]
+        lexicon = self.analyzer.lexicon
+
+        def lookup(fn, dtype=bool):
+            return np.fromiter((fn(word) for word in lowered), dtype=dtype, count=len(lowered))[token_codes]
+
+        is_lexicon = lookup(lambda word: word in lexicon)
+        valence = lookup(lambda word: lexicon.get(word, 0.0), np.float64)
+        is_booster = lookup(lambda word: word in BOOSTER_DICT)
+        booster = lookup(lambda word: BOOSTER_DICT.get(word, 0.0), np.float64)
+        is_negated = lookup(lambda word: word in NEGATE or "n't" in word)
+        is_no, is_least, is_kind, is_of = (lookup(word.__eq__) for word in ('no', 'least', 'kind', 'of'))
+        is_never, is_without, is_doubt, is_but = (lookup(word.__eq__) for word in ('never', 'without', 'doubt', 'but'))
+        is_or_nor = lookup(lambda word: word in ('or', 'nor'))
+        is_so_this = lookup(lambda word: word in ('so', 'this'))
+        is_at_very = lookup(lambda word: word in ('at', 'very'))
+        is_upper = np.fromiter((word.isupper() for word in words), dtype=bool, count=len(words))[token_codes]
+
+        def back(values, distance, fill=False):
+            return shifted(values, distance, position, text_counts, fill)
+
+        # Only some of a text's words in ALL CAPS: those are emphasized
+        n_upper = np.bincount(token_text, weights=is_upper, minlength=len(texts))
+        cap_diff = ((n_upper > 0) & (n_upper < counts))[token_text]
+
+        # polarity_scores: boosters and the 'kind' of 'kind of' count 0; other lexicon words get a valence
+        scored = is_lexicon & ~is_booster & ~(is_kind & back(is_of, -1))
+
+        # sentiment_valence, step by step
+        v = valence.copy()
+        # 'no' before a lexicon word negates it instead of counting itself
+        v[is_no & back(is_lexicon, -1)] = 0.0
+        negated_by_no = back(is_no, 1) | back(is_no, 2) | (back(is_no, 3) & back(is_or_nor, 1))
+        v[negated_by_no] = valence[negated_by_no] * N_SCALAR
+        capped = is_upper & cap_diff
+        v[capped] = np.where(v[capped] > 0, v[capped] + C_INCR, v[capped] - C_INCR)
+
+        for start_i, damping in enumerate((1.0, 0.95, 0.9)):
+            distance = start_i + 1
+            active = (position > start_i) & ~back(is_lexicon, distance, fill=True)
+            # scalar_inc_dec: boosters push away from zero, dampeners towards it
+            prev_booster = back(is_booster, distance)
+            s = np.where(prev_booster, back(booster, distance, fill=0.0), 0.0)
+            s = np.where(prev_booster & (v < 0), s * -1, s)
+            booster_capped = prev_booster & back(is_upper, distance) & cap_diff
+            s = np.where(booster_capped, np.where(v > 0, s + C_INCR, s - C_INCR), s)
+            if start_i > 0:
+                s = np.where(s != 0, s * damping, s)
+            v = np.where(active, v + s, v)
+
+            # _negation_check
+            negation = back(is_negated, distance)
+            if start_i == 0:
+                emphasis = keep = np.zeros(len(v), dtype=bool)
+            elif start_i == 1:
+                emphasis = back(is_never, 2) & back(is_so_this, 1)
+                keep = back(is_without, 2) & back(is_doubt, 1)
+            else:
+                emphasis = (back(is_never, 3) & back(is_so_this, 2)) | back(is_so_this, 1)
+                keep = back(is_without, 3) & (back(is_doubt, 2) | back(is_doubt, 1))
+            v = np.where(active & emphasis, v * 1.25,
+                         np.where(active & ~keep & negation, v * N_SCALAR, v))
+
+        # _least_check
+        after_least = back(is_least, 1) & ~back(is_lexicon, 1, fill=True)
+        v = np.where(after_least & (position > 1),
+                     np.where(~back(is_at_very, 2), v * N_SCALAR, v),
+                     np.where(after_least, v * N_SCALAR, v))
+
+        sentiments = np.where(scored, v, 0.0)
+
+        # 'but' halves the words before it and boosts those after it. VADER locates each word by its
+        # value (the first equal one), so its own _but_check is applied to each text's values
+        has_sentiment = np.bincount(token_text, weights=sentiments != 0, minlength=len(texts)) > 0
+        has_but = np.bincount(token_text, weights=is_but, minlength=len(texts)) > 0
+        token_words = np.asarray(words, dtype=object)[token_codes]
+        for i in np.flatnonzero(has_sentiment & has_but):
+            span = slice(offsets[i], offsets[i + 1])
+            sentiments[span] = SentimentIntensityAnalyzer._but_check(token_words[span].tolist(), sentiments[span].tolist())
+
+        # Texts left to polarity_scores: multi-word boosters and idioms, emoji
+        per_text = np.zeros(len(texts), dtype=bool)
+        token_lowered = np.asarray(lowered, dtype=object)[token_codes]
+        for i in np.flatnonzero(np.bincount(token_text, weights=scored, minlength=len(texts)) > 0):
+            padded = f" {' '.join(token_lowered[offsets[i]:offsets[i + 1]])} "
+            if any(phrase in padded for phrase in RULE_PHRASES):
+                per_text[i] = True
+        for i, text in enumerate(texts):
+            # VADER expands emoji into descriptions, which may contain lexicon words
+            if not text.isascii() and not self.emoji_chars.isdisjoint(text):
+                per_text[i] = True
+        return sentiments, token_text, counts, per_text
+
+    @staticmethod
+    def score_valence(texts, sentiments, token_text, counts):
+        """
+        SentimentIntensityAnalyzer.score_valence, vectorized over texts.
+
+        Sums are accumulated one word position at a time, in text order, and
+        the final rounding uses Python's round(), so results are bit-identical
+        to polarity_scores.
+
+        Returns:
+            np.ndarray: Shape (len(texts), len(VADER_FIELDS)).
+        """
+        n = len(texts)
+        sum_s, pos_sum, neg_sum = np.zeros(n), np.zeros(n), np.zeros(n)
+        nonzero = np.flatnonzero(sentiments != 0) # Adding a zero changes no sum
+        text, value = token_text[nonzero], sentiments[nonzero]
+        rank = np.arange(len(nonzero)) - np.searchsorted(text, text)
+        order = np.argsort(rank, kind='stable')
+        bounds = np.searchsorted(rank[order], np.arange(rank.max() + 2 if len(rank) else 1))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            at = order[start:stop]
+            sum_s[text[at]] += value[at]
+            pos_sum[text[at]] += np.where(value[at] > 0, value[at] + 1, 0.0)
+            neg_sum[text[at]] += np.where(value[at] < 0, value[at] - 1, 0.0)
+        neu_count = counts - np.bincount(text, minlength=n)
+
+        exclamations = np.fromiter((text.count('!') for text in texts), dtype=np.int64, count=n)
+        questions = np.fromiter((text.count('?') for text in texts), dtype=np.int64, count=n)
+        emphasis = (np.minimum(exclamations, MAX_EXCLAMATIONS) * EXCLAMATION_WEIGHT
+                    + np.where(questions > 3, MAX_QUESTION_EMPHASIS,
+                               np.where(questions > 1, questions * QUESTION_WEIGHT, 0.0)))
+
+        sum_s = np.where(sum_s > 0, sum_s + emphasis, np.where(sum_s < 0, sum_s - emphasis, sum_s))
+        compound = np.clip(sum_s / np.sqrt(sum_s * sum_s + NORMALIZE_ALPHA), -1.0, 1.0)
+        pos_wins, neg_wins = pos_sum > np.abs(neg_sum), pos_sum < np.abs(neg_sum)
+        pos_sum = np.where(pos_wins, pos_sum + emphasis, pos_sum)
+        neg_sum = np.where(neg_wins, neg_sum - emphasis, neg_sum)
+        with np.errstate(invalid='ignore'): # Texts without words: 0/0, zeroed below
+            total = pos_sum + np.abs(neg_sum) + neu_count
+            fields = {'neg': np.abs(neg_sum / total), 'neu': np.abs(neu_count / total),
+                      'pos': np.abs(pos_sum / total), 'compound': compound}
+
+        scores = np.zeros((n, len(VADER_FIELDS)), dtype=np.float64)
+        has_words = counts > 0
+        for j, field in enumerate(VADER_FIELDS):
+            # np.round can differ from round() in the last digit; keep VADER's rounding
+            digits = 4 if field == 'compound' else 3
+            scores[has_words, j] = [round(value, digits) for value in fields[field][has_words].tolist()]
+        return scores
+
+    def score(self, texts):
+        """
+        Scores a column or any iterable of texts.
+
+        Args:
+            texts (iterable): Texts to score; non-strings score 0 on every field.
+
+        Returns:
+            dict: Maps each of VADER_FIELDS to a float64 array aligned with `texts`.
+        """
+        texts = pd.Series(list(texts), dtype=object)
+        codes, uniques = pd.factorize(texts, use_na_sentinel=True)
+        is_text = np.fromiter((isinstance(text, str) for text in uniques), dtype=bool, count=len(uniques))
+        text_ids = np.flatnonzero(is_text)
+        unique_texts = [uniques[i] for i in text_ids]
+
+        unique_scores = np.zeros((len(uniques), len(VADER_FIELDS)), dtype=np.float64)
+        self.full_scored = 0
+        if unique_texts:
+            sentiments, token_text, counts, per_text = self.analyze(unique_texts)
+            unique_scores[text_ids] = self.score_valence(unique_texts, sentiments, token_text, counts)
+            for i in text_ids[per_text]:
+                result = self.analyzer.polarity_scores(uniques[i])
+                unique_scores[i] = [result[field] for field in VADER_FIELDS]
+            self.full_scored = int(per_text.sum())
+
+        # Fan the per-unique scores back out to every row (missing values stay 0)
+        scores = np.zeros((len(texts), len(VADER_FIELDS)), dtype=np.float64)
+        valid = codes >= 0
+        scores[valid] = unique_scores[codes[valid]]
+        return {field: scores[:, j] for j, field in enumerate(VADER_FIELDS)}
@@ -1,141 +1,134 @@
+import argparse
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-
-df = pd.read_csv('dialogues_with_sentiment.csv')
-# Re-calculate character_stats if loading from CSV
-character_stats = df.groupby(['film', 'character'])['sentiment_score'].agg(['mean', 'median', 'std', 'count'])
-character_stats.rename(columns={'mean': 'Mean Sentiment', 'median': 'Median Sentiment', 'std': 'Std Dev Sentiment', 'count': 'Dialogue Count'}, inplace=True)
-print("Loaded data from dialogues_with_sentiment.csv")
-
-
-# --- Ensure DataFrames Exist ---
-if 'df' not in locals() or 'character_stats' not in locals():
-    print("Error: DataFrame 'df' or 'character_stats' not found. Please run the previous steps.")
-    exit()
-elif df.empty:
-    print("Error: DataFrame 'df' is empty.")
-    exit()
-
-# --- Set Plot Style (Optional) ---
-sns.set_style("whitegrid")
-plt.figure(figsize=(12, 8)) # Default size for subsequent plots unless overridden
-
-# --- Plot 1: Distribution of Sentiment Scores per Film ---
-print("Generating Plot 1: Sentiment Distribution per Film...")
-plt.figure(figsize=(10, 6)) # Adjust size for this specific plot
-sns.histplot(data=df, x='sentiment_score', hue='film', kde=True, bins=40, palette='viridis')
-plt.title('Distribution of Dialogue Sentiment Scores (VADER Compound)', fontsize=16)
-plt.xlabel('Sentiment Score (-1 Negative, 0 Neutral, 1 Positive)', fontsize=12)
-plt.ylabel('Number of Dialogue Lines', fontsize=12)
-plt.legend(title='Film')
-plt.tight_layout()
-plt.show()
-
-# --- Plot 2: Average Sentiment per Character ---
-print("Generating Plot 2: Average Sentiment per Character...")
-# Reset index of character_stats to make 'film' and 'character' columns
-char_stats_plot = character_stats.reset_index()
-
-plt.figure(figsize=(12, 7))
-sns.barplot(data=char_stats_plot, x='character', y='Mean Sentiment', hue='film', palette='muted')
-# Add a horizontal line at y=0 for reference
-plt.axhline(0, color='grey', linestyle='--', linewidth=0.8)
-plt.title('Average Dialogue Sentiment per Key Character', fontsize=16)
-plt.xlabel('Character', fontsize=12)
-plt.ylabel('Mean VADER Compound Score', fontsize=12)
-plt.xticks(rotation=45, ha='right') # Rotate labels for better readability
-plt.legend(title='Film', loc='upper right')
-plt.tight_layout()
-plt.show()
-
-# --- Plot 3: Sentiment Distribution per Character (Box Plot) ---
-print("Generating Plot 3: Sentiment Distribution per Character...")
-# Define a consistent order for characters if desired
-character_order = sorted(df['character'].unique())
-
-plt.figure(figsize=(14, 8))
-sns.boxplot(data=df, x='character', y='sentiment_score', hue='film', order=character_order, palette='muted', showfliers=False) # showfliers=False hides outliers for cleaner look initially
-# You can also try violinplot:
-# sns.violinplot(data=df, x='character', y='sentiment_score', hue='film', order=character_order, palette='muted', inner='quartile')
-
-plt.axhline(0, color='grey', linestyle='--', linewidth=0.8)
-plt.title('Distribution of Dialogue Sentiment Scores per Character (Box Plot)', fontsize=16)
-plt.xlabel('Character', fontsize=12)
-plt.ylabel('VADER Compound Score', fontsize=12)
-plt.xticks(rotation=45, ha='right')
-plt.legend(title='Film', loc='upper right')
-plt.tight_layout()
-plt.show()
-
-# --- Plot 4: Number of Dialogues per Character ---
-print("Generating Plot 4: Dialogue Counts per Character...")
-plt.figure(figsize=(12, 6))
-sns.barplot(data=char_stats_plot, x='character', y='Dialogue Count', hue='film', palette='muted')
-plt.title('Number of Dialogue Lines Analyzed per Character', fontsize=16)
-plt.xlabel('Character', fontsize=12)
-plt.ylabel('Count of Dialogue Lines', fontsize=12)
-plt.xticks(rotation=45, ha='right')
-plt.legend(title='Film', loc='upper right')
-plt.tight_layout()
-plt.show()
-
-# --- 1. Categorize Sentiment Scores ---
-print("\nCategorizing sentiment scores...")
-
-def categorize_sentiment(score):
-    if score >= 0.05:
-        return 'Positive'
-    elif score <= -0.05:
-        return 'Negative'
-    else:
-        return 'Neutral'
-
-df['sentiment_category'] = df['sentiment_score'].apply(categorize_sentiment)
-
-print("Sentiment categorization complete.")
-print(df[['film', 'character', 'sentiment_score', 'sentiment_category']].head())
+from aggregate_cube import SENTIMENT_CATEGORIES, ensure_cube
+from dialogue_store import format_memory_report, read_columns
+from instrumentation import get_tracer
+
+# --- Configuration ---
+DEFAULT_OUTPUT_DIR = 'graphs'                        # Where --render writes every figure
+SITE_PLOTS_DIR = os.path.join('..', 'public', 'plots') # Served by app/page.tsx under /plots/
+RENDER_CACHE_FILENAME = 'render_cache.json'
+RENDER_VERSION = 3 # Bump when the plotting code changes so every figure is re-rendered
+DEFAULT_DPI = 100
+SITE_ASPECT_TOLERANCE = 0.05 # --site only replaces a published image whose aspect ratio is within 5% of the render
+
+# Site images produced by this script: name under /plots/ -> rendered figure
+SITE_ASSETS = {
+    'vader1.png': 'plot7_character_breakdown_Pulp_Fiction.png',
+    'vader2.png': 'plot7_character_breakdown_Goodfellas.png',
+    'vader3.png': 'plot9_film_sentiment_breakdown.png',
+}
 
 # Define colors for consistency
 sentiment_colors = {'Negative': '#d62728', 'Neutral': '#7f7f7f', 'Positive': '#2ca02c'} # Red, Grey, Green
-category_order = ['Negative', 'Neutral', 'Positive'] # Consistent order
-
+category_order = SENTIMENT_CATEGORIES # Consistent order (scores >= 0.05 are Positive, <= -0.05 Negative)
+
+# --- Helper Functions ---
+
+def compute_character_stats(cube):
+    """Mean/median/std/count of the VADER score per (film, character) from the aggregate cube, with display names."""
+    character_stats = cube.stats('sentiment_score', by=['film', 'character'])
+    character_stats.rename(columns={'mean': 'Mean Sentiment', 'median': 'Median Sentiment', 'std': 'Std Dev Sentiment', 'count': 'Dialogue Count'}, inplace=True)
+    return character_stats
+
+# --- Plots ---
+# Each function draws one figure from the data it is given and returns it, so
+# figures can be shown interactively or rendered to disk in separate processes.
+# Distribution plots take dialogue rows; the others take small summaries read
+# from the aggregate cube.
+
+def plot_sentiment_distribution(df):
+    """Plot 1: Distribution of Sentiment Scores per Film."""
+    fig = plt.figure(figsize=(10, 6)) # Adjust size for this specific plot
+    sns.histplot(data=df, x='sentiment_score', hue='film', kde=True, bins=40, palette='viridis')
+    plt.title('Distribution of Dialogue Sentiment Scores (VADER Compound)', fontsize=16)
+    plt.xlabel('Sentiment Score (-1 Negative, 0 Neutral, 1 Positive)', fontsize=12)
+    plt.ylabel('Number of Dialogue Lines', fontsize=12)
+    plt.legend(title='Film')
+    plt.tight_layout()
+    return fig
+
+def plot_average_sentiment(char_stats_plot):
+    """Plot 2: Average Sentiment per Character."""
+    fig = plt.figure(figsize=(12, 7))
+    sns.barplot(data=char_stats_plot, x='character', y='Mean Sentiment', hue='film', palette='muted')
+    # Add a horizontal line at y=0 for reference
+    plt.axhline(0, color='grey', linestyle='--', linewidth=0.8)
+    plt.title('Average Dialogue Sentiment per Key Character', fontsize=16)
+    plt.xlabel('Character', fontsize=12)
+    plt.ylabel('Mean VADER Compound Score', fontsize=12)
+    plt.xticks(rotation=45, ha='right') # Rotate labels for better readability
+    plt.legend(title='Film', loc='upper right')
+    plt.tight_layout()
+    return fig
+
+def plot_sentiment_boxplot(df):
+    """Plot 3: Sentiment Distribution per Character (Box Plot)."""
+    # Define a consistent order for characters if desired
+    character_order = sorted(df['character'].unique())
+    # Only dodge boxes when a character name appears in several films (seaborn's automatic
+    # check counts unobserved film/character pairs when both columns are categorical)
+    dodge = bool((df.groupby('character', observed=True)['film'].nunique() > 1).any())
+
+    fig = plt.figure(figsize=(14, 8))
+    sns.boxplot(data=df, x='character', y='sentiment_score', hue='film', order=character_order, palette='muted', dodge=dodge, showfliers=False) # showfliers=False hides outliers for cleaner look initially
+    # You can also try violinplot:
+    # sns.violinplot(data=df, x='character', y='sentiment_score', hue='film', order=character_order, palette='muted', inner='quartile')
+
+    plt.axhline(0, color='grey', linestyle='--', linewidth=0.8)
+    plt.title('Distribution of Dialogue Sentiment Scores per Character (Box Plot)', fontsize=16)
+    plt.xlabel('Character', fontsize=12)
+    plt.ylabel('VADER Compound Score', fontsize=12)
+    plt.xticks(rotation=45, ha='right')
+    plt.legend(title='Film', loc='upper right')
+    plt.tight_layout()
+    return fig
 
-# --- 2. Sentiment Distribution Plots per Film (Separate) ---
-print("\nGenerating Plot 5 & 6: Sentiment Distribution for Each Film...")
+def plot_dialogue_counts(char_stats_plot):
+    """Plot 4: Number of Dialogues per Character."""
+    fig = plt.figure(figsize=(12, 6))
+    sns.barplot(data=char_stats_plot, x='character', y='Dialogue Count', hue='film', palette='muted')
+    plt.title('Number of Dialogue Lines Analyzed per Character', fontsize=16)
+    plt.xlabel('Character', fontsize=12)
+    plt.ylabel('Count of Dialogue Lines', fontsize=12)
+    plt.xticks(rotation=45, ha='right')
+    plt.legend(title='Film', loc='upper right')
+    plt.tight_layout()
+    return fig
 
-films = df['film'].unique()
-for film_name in films:
-    plt.figure(figsize=(10, 6))
-    film_data = df[df['film'] == film_name]
-    sns.histplot(data=film_data, x='sentiment_score', kde=True, bins=40, color=sns.color_palette("viridis")[films.tolist().index(film_name)]) # Use different color per film
+def plot_film_distribution(film_data, film_name, color_index):
+    """Plots 5 & 6: Sentiment Distribution for one film."""
+    fig = plt.figure(figsize=(10, 6))
+    sns.histplot(data=film_data, x='sentiment_score', kde=True, bins=40, color=sns.color_palette("viridis")[color_index]) # Use different color per film
     plt.title(f'Distribution of Dialogue Sentiment Scores in {film_name}', fontsize=16)
     plt.xlabel('Sentiment Score (-1 Negative, 0 Neutral, 1 Positive)', fontsize=12)
     plt.ylabel('Number of Dialogue Lines', fontsize=12)
     plt.tight_layout()
-    plt.show()
-
-
-# --- 3. Character Sentiment Breakdown (Stacked Bar Charts per Film) ---
-print("\nGenerating Plot 7 & 8: Character Sentiment Breakdown per Film...")
-
-for film_name in films:
-    plt.figure(figsize=(10, 7))
-    film_data = df[df['film'] == film_name]
+    return fig
 
-    # Calculate counts per character and category
-    char_sentiment_counts = film_data.groupby(['character', 'sentiment_category']).size().unstack(fill_value=0)
-
-    # Ensure all categories are present and in order
-    char_sentiment_counts = char_sentiment_counts.reindex(columns=category_order, fill_value=0)
+def plot_character_breakdown(char_sentiment_counts, film_name):
+    """Plots 7 & 8: Character Sentiment Breakdown for one film (stacked bar chart)."""
+    # Counts per character (rows) and category (columns, in category_order) come from the cube
 
     # Calculate percentages
     char_sentiment_perc = char_sentiment_counts.apply(lambda x: x * 100 / x.sum(), axis=1)
 
-    # Plot stacked bar chart
+    # Plot stacked bar chart (pandas opens its own default-size figure, as in the published site images)
     ax = char_sentiment_perc.plot(kind='bar', stacked=True, color=[sentiment_colors[cat] for cat in category_order], width=0.8)
+    fig = ax.figure
 
-    plt.title(f'Percentage of Negative/Neutral/Positive Dialogue per Character\n({film_name})', fontsize=16)
+    plt.title(f'Percentage of Negative/Neutral/Positive Dialogue per Character\n({film_name})', fontsize=16,
+              wrap=True) # Wraps only where the font is too wide for the figure
     plt.xlabel('Character', fontsize=12)
     plt.ylabel('Percentage of Dialogue Lines (%)', fontsize=12)
     plt.xticks(rotation=0) # Keep character names horizontal
@@ -146,47 +139,259 @@ for film_name in films:
     # for container in ax.containers:
     #     ax.bar_label(container, fmt='%.1f%%', label_type='center', fontsize=8, color='white', weight='bold')
 
-    plt.tight_layout(rect=[0, 0, 0.85, 1]) # Adjust layout to make space for legend
-    plt.show()
-
-
-# --- 4. Overall Film Sentiment Pie Charts ---
-print("\nGenerating Plot 9: Overall Film Sentiment Breakdown (Pie Charts)...")
-
-# Calculate overall counts per film and category
-film_sentiment_counts = df.groupby(['film', 'sentiment_category']).size().unstack(fill_value=0)
-film_sentiment_counts = film_sentiment_counts.reindex(columns=category_order, fill_value=0)
-
-
-fig, axes = plt.subplots(1, len(films), figsize=(12, 6), squeeze=False) # Ensure axes is always 2D
-
-for i, film_name in enumerate(films):
-    ax = axes[0, i] # Access subplot axis
-    counts = film_sentiment_counts.loc[film_name]
-    labels = counts.index
-    sizes = counts.values
-    colors = [sentiment_colors[cat] for cat in labels]
-
-    # Explode the 'Negative' slice slightly if desired
-    explode = tuple(0.05 if cat == 'Negative' else 0 for cat in labels)
-
-    wedges, texts, autotexts = ax.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%',
-                                      startangle=90, pctdistance=0.85, explode=explode,
-                                      textprops={'color':"w", 'weight':'bold'}) # White text inside
-
-    # Draw circle for Donut Chart look (optional)
-    centre_circle = plt.Circle((0,0),0.70,fc='white')
-    ax.add_artist(centre_circle)
-
-    ax.set_title(f'{film_name}\nOverall Sentiment Breakdown', fontsize=14)
-    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-
-# Add legend to the figure
-handles = [plt.Rectangle((0,0),1,1, color=sentiment_colors[cat]) for cat in category_order]
-fig.legend(handles, category_order, title="Sentiment Category", loc="center right")
-
-
-plt.suptitle('Overall Dialogue Sentiment Breakdown by Film', fontsize=18, y=1.02)
-plt.tight_layout(rect=[0, 0, 0.85, 1]) # Adjust layout for figure legend
-plt.show()
-
+    plt.tight_layout() # The legend is part of the axes, so this also makes space for it
+    return fig
+
+def plot_film_breakdown(film_sentiment_counts, films):
+    """Plot 9: Overall Film Sentiment Breakdown (Pie Charts)."""
+    # Overall counts per film (rows) and category (columns) come from the cube; `films` keeps script order
+    fig, axes = plt.subplots(1, len(films), figsize=(12, 6), squeeze=False) # Ensure axes is always 2D
+
+    for i, film_name in enumerate(films):
+        ax = axes[0, i] # Access subplot axis
+        counts = film_sentiment_counts.loc[film_name]
+        labels = counts.index
+        sizes = counts.values
+        colors = [sentiment_colors[cat] for cat in labels]
+
+        # Explode the 'Negative' slice slightly if desired
+        explode = tuple(0.05 if cat == 'Negative' else 0 for cat in labels)
+
+        wedges, texts, autotexts = ax.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%',
+                                          startangle=90, pctdistance=0.85, explode=explode,
+                                          textprops={'color':"w", 'weight':'bold'}) # White text inside
+
+        # Draw circle for Donut Chart look (optional)
+        centre_circle = plt.Circle((0,0),0.70,fc='white')
+        ax.add_artist(centre_circle)
+
+        ax.set_title(f'{film_name}\nOverall Sentiment Breakdown', fontsize=14)
+        ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+
+    # Add legend to the figure
+    handles = [plt.Rectangle((0,0),1,1, color=sentiment_colors[cat]) for cat in category_order]
+    fig.legend(handles, category_order, title="Sentiment Category", loc="center right")
+
+    plt.suptitle('Overall Dialogue Sentiment Breakdown by Film', fontsize=18)
+    plt.tight_layout(rect=[0, 0, 0.85, 1]) # Adjust layout for figure legend
+    return fig
+
+# --- Figure Specs ---
+
+def figure_specs(df, cube):
+    """
+    Lists every figure with the data it is drawn from.
+
+    Each spec holds the output filename, the plotting function, its data and
+    the extra plot parameters. Distribution plots get the dialogue rows they
+    need (per-film figures only that film's rows, so refreshing one film does
+    not re-render the other's); summary plots get a few rows of counts or
+    statistics from the aggregate cube.
+    """
+    films = df['film'].unique().tolist()
+    char_stats_plot = compute_character_stats(cube).reset_index()
+    specs = [
+        {'filename': 'plot1_sentiment_distribution.png', 'plot': plot_sentiment_distribution,
+         'data': df[['film', 'sentiment_score']], 'params': {}},
+        {'filename': 'plot2_avg_sentiment_character.png', 'plot': plot_average_sentiment,
+         'data': char_stats_plot[['film', 'character', 'Mean Sentiment']], 'params': {}},
+        {'filename': 'plot3_sentiment_boxplot_character.png', 'plot': plot_sentiment_boxplot,
+         'data': df[['film', 'character', 'sentiment_score']], 'params': {}},
+        {'filename': 'plot4_dialogue_counts_character.png', 'plot': plot_dialogue_counts,
+         'data': char_stats_plot[['film', 'character', 'Dialogue Count']], 'params': {}},
+    ]
+    for i, film_name in enumerate(films):
+        specs.append({'filename': f"plot5_distribution_{film_name.replace(' ', '_')}.png",
+                      'plot': plot_film_distribution,
+                      'data': df.loc[df['film'] == film_name, ['sentiment_score']].reset_index(drop=True),
+                      'params': {'film_name': film_name, 'color_index': i}})
+    for film_name in films:
+        specs.append({'filename': f"plot7_character_breakdown_{film_name.replace(' ', '_')}.png",
+                      'plot': plot_character_breakdown,
+                      'data': cube.category_counts(by=['character'], where={'film': film_name}),
+                      'params': {'film_name': film_name}})
+    specs.append({'filename': 'plot9_film_sentiment_breakdown.png', 'plot': plot_film_breakdown,
+                  'data': cube.category_counts(by=['film']), 'params': {'films': films}})
+    return specs
+
+def figure_hash(spec, data, dpi):
+    """Hashes a figure's input data and plot parameters; an unchanged hash means an unchanged image."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([RENDER_VERSION, spec['filename'], spec['plot'].__name__,
+                              spec['params'], dpi], sort_keys=True).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    return digest.hexdigest()
+
+# --- Headless Rendering ---
+
+def render_figure(spec, data, output_dir, dpi=DEFAULT_DPI):
+    """Draws one figure with the Agg backend and saves it as a PNG (runs in a worker process)."""
+    plt.switch_backend('Agg')
+    sns.set_style("whitegrid")
+    fig = spec['plot'](data, **spec['params'])
+    path = os.path.join(output_dir, spec['filename'])
+    # Each plot lays itself out with tight_layout; save the whole figure, as shown on screen
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+    return spec['filename']
+
+def render_all(df, cube, output_dir=DEFAULT_OUTPUT_DIR, workers=None, dpi=DEFAULT_DPI, force=False):
+    """
+    Renders every figure to `output_dir`, skipping those whose inputs are unchanged.
+
+    Figures are independent, so they are drawn in a process pool. The hash of
+    each figure's inputs is kept in render_cache.json next to the images.
+
+    Args:
+        df (pd.DataFrame): Dialogue rows with 'film', 'character' and 'sentiment_score'.
+        cube (AggregateCube): Summaries of the same rows (aggregate_cube.py).
+
+    Returns:
+        tuple: (rendered filenames, skipped filenames).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cache_path = os.path.join(output_dir, RENDER_CACHE_FILENAME)
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+
+    todo, skipped, hashes = [], [], {}
+    for spec in figure_specs(df, cube):
+        data = spec['data']
+        hashes[spec['filename']] = figure_hash(spec, data, dpi)
+        if (not force and cache.get(spec['filename']) == hashes[spec['filename']]
+                and os.path.exists(os.path.join(output_dir, spec['filename']))):
+            skipped.append(spec['filename'])
+        else:
+            todo.append((spec, data))
+
+    rendered = []
+    workers = min(workers or os.cpu_count(), len(todo))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_figure, spec, data, output_dir, dpi) for spec, data in todo]
+            for future in futures:
+                rendered.append(future.result())
+                cache[rendered[-1]] = hashes[rendered[-1]]
+    else:
+        for spec, data in todo:
+            rendered.append(render_figure(spec, data, output_dir, dpi))
+            cache[rendered[-1]] = hashes[rendered[-1]]
+
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+    return rendered, skipped
+
+def layout_mismatch(source, target):
+    """
+    Compares a rendered figure with the published image it would replace.
+
+    The aspect ratio does not depend on the DPI but changes whenever the
+    layout does (e.g. a cropped or squashed figure), so a render whose aspect
+    ratio is far from the published image's is not a drop-in replacement.
+
+    Returns:
+        str or None: Why the two differ, or None if they match.
+    """
+    (source_h, source_w), (target_h, target_w) = (plt.imread(path).shape[:2] for path in (source, target))
+    source_aspect, target_aspect = source_w / source_h, target_w / target_h
+    if abs(source_aspect / target_aspect - 1) > SITE_ASPECT_TOLERANCE:
+        return (f"rendered {source_w}x{source_h} (aspect {source_aspect:.2f}) vs published "
+                f"{target_w}x{target_h} (aspect {target_aspect:.2f})")
+    return None
+
+def publish_site_assets(output_dir=DEFAULT_OUTPUT_DIR, site_dir=SITE_PLOTS_DIR, replace=False):
+    """
+    Copies the rendered figures the site uses into public/plots, leaving identical files untouched.
+
+    A published image is only overwritten if the render has the same layout
+    (see layout_mismatch), unless `replace` is set after checking it by eye.
+
+    Returns:
+        tuple: (copied assets, assets held back because their layout differs).
+    """
+    copied, held_back = [], []
+    for asset, filename in SITE_ASSETS.items():
+        source = os.path.join(output_dir, filename)
+        target = os.path.join(site_dir, asset)
+        if not os.path.exists(source):
+            print(f"Warning: {filename} was not rendered; {asset} not updated.")
+            continue
+        if os.path.exists(target) and filecmp.cmp(source, target, shallow=False):
+            continue
+        mismatch = layout_mismatch(source, target) if os.path.exists(target) else None
+        if mismatch and not replace:
+            print(f"Warning: {filename} does not match the published {asset} ({mismatch}); not updated. "
+                  f"Compare the two and rerun with --site-replace to publish it anyway.")
+            held_back.append(asset)
+            continue
+        shutil.copyfile(source, target)
+        copied.append(asset)
+    return copied, held_back
+
+def show_all(df, cube):
+    """Shows every figure in a window, one after another (the original interactive behaviour)."""
+    sns.set_style("whitegrid")
+    for spec in figure_specs(df, cube):
+        print(f"Generating {spec['plot'].__doc__.split(':')[0]}: {spec['filename']}...")
+        spec['plot'](spec['data'], **spec['params'])
+        plt.show()
+
+# --- Main Execution ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plot the VADER sentiment results.")
+    parser.add_argument('--render', action='store_true',
+                        help="Render every figure to PNG headlessly instead of showing windows.")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help="Directory for rendered figures.")
+    parser.add_argument('--workers', type=int, help="Render processes (default: one per CPU).")
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--force', action='store_true', help="Re-render figures even if their inputs are unchanged.")
+    parser.add_argument('--site', action='store_true',
+                        help=f"With --render, also update the site images in {SITE_PLOTS_DIR} "
+                             f"(only those whose layout matches the published image).")
+    parser.add_argument('--site-replace', action='store_true',
+                        help="With --site, also replace published images whose layout differs from the render.")
+    args = parser.parse_args()
+    tracer = get_tracer('visualizations.py') # Set ANALYSIS_TRACE=1 to record stage timings
+
+    # Load only the columns the plots need from the dialogue store, in the compact schema
+    # (categorical film/character, float32 scores)
+    try:
+        with tracer.stage('load'):
+            df = read_columns(['film', 'character', 'sentiment_score'], compact=True)
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        print(f"Error: {e}. Please run the previous steps.")
+        exit()
+    if df.empty:
+        print("Error: DataFrame 'df' is empty.")
+        exit()
+    print("Loaded data from the dialogue store")
+    print(f"Memory: {format_memory_report(df)}")
+
+    # --- Per-Character and Per-Film Summaries ---
+    # Counts, means and medians are read from the aggregate cube, which is only
+    # rebuilt when the scores have changed since it was saved
+    with tracer.stage('cube') as stage:
+        cube = ensure_cube(measures=['sentiment_score'])
+        stage['cells'] = len(cube.cells)
+
+    if args.render:
+        start = time.perf_counter()
+        with tracer.stage('render', workers=args.workers or os.cpu_count(), dpi=args.dpi) as stage:
+            rendered, skipped = render_all(df, cube, args.output, workers=args.workers, dpi=args.dpi, force=args.force)
+            stage.update(rendered=len(rendered), skipped=len(skipped))
+        print(f"Rendered {len(rendered)} figures, {len(skipped)} unchanged, "
+              f"in {time.perf_counter() - start:.2f}s -> {args.output}/")
+        if args.site:
+            with tracer.stage('publish'):
+                copied, held_back = publish_site_assets(args.output, replace=args.site_replace)
+            print(f"Updated {len(copied)} site images in {SITE_PLOTS_DIR}: {', '.join(copied) or 'none changed'}"
+                  f"{f' ({len(held_back)} held back)' if held_back else ''}")
+    else:
+        print(compute_character_stats(cube))
+        with tracer.stage('show'):
+            show_all(df, cube)